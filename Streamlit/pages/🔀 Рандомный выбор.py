@@ -1,77 +1,84 @@
 import streamlit as st
-import pandas as pd
-import requests
 import os
-from PIL import Image
-from io import BytesIO
-st.set_page_config(layout="wide")
-st.markdown(
-    """
-    <style>
-    /* Увеличиваем базовый размер шрифта для всего приложения */
-    html, body, .block-container {
-        font-size: 26px !important;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
-CSV_FILE = os.path.join(os.path.dirname(__file__), "..", "films_data.csv")
+import numpy as np
+from recommender.catalog import Catalog
+from recommender.config import CATALOG_DIR, CSV_FILE
+from recommender.sampler import RandomSampler, SeenSet, parse_seed
+from recommender.storage import file_version
+from recommender.tracing import debug_enabled, span
+from recommender.ui import debug_panel, film_card, get_poster_cache, start_page
 
-@st.cache_resource
-def load_data():
+start_page()
+
+# Каталог открывается через mmap и общий для всех сессий; CSV разбирается только при его изменении.
+# version — ключ кэша: после sync или замены CSV каталог открывается заново
+@st.cache_resource(max_entries=1)
+def load_data(version):
     if not os.path.exists(CSV_FILE):
         st.error(f"Файл `{CSV_FILE}` не найден. Загрузите его или проверьте путь.")
-        return pd.DataFrame()
-    return pd.read_csv(CSV_FILE, encoding="utf-8")
-
-@st.cache_data(show_spinner=False)
-def load_image_from_url(url):
-    try:
-        response = requests.get(url, timeout=5)
-        img = Image.open(BytesIO(response.content))
-        return img
-    except:
         return None
+    return Catalog.load_or_build(CSV_FILE, CATALOG_DIR)
+
+poster_cache = get_poster_cache()
+
+# Списки строк по жанрам и маски жанров считаются один раз на процесс
+@st.cache_resource
+def get_sampler(_catalog, fingerprint):
+    return RandomSampler(_catalog)
 
 def main():
     st.markdown("<h1 style='text-align: center; color: #d4a5a5; font-size: 48px;'>🎬 10 случайных фильмов</h1>", unsafe_allow_html=True)
 
     with st.spinner("Загружаем данные..."):
-        df = load_data()
+        catalog = load_data((file_version(CSV_FILE), Catalog.version(CATALOG_DIR)))
 
 
-    if df.empty:
+    if catalog is None or len(catalog) == 0:
         st.warning("Файл пустой или не найден.")
         return
     
+    sampler = get_sampler(catalog, catalog.fingerprint)
+    year_min, year_max = sampler.bounds("year")
+    rating_min, rating_max = sampler.bounds("rating")
+
+    with st.expander("⚙️ Фильтры 🎞️"):
+        selected_genres = st.multiselect("Жанры", sampler.genres)
+        selected_years = st.slider("Выберите диапазон годов", min_value=year_min, max_value=year_max, value=(year_min, year_max))
+        selected_ratings = st.slider("Выберите диапазон рейтинга", min_value=rating_min, max_value=rating_max, value=(rating_min, rating_max))
+
+    # Уже показанные фильмы не повторяются до конца сессии; ?seed=N повторяет ту же последовательность подборок
+    if "random_seen" not in st.session_state or st.session_state.random_seen.n_rows != len(catalog):
+        seed = parse_seed(st.query_params.get("seed"))
+        if seed is None and "seed" in st.query_params:
+            st.warning(f"seed={st.query_params['seed']!r} — не целое неотрицательное число, подборки будут случайными")
+        st.session_state.random_seen = SeenSet(len(catalog))
+        st.session_state.random_rng = np.random.default_rng(seed)
+    seen = st.session_state.random_seen
+
+    if len(seen) and st.button(f"🔄 Начать заново (показано фильмов: {len(seen)})"):
+        seen.clear()
+
     if st.button("🎥 Показать подборку фильмов", type='primary', help="Нажми, чтобы отобразить 10 случайных фильмов"):
-        random_samples = df.sample(10)
+        debug = debug_enabled(st.query_params)
+        with span("page_random", force=debug) as trace:
+            rows = sampler.sample(
+                10,
+                selected_genres,
+                selected_years if selected_years != (year_min, year_max) else None,
+                selected_ratings if selected_ratings != (rating_min, rating_max) else None,
+                seen,
+                st.session_state.random_rng,
+            )
+            seen.add(rows)
+            random_samples = catalog.frame(rows)
+            posters = poster_cache.fetch_many(random_samples['image_url'])
+        if len(rows) < 10:
+            st.info("Под эти фильтры больше нет непоказанных фильмов. Ослабьте фильтры или начните заново.")
+        debug_panel(debug, trace)
 
-        for idx, row in random_samples.iterrows():
+        for row in random_samples.to_dict("records"):
             with st.container():
-                st.markdown(
-    f"<h3 style='text-decoration: underline; color: white; margin-bottom: 0.5em;'>"
-    f"<a href='{row['page_url']}' style='text-decoration: underline; color: #d4a5a5; font-size: 35px;'>"
-    f"{row['movie_title']}</a></h3>",
-    unsafe_allow_html=True
-)
-                cols = st.columns([2, 7])
-                with cols[0]:
-                    if pd.notna(row['image_url']) and row['image_url'].startswith("http"):
-                        img = load_image_from_url(row['image_url'])
-                        if img:
-                            st.image(img, width=300)
-                        else:
-                            st.write("❌ Не удалось загрузить изображение")
-                with cols[1]:
-                    st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Год:</b> {row['year']}</p>", unsafe_allow_html=True)
-                    st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Жанр:</b> {row['genre']}</p>", unsafe_allow_html=True)
-                    st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Режиссер:</b> {row['director']}</p>", unsafe_allow_html=True)
-                    st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Актеры:</b> {row['actors']}</p>", unsafe_allow_html=True)
-                    st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Рейтинг IMDb:</b> {row['rating']}</p>", unsafe_allow_html=True)
-                    st.markdown(f"""<div style='max-height: 200px; overflow-y: auto; font-size:22px; color:#ffecda; line-height:1.2; margin:0.2'>{row['description']}</div>""", unsafe_allow_html=True)
-
+                film_card(row, posters, row['description'])
                 st.divider()
 
 if __name__ == "__main__":
@@ -1,106 +1,47 @@
 import streamlit as st
-import requests
-import json
-import os
-from pathlib import Path
-from PIL import Image
-from io import BytesIO
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from langchain_huggingface import HuggingFaceEmbeddings
-from qdrant_client.models import Filter, FieldCondition, Range
-from langchain.schema.runnable import RunnablePassthrough
-from langchain.schema.output_parser import StrOutputParser
-from langchain.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-
-
-st.set_page_config(layout="wide")
-st.markdown(
-    """
-    <style>
-    html, body, .block-container {
-        font-size: 26px !important;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True
+from recommender.config import COMMENTARY_CACHE_PATH
+from recommender.filter_index import filtered_similarity_search
+from recommender.qdrant_store import StorageProfile, page_filter
+from recommender.tracing import debug_enabled, span
+from recommender.llm import (
+    MOCK_BATCH_RESPONSES, batch_max_tokens, is_mock_enabled, make_batch_chain, make_film_chain, make_llm,
+    stream_batched_commentaries, stream_commentaries,
+)
+from recommender.llm_cache import CommentaryCache
+from recommender.ui import (
+    debug_panel, film_card, filter_widgets, get_autocomplete, get_filter_index, get_poster_cache, get_vector_store,
+    start_page,
 )
 
-QDRANT_FILE = os.path.join(os.path.dirname(__file__), "../..", "db/qdrant_db")
-
-@st.cache_resource
-def get_qdrant_client():
-    if not os.path.exists(QDRANT_FILE):
-        st.error(f"Файл `{QDRANT_FILE}` не найден. Загрузите его или проверьте путь.")
-        return QdrantClient()
-    return QdrantClient(path=QDRANT_FILE)
+start_page()
 
-client = get_qdrant_client()
+poster_cache = get_poster_cache()
+autocomplete = get_autocomplete()
+filter_index = get_filter_index()
 
+# Комментарии к паре «фильм + запрос» переживают перезапуски страницы и приложения
 @st.cache_resource
-def load_embeddings():
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
-        model_kwargs={"device": "cpu"},
-        encode_kwargs={"normalize_embeddings": True}
-    )
-
-hf = load_embeddings()
+def get_commentary_cache():
+    return CommentaryCache(COMMENTARY_CACHE_PATH)
 
-@st.cache_data(show_spinner=False)
-def load_image_from_url(url):
-    try:
-        response = requests.get(url, timeout=5)
-        img = Image.open(BytesIO(response.content))
-        return img
-    except:
-        return None
+commentary_cache = get_commentary_cache()
 
-@st.cache_data
-def load_dict():
-    # Путь к корню проекта и JSON-файлу
-    path_to_file = Path(__file__).resolve().parent.parent / "dict_filtr.json"
-
-    if not path_to_file.exists():
-        st.error(f"❌ Файл не найден: {path_to_file}")
-        return {}
-
-    with open(path_to_file, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-dict_filtr = load_dict()
-
-vector_store = QdrantVectorStore(
-    client=client,
-    collection_name="demo_collection",
-    embedding=hf
-)
 
-
-film_prompt = ChatPromptTemplate.from_messages([
-    ("system", """Ты — Кристофер Тарантино 🎬: страстный кинокритик. Ты получаешь описание фильма и запрос пользователя, и сразу пишешь короткий, но живой и яркий комментарий.
-
-🎯 Твой анализ должен:
-- Избегай вводных размышлений ("хм...", "может быть...")
-- Включать краткий разбор сюжета
-- Учитывать актёрский состав, жанр, режиссёра и год
-- Делать забавные и умные параллели с другими фильмами, сериалами, книгами
-- Подмечать необычности или клише
-- Вставлять киношные мемы или шутки
-- В конце — сказать, стоит ли смотреть, и кому фильм может понравиться
-- Отвечать на русском, необычно но связно, живо, с эмодзи и кинолюбовью
-     
-Важно: отвечай не как бот, а как человек разбирающийся в кино и с хорошим юмором! 🎥🍿"""),
-
-    ("human", "🎥 Запрос пользователя: {question}\n\n📽️ Фильм: {metadata}\n")
-])
+def show_commentary(slot, text):
+    slot.markdown(
+        f"""<div style='margin-top:10px; font-size:22px; color:#ffe5b4; background:#1c1c1c; padding:10px; border-radius:12px'>
+        🎙️ <i>{text}</i>
+        </div>""", unsafe_allow_html=True
+    )
 
 def main():
     st.markdown("<h1 style='text-align: center; color: #d4a5a5; font-size: 48px;'>🧙🏻‍♂️ Киноаналитик AI</h1>", unsafe_allow_html=True)
 
     update = 1
-    if "api_key" not in st.session_state or not st.session_state.api_key:
+    if is_mock_enabled():
+        st.info("LLM-заглушка включена (MOVIE_LLM_MOCK=1), ключ не нужен.")
+        st.session_state.api_key = st.session_state.get("api_key") or "mock"
+    elif "api_key" not in st.session_state or not st.session_state.api_key:
         update = 0
         api_key_input = st.text_input("Введите API-ключ(https://console.groq.com/keys):", type="password")
         if api_key_input:
@@ -114,97 +55,72 @@ def main():
 
     if update == 1:
 
-        llm = ChatGroq(
-            api_key=st.session_state.api_key,
-            model="deepseek-r1-distill-llama-70b",
-            temperature=1.3,
-            max_tokens=1000
-            )
+        # Один запрос на всю выдачу экономит обращения к LLM и входные токены примерно в k раз;
+        # по умолчанию — отдельный запрос на фильм: у каждого комментария свой бюджет токенов
+        batched = st.radio(
+            "Режим комментариев",
+            ["Отдельный запрос на каждый фильм", "Один запрос на всю подборку"],
+            horizontal=True,
+        ) == "Один запрос на всю подборку"
         st.markdown("### 🔍 Введите ваш запрос:")
         query = st.text_input("Например: фэнтези про магию и путешествия", "")
 
         with st.expander("⚙️🎞️ Дополнительные фильтры"):
-            selected_genres = st.multiselect("Жанры", dict_filtr['genres'])
-            selected_directors = st.multiselect("Режиссеры", dict_filtr['directors'])
-            selected_actors = st.multiselect("Актеры", dict_filtr['actors'])
-            selected_years = st.slider("Выберите диапазон годов", min_value=min(dict_filtr['years']), max_value=max(dict_filtr['years']), value=(min(dict_filtr['years']), max(dict_filtr['years'])))
-            selected_ratings = st.slider("Выберите диапазон рейтинга", min_value=min(dict_filtr['ratings']), max_value=10.0, value=(min(dict_filtr['ratings']), 10.0))
-
-        should_conditions = []
-        must_conditions = []
-
-        if selected_genres:
-            should_conditions.append(FieldCondition(key="metadata.genre", match={"any": selected_genres}))
-        if selected_directors:
-            should_conditions.append(FieldCondition(key="metadata.director", match={"any": selected_directors}))
-        if selected_actors:
-            should_conditions.append(FieldCondition(key="metadata.actors", match={"any": selected_actors}))
-
-        if selected_years:
-            must_conditions.append(FieldCondition(key="metadata.year", range=Range(gte=selected_years[0], lte=selected_years[1])))
-        if selected_ratings:
-            must_conditions.append(FieldCondition(key="metadata.rating", range=Range(gte=selected_ratings[0], lte=selected_ratings[1])))
-
-        filter_obj = None
-        if should_conditions or must_conditions:
-            filter_obj = Filter(
-                should=should_conditions if should_conditions else None,
-                must=must_conditions if must_conditions else None
-            )
+            selected_genres, selected_directors, selected_actors, selected_years, selected_ratings = filter_widgets(autocomplete)
+
+        debug = debug_enabled(st.query_params)
 
         if query:
-            with st.spinner('Ищем лучшие рекомендации...'):
-                results = vector_store.similarity_search(query, k=5, filter=filter_obj)
+            filter_obj = page_filter(selected_genres, selected_directors, selected_actors, selected_years, selected_ratings)
+
+            vector_store = get_vector_store()
+            # Параметры HNSW и квантования для поиска (QDRANT_QUANTIZATION, QDRANT_HNSW_EF, ...)
+            search_params = StorageProfile.from_env().search_params()
+
+            with st.spinner('Ищем лучшие рекомендации...'), span("page_ai_search", force=debug) as trace:
+                candidates = None
+                if filter_index is not None:
+                    candidates = filter_index.resolve(selected_genres, selected_directors, selected_actors, selected_years, selected_ratings)
+                results = filtered_similarity_search(vector_store, query, 5, filter_obj, candidates, filter_index, search_params)
+                posters = poster_cache.fetch_many([doc.metadata.get('image_url') for doc in results])
 
             st.markdown(f"Найдено результатов: {len(results)}")
 
-            film_chain = ({
-                            "question": RunnablePassthrough(),
-                            "metadata": lambda md: json.dumps(md, ensure_ascii=False, indent=2)
-                        }
-                        | film_prompt
-                        | llm
-                        | StrOutputParser())
-            
-            for i, doc in enumerate(results):
-                metadata = doc.metadata
+            commentary_slots = []
 
+            for doc in results:
                 with st.container():
-                    st.markdown(
-        f"<h3 style='text-decoration: underline; color: white; margin-bottom: 0.5em;'>"
-        f"<a href='{metadata.get('page_url', '')}' style='text-decoration: underline; color: #d4a5a5; font-size: 35px;'>"
-        f"{metadata.get('movie_title', '')}</a></h3>",
-        unsafe_allow_html=True)
-
-                    cols = st.columns([2, 7])
-                    with cols[0]:
-                        image_url = metadata.get('image_url', '🎞️ Нет постера')
-                        if image_url and image_url.startswith('http'):
-                            img = load_image_from_url(image_url)
-                            if img:
-                                st.image(img, width=300)
-                            else:
-                                st.write('❌ Не удалось загрузить изображение')
-
-                    with cols[1]:
-                        st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Год:</b> {metadata.get('year', '-')}</p>", unsafe_allow_html=True)
-                        st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Жанр:</b> {', '.join(metadata.get('genre', '-'))}</p>", unsafe_allow_html=True)
-                        st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Режиссер:</b> {', '.join(metadata.get('director', '-'))}</p>", unsafe_allow_html=True)
-                        st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Актеры:</b> {', '.join(metadata.get('actors', '-'))}</p>", unsafe_allow_html=True)
-                        st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'><b>Рейтинг IMDb:</b> {metadata.get('rating', '-')}</p>", unsafe_allow_html=True)
-
-                        commentary = film_chain.invoke({
-                        "question": query,
-                        "metadata": metadata
-                    })
-
-                    st.markdown(
-                        f"""<div style='margin-top:10px; font-size:22px; color:#ffe5b4; background:#1c1c1c; padding:10px; border-radius:12px'>
-                        🎙️ <i>{commentary}</i>
-                        </div>""", unsafe_allow_html=True
-                    )
+                    film_card(doc.metadata, posters)
+
+                    # Место под комментарий: он допишется, когда придут первые токены
+                    slot = st.empty()
+                    show_commentary(slot, "⏳ Киноаналитик пишет...")
+                    commentary_slots.append(slot)
 
                     st.divider()
 
+            # Все комментарии генерируются одновременно и дописываются по мере прихода токенов
+            commentaries = [""] * len(results)
+            with span("page_ai_commentary", force=debug) as llm_trace:
+                query_vector = vector_store.embeddings.embed_query(query)
+                if batched:
+                    llm = make_llm(st.session_state.api_key, max_tokens=batch_max_tokens(len(results)),
+                                   mock_responses=MOCK_BATCH_RESPONSES)
+                    events = stream_batched_commentaries(make_batch_chain(llm), query,
+                                                         [(doc.metadata, doc.page_content) for doc in results],
+                                                         cache=commentary_cache, query_vector=query_vector)
+                else:
+                    film_chain = make_film_chain(make_llm(st.session_state.api_key))
+                    events = stream_commentaries(film_chain, query, [doc.metadata for doc in results],
+                                                 cache=commentary_cache, query_vector=query_vector)
+                for i, chunk, error in events:
+                    if error is not None:
+                        show_commentary(commentary_slots[i], f"❌ Не удалось получить комментарий: {error}")
+                    elif chunk:
+                        commentaries[i] += chunk
+                        show_commentary(commentary_slots[i], commentaries[i])
+
+            debug_panel(debug, trace, llm_trace)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1 @@
+"""Общее ядро поиска фильмов, которое используют страницы Streamlit."""
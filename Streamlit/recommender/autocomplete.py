@@ -0,0 +1,250 @@
+"""Подсказки для фильтров и поиска по названию: префиксы и триграммы по названиям, актёрам, режиссёрам и жанрам.
+
+Индекс собирается из колоночного каталога при загрузке данных (ingest, sync) или сам при первом открытии,
+лежит на диске массивами .npy и открывается через mmap. Вместо полных списков с десятками тысяч имён
+в каждом мультиселекте страница получает десяток подходящих вариантов, отсортированных по числу фильмов.
+
+Собрать вручную:  python -m recommender.autocomplete
+"""
+import argparse
+import bisect
+import os
+from collections import Counter
+
+import numpy as np
+
+from .catalog import Catalog, _encode_strings
+from .config import AUTOCOMPLETE_DIR, CATALOG_DIR, CSV_FILE
+from .storage import atomic_write, file_version, read_json, write_json
+
+# Увеличивать при изменении формата массивов
+AUTOCOMPLETE_VERSION = 2
+# Поле подсказок -> столбец каталога
+FIELDS = {"title": "movie_title", "actor": "actors", "director": "director", "genre": "genre"}
+SUGGEST_LIMIT = 10
+# Доля общих триграмм, начиная с которой имя считается похожим на запрос (опечатки, другой порядок слов)
+TRIGRAM_THRESHOLD = 0.5
+# Больше любого символа в ключах: bisect по key + PREFIX_END даёт конец диапазона с префиксом key
+PREFIX_END = "\uffff"
+
+
+def normalize(text):
+    return " ".join(str(text).lower().replace("ё", "е").split())
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _trigram_code(trigram):
+    """Три символа в одном int64: по 21 биту на кодовую точку Unicode"""
+    a, b, c = (ord(char) for char in trigram)
+    return (a << 42) | (b << 21) | c
+
+
+def _decode(data, offsets):
+    return [bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def _film_counts(catalog, field):
+    """Имя -> число фильмов; жанры в нижнем регистре, как в payload точек Qdrant"""
+    column = FIELDS[field]
+    if field == "title":
+        return Counter(catalog.texts(column))
+    codes, vocabulary = np.asarray(catalog.arrays[f"{column}_codes"]), catalog.vocabularies[column]
+    counts = Counter()
+    for name, count in zip(vocabulary, np.bincount(codes, minlength=len(vocabulary)).tolist()):
+        counts[name.lower() if field == "genre" else name] += count
+    return counts
+
+
+def _build_field(counts):
+    names = sorted((name for name in counts if normalize(name)), key=lambda name: (normalize(name), name))
+    keys = [normalize(name) for name in names]
+    arrays = {}
+    arrays["bytes"], arrays["offsets"] = _encode_strings(names)
+    arrays["counts"] = np.asarray([counts[name] for name in names], dtype=np.int32)
+    arrays["by_count"] = np.argsort(-arrays["counts"], kind="stable").astype(np.int32)
+
+    # Начала слов: «хэнкс» находит «Том Хэнкс»
+    words = sorted((word, i) for i, key in enumerate(keys) for word in set(key.split()))
+    arrays["word_bytes"], arrays["word_offsets"] = _encode_strings([word for word, _ in words])
+    arrays["word_ids"] = np.asarray([i for _, i in words], dtype=np.int32)
+
+    # Триграммы в CSR: отсортированные коды и списки номеров имён
+    codes = np.asarray([_trigram_code(t) for key in keys for t in _trigrams(key)], dtype=np.int64)
+    ids = np.asarray([i for i, key in enumerate(keys) for _ in _trigrams(key)], dtype=np.int32)
+    order = np.lexsort((ids, codes))
+    codes, ids = codes[order], ids[order]
+    arrays["trigram_codes"], starts = np.unique(codes, return_index=True)
+    arrays["trigram_offsets"] = np.append(starts, len(codes)).astype(np.int64)
+    arrays["trigram_ids"] = ids
+    return arrays
+
+
+class _Field:
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.names = _decode(arrays["bytes"], arrays["offsets"])
+        self.keys = [normalize(name) for name in self.names]
+        self.words = _decode(arrays["word_bytes"], arrays["word_offsets"])
+        self.counts = arrays["counts"]
+
+
+class AutocompleteIndex:
+    def __init__(self, index_dir, manifest, fields):
+        self.index_dir = str(index_dir)
+        self.fingerprint = manifest["source_sha256"]
+        self.ranges = manifest["ranges"]
+        self.fields = fields
+
+    @staticmethod
+    def _array_path(index_dir, field, name):
+        return os.path.join(str(index_dir), f"{field}_{name}.npy")
+
+    @classmethod
+    def build(cls, catalog, index_dir=AUTOCOMPLETE_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        manifest_path = os.path.join(str(index_dir), "manifest.json")
+        # Манифест пишется последним: недописанный индекс не откроется
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+        arrays = {}
+        for field in FIELDS:
+            for name, array in _build_field(_film_counts(catalog, field)).items():
+                arrays[(field, name)] = array
+                atomic_write(cls._array_path(index_dir, field, name), lambda path, array=array: np.save(path, array))
+
+        write_json(manifest_path, {
+            "version": AUTOCOMPLETE_VERSION,
+            "source_sha256": catalog.fingerprint,
+            "arrays": sorted({name for _, name in arrays}),
+            "sizes": {field: int(len(arrays[(field, "counts")])) for field in FIELDS},
+            # Границы слайдеров года и рейтинга для страниц
+            "ranges": {column: list(catalog.bounds(column)) for column in ("year", "rating")},
+        })
+        return cls.open(index_dir)
+
+    @staticmethod
+    def version(index_dir=AUTOCOMPLETE_DIR):
+        """Меняется при каждой пересборке (манифест пишется последним) — ключ кэша индекса в процессе"""
+        return file_version(os.path.join(str(index_dir), "manifest.json"))
+
+    @classmethod
+    def open(cls, index_dir=AUTOCOMPLETE_DIR, fingerprint=None):
+        """Индекс с диска или None, если он не собран, устарел или собран по другому каталогу"""
+        manifest = read_json(os.path.join(str(index_dir), "manifest.json"))
+        if manifest is None or manifest.get("version") != AUTOCOMPLETE_VERSION:
+            return None
+        if fingerprint is not None and manifest.get("source_sha256") != fingerprint:
+            return None
+        try:
+            fields = {
+                field: _Field({
+                    name: np.load(cls._array_path(index_dir, field, name), mmap_mode="r")
+                    for name in manifest["arrays"]
+                })
+                for field in FIELDS
+            }
+        except (OSError, ValueError):
+            return None
+        return cls(index_dir, manifest, fields)
+
+    @classmethod
+    def load_or_build(cls, csv_path=CSV_FILE, index_dir=AUTOCOMPLETE_DIR, catalog_dir=CATALOG_DIR):
+        """Открывает индекс, а если каталог изменился — пересобирает его.
+
+        Без CSV открывается индекс, собранный при ingest или sync, как есть; если нет и его — None.
+        """
+        if not os.path.exists(csv_path):
+            return cls.open(index_dir)
+        catalog = Catalog.load_or_build(csv_path, catalog_dir)
+        index = cls.open(index_dir, catalog.fingerprint)
+        if index is None:
+            index = cls.build(catalog, index_dir)
+        return index
+
+    def top(self, field, limit=SUGGEST_LIMIT):
+        """Самые частые значения поля; limit=None — все, по убыванию числа фильмов"""
+        entry = self.fields[field]
+        return [entry.names[i] for i in entry.arrays["by_count"][:limit]]
+
+    def _trigram_matches(self, entry, key):
+        arrays = entry.arrays
+        codes = np.asarray([_trigram_code(t) for t in _trigrams(key)], dtype=np.int64)
+        trigram_codes, offsets = arrays["trigram_codes"], arrays["trigram_offsets"]
+        if not len(trigram_codes):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        positions = np.minimum(np.searchsorted(trigram_codes, codes), len(trigram_codes) - 1)
+        found = positions[trigram_codes[positions] == codes]
+        if not len(found):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        ids = np.concatenate([arrays["trigram_ids"][offsets[p]:offsets[p + 1]] for p in found])
+        ids, shared = np.unique(ids, return_counts=True)
+        similarity = shared / len(codes)
+        keep = similarity >= TRIGRAM_THRESHOLD
+        return ids[keep].astype(np.int64), similarity[keep]
+
+    def suggest(self, field, text, limit=SUGGEST_LIMIT):
+        """До limit значений поля под введённый текст.
+
+        Сначала имена, начинающиеся с текста, затем имена со словом, начинающимся с текста, затем похожие
+        по триграммам (опечатки, другой порядок слов); внутри каждой группы — по убыванию числа фильмов.
+        """
+        entry = self.fields[field]
+        key = normalize(text)
+        if not key:
+            return self.top(field, limit)
+
+        counts = entry.counts
+        tiers = [np.arange(bisect.bisect_left(entry.keys, key), bisect.bisect_left(entry.keys, key + PREFIX_END))]
+        lo, hi = bisect.bisect_left(entry.words, key), bisect.bisect_left(entry.words, key + PREFIX_END)
+        tiers.append(np.unique(entry.arrays["word_ids"][lo:hi]).astype(np.int64))
+
+        # Триграммы считаются, только если префиксов не хватило на limit вариантов
+        if len(key) >= 3 and len(np.union1d(tiers[0], tiers[1])) < limit:
+            ids, similarity = self._trigram_matches(entry, key)
+            tiers.append(ids[np.lexsort((-counts[ids], -similarity))])
+
+        result = {}
+        for tier, ids in enumerate(tiers):
+            # Префиксные группы сортируются по числу фильмов, триграммная уже отсортирована по похожести
+            if tier < 2:
+                ids = ids[np.argsort(-counts[ids], kind="stable")]
+            for i in ids.tolist():
+                result.setdefault(i, None)
+                if len(result) >= limit:
+                    return [entry.names[i] for i in result]
+        return [entry.names[i] for i in result]
+
+    def counts(self, field, names):
+        """Число фильмов для значений поля — для подписи вариантов"""
+        entry = self.fields[field]
+        result = {}
+        for name in names:
+            i = bisect.bisect_left(entry.keys, normalize(name))
+            while i < len(entry.keys) and entry.keys[i] == normalize(name):
+                if entry.names[i] == name:
+                    result[name] = int(entry.counts[i])
+                    break
+                i += 1
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка индекса подсказок для фильтров и названий")
+    parser.add_argument("--csv", default=str(CSV_FILE))
+    parser.add_argument("--catalog", default=str(CATALOG_DIR))
+    parser.add_argument("--out", default=str(AUTOCOMPLETE_DIR))
+    args = parser.parse_args()
+
+    catalog = Catalog.load_or_build(args.csv, args.catalog)
+    index = AutocompleteIndex.build(catalog, args.out)
+    sizes = ", ".join(f"{field}: {len(entry.names)}" for field, entry in index.fields.items())
+    print(f"✅ Индекс подсказок ({sizes}) в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Бенчмарк путей поиска: задержки p50/p95/p99, пропускная способность, память и recall@k.
+
+Прогоняет фиксированный набор запросов (evaluation.EVAL_QUERIES) через кодирование запроса, TF-IDF,
+плотный поиск Qdrant с фильтрами и без, гибридный поиск и обе RAG-цепочки с LLM-заглушкой.
+recall@k считается против точного перебора: полного произведения TF-IDF матрицы и exact-поиска Qdrant.
+
+Запуск:             python -m recommender.benchmark --out bench.json
+Проверка регрессий: python -m recommender.benchmark --out bench.json --baseline bench_prev.json
+"""
+import argparse
+import json
+import os
+import resource
+import time
+
+import numpy as np
+
+from .config import COLLECTION_NAME, CSV_FILE, FILTER_INDEX_DIR, QDRANT_PATH, TFIDF_CACHE_DIR
+from .evaluation import EVAL_QUERIES, recall_at_k, top_ids
+from .ingest import point_id
+from .qdrant_store import page_filter
+
+# Комбинации фильтров страниц; "director" дописывается самым частым режиссёром каталога
+EVAL_FILTERS = {
+    "none": {},
+    "genre": {"genres": ["драма"]},
+    "years": {"years": (1990, 2005)},
+    "genre+rating": {"genres": ["комедия", "мелодрама"], "ratings": (7.0, 10.0)},
+}
+MAX_LATENCY_REGRESSION = 0.2
+MAX_RECALL_DROP = 0.01
+
+
+def rss_mb():
+    """Текущий RSS процесса; без /proc — пиковый"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def latency_stats(seconds):
+    ms = 1000 * np.asarray(seconds)
+    return {
+        "n": int(ms.size),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "throughput_qps": float(ms.size / max(ms.sum() / 1000, 1e-9)),
+    }
+
+
+def measure(fn, inputs, repeat=3):
+    """Один прогрев на каждый вход, затем repeat замеров; возвращает времена и результаты последнего прохода"""
+    for item in inputs:
+        fn(item)
+    rss_before = rss_mb()
+    seconds, outputs = [], []
+    for _ in range(repeat):
+        outputs = []
+        for item in inputs:
+            start = time.perf_counter()
+            outputs.append(fn(item))
+            seconds.append(time.perf_counter() - start)
+    stats = latency_stats(seconds)
+    stats["rss_mb"] = rss_mb()
+    stats["rss_delta_mb"] = stats["rss_mb"] - rss_before
+    return stats, outputs
+
+
+def exact_tfidf_rows(engine, query, k):
+    """Эталон TF-IDF: косинус со всеми документами без инвертированного индекса"""
+    query_vec = engine.vectorizer.transform([query.lower()])
+    scores = (engine.tfidf_matrix @ query_vec.T).toarray().ravel()
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [int(row) for row in order if scores[row] > 0]
+
+
+def run_benchmark(engine, vector_store, base_embeddings, filter_index=None, search_params=None,
+                  queries=EVAL_QUERIES, filters=None, k=10, repeat=3, log=print):
+    from qdrant_client.models import SearchParams
+
+    from .filter_index import filtered_similarity_search
+    from .hybrid import HybridSearcher
+    from .llm import (
+        MOCK_BATCH_RESPONSES, make_batch_chain, make_film_chain, make_mock_llm,
+        stream_batched_commentaries, stream_commentaries,
+    )
+
+    filters = dict(EVAL_FILTERS if filters is None else filters)
+    if "director" not in filters:
+        directors = engine.catalog.vocabularies["director"]
+        counts = np.bincount(engine.catalog.arrays["director_codes"], minlength=len(directors))
+        if len(directors):
+            filters["director"] = {"directors": [directors[int(counts.argmax())]]}
+
+    client, collection_name = vector_store.client, vector_store.collection_name
+    exact = SearchParams(exact=True)
+    cases = {}
+
+    def report(name, stats):
+        cases[name] = stats
+        recall = stats.get(f"recall@{k}")
+        recall_text = "" if recall is None else f", recall@{k} {recall:.3f}"
+        log(f"{name}: p50 {stats['p50_ms']:.1f} мс, p95 {stats['p95_ms']:.1f} мс, "
+            f"{stats['throughput_qps']:.1f} запр/с{recall_text}")
+
+    stats, _ = measure(base_embeddings.embed_query, queries, repeat)
+    report("embed_query", stats)
+    # Дальше векторы запросов берутся из кэша: замеряется сам поиск
+    vectors = {query: vector_store.embeddings.embed_query(query) for query in queries}
+
+    stats, outputs = measure(lambda query: engine.search_rows(query, k, 0.0)[0].tolist(), queries, repeat)
+    stats[f"recall@{k}"] = float(np.mean([
+        recall_at_k(exact_tfidf_rows(engine, query, k), found, k) for query, found in zip(queries, outputs)
+    ]))
+    report("tfidf", stats)
+
+    hybrid = HybridSearcher(engine, vector_store, search_params=search_params)
+    for filter_name, selection in filters.items():
+        query_filter = page_filter(**selection)
+        candidates = filter_index.resolve(**selection) if filter_index is not None else None
+        rows = engine.catalog.filter_rows(**selection)
+
+        def dense(query, fetch_k=k, with_scores=False):
+            return filtered_similarity_search(vector_store, query, fetch_k, query_filter, candidates,
+                                              filter_index, search_params, with_scores=with_scores)
+
+        stats, outputs = measure(dense, queries, repeat)
+        stats[f"recall@{k}"] = float(np.mean([
+            recall_at_k(
+                [str(pid) for pid in top_ids(client, collection_name, vectors[query], k, query_filter, exact)],
+                [point_id(doc.metadata.get("page_url", "")) for doc in found],
+                k,
+            )
+            for query, found in zip(queries, outputs)
+        ]))
+        report(f"dense[{filter_name}]", stats)
+
+        stats, _ = measure(
+            lambda query: hybrid.search(query, k, lambda text, fetch_k: dense(text, fetch_k, True), rows, query_filter),
+            queries, repeat,
+        )
+        report(f"hybrid[{filter_name}]", stats)
+
+    # RAG с заглушкой LLM: замеряется сборка контекста, цепочка и разбор ответа, а не сеть
+    top_docs = {query: filtered_similarity_search(vector_store, query, 5, search_params=search_params)
+                for query in queries}
+    batch_chain = make_batch_chain(make_mock_llm(MOCK_BATCH_RESPONSES, delay=0))
+    film_chain = make_film_chain(make_mock_llm(delay=0))
+
+    def drain(events):
+        return sum(1 for _ in events)
+
+    stats, _ = measure(lambda query: drain(stream_batched_commentaries(
+        batch_chain, query, [(doc.metadata, doc.page_content) for doc in top_docs[query]])), queries, repeat)
+    report("rag_batched", stats)
+    stats, _ = measure(lambda query: drain(stream_commentaries(
+        film_chain, query, [doc.metadata for doc in top_docs[query]])), queries, repeat)
+    report("rag_per_film", stats)
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "k": k,
+            "repeat": repeat,
+            "queries": len(queries),
+            "filters": {name: {key: list(value) for key, value in selection.items()} for name, selection in filters.items()},
+            "n_docs": len(engine.catalog),
+            "qdrant": "server" if os.environ.get("QDRANT_URL") else "local",
+            "filter_index": filter_index is not None,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+        "cases": cases,
+    }
+
+
+def compare(current, baseline, max_latency_regression=MAX_LATENCY_REGRESSION, max_recall_drop=MAX_RECALL_DROP):
+    """Список регрессий относительно прошлого прогона: рост p95 и падение recall@k сверх допуска"""
+    problems = []
+    k = current["meta"]["k"]
+    for name, stats in current["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if previous is None:
+            continue
+        if stats["p95_ms"] > previous["p95_ms"] * (1 + max_latency_regression):
+            problems.append(f"{name}: p95 {previous['p95_ms']:.1f} → {stats['p95_ms']:.1f} мс")
+        recall, previous_recall = stats.get(f"recall@{k}"), previous.get(f"recall@{k}")
+        if recall is not None and previous_recall is not None and recall < previous_recall - max_recall_drop:
+            problems.append(f"{name}: recall@{k} {previous_recall:.3f} → {recall:.3f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска и RAG")
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--baseline", default=None, help="прошлый результат для проверки регрессий")
+    parser.add_argument("--max-latency-regression", type=float, default=MAX_LATENCY_REGRESSION)
+    parser.add_argument("--max-recall-drop", type=float, default=MAX_RECALL_DROP)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--csv", default=str(CSV_FILE))
+    parser.add_argument("--tfidf-cache", default=str(TFIDF_CACHE_DIR))
+    parser.add_argument("--qdrant-path", default=str(QDRANT_PATH))
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    args = parser.parse_args()
+
+    from langchain_qdrant import QdrantVectorStore
+
+    from .embeddings import CachedEmbeddings, make_query_model
+    from .filter_index import FilterIndex
+    from .qdrant_store import StorageProfile, make_client
+    from .storage import write_json
+    from .tfidf import MovieSearchEngine
+
+    engine = MovieSearchEngine.load_or_build(args.csv, args.tfidf_cache)
+    base, model_name = make_query_model()
+    vector_store = QdrantVectorStore(
+        client=make_client(args.qdrant_path),
+        collection_name=args.collection,
+        embedding=CachedEmbeddings(base, model_name=model_name),
+    )
+    filter_index = None if os.environ.get("QDRANT_URL") else FilterIndex.load(FILTER_INDEX_DIR)
+
+    result = run_benchmark(engine, vector_store, base, filter_index, StorageProfile.from_env().search_params(),
+                           k=args.k, repeat=args.repeat)
+    result["meta"]["embedding_model"] = model_name
+    write_json(args.out, result)
+    print(f"✅ Результаты: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(result, baseline, args.max_latency_regression, args.max_recall_drop)
+        if problems:
+            raise SystemExit("❌ Регрессии:\n" + "\n".join(problems))
+        print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
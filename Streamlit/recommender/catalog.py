@@ -0,0 +1,253 @@
+"""Каталог фильмов в колоночном виде: films_data.csv разбирается один раз и открывается через mmap.
+
+Каждый столбец — отдельный .npy: строки хранятся как UTF-8 байты + смещения, год и рейтинг — числами,
+жанры, режиссёры и актёры — словарными кодами (CSR-списки номеров значений). Страницы открывают
+каталог без копирования, а ОС делит страницы файлов между всеми сессиями и процессами.
+В DataFrame превращаются только те строки, которые показываются на странице.
+
+Каталог пересобирается сам, если films_data.csv изменился; вручную:  python -m recommender.catalog
+"""
+import argparse
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from .config import CATALOG_DIR, CSV_FILE
+from .storage import atomic_write, file_sha256, file_version, read_json, write_json
+
+# Увеличивать при изменении формата столбцов
+CATALOG_VERSION = 3
+COLUMNS = ("page_url", "image_url", "movie_title", "year", "description", "director", "actors", "genre", "rating")
+STRING_COLUMNS = ("page_url", "image_url", "movie_title", "description")
+LIST_COLUMNS = ("director", "actors", "genre")
+NUMERIC_COLUMNS = ("year", "rating")
+# Чем заменять нечисловые значения: рейтинг — 0.0, как в ingest.prepare_rows и payload Qdrant;
+# год пуст только у строк, которые ingest отбрасывает целиком
+NUMERIC_FILL = {"year": 0, "rating": 0.0}
+
+
+def _split(value):
+    if not isinstance(value, str):
+        return []
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _encode_strings(values):
+    encoded = [value.encode("utf-8") if isinstance(value, str) else b"" for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _encode_lists(values):
+    """Словарь значений и CSR-списки их номеров по строкам"""
+    vocabulary, codes, lengths = {}, [], []
+    for value in values:
+        items = _split(value)
+        codes.extend(vocabulary.setdefault(item, len(vocabulary)) for item in items)
+        lengths.append(len(items))
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return list(vocabulary), np.asarray(codes, dtype=np.int32), offsets
+
+
+def _indexed(df):
+    """Строки, которые ingest загружает в Qdrant: без пропусков (prepare_rows), при повторе page_url — последняя"""
+    complete = df.notna().all(axis=1)
+    return (complete & ~df['page_url'].where(complete).duplicated(keep='last')).to_numpy(dtype=bool)
+
+
+def _numeric(series, column):
+    values = pd.to_numeric(series, errors="coerce").fillna(NUMERIC_FILL[column])
+    if column == "year" and (values == values.round()).all():
+        return values.to_numpy(dtype=np.int32)
+    return values.to_numpy(dtype=np.float64)
+
+
+class Catalog:
+    def __init__(self, catalog_dir, manifest, arrays, vocabularies):
+        self.catalog_dir = str(catalog_dir)
+        self.fingerprint = manifest["source_sha256"]
+        self.n_rows = manifest["n_rows"]
+        self.arrays = arrays
+        self.vocabularies = vocabularies
+        self.all_indexed = bool(np.all(arrays["indexed"]))
+
+    def __len__(self):
+        return self.n_rows
+
+    @staticmethod
+    def _array_path(catalog_dir, name):
+        return os.path.join(str(catalog_dir), f"{name}.npy")
+
+    @classmethod
+    def build(cls, df, fingerprint, catalog_dir=CATALOG_DIR):
+        """Раскладывает DataFrame из CSV по столбцам на диске и открывает результат"""
+        os.makedirs(catalog_dir, exist_ok=True)
+        manifest_path = os.path.join(str(catalog_dir), "manifest.json")
+        # Манифест пишется последним: недописанный каталог не откроется
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+        arrays, vocabularies = {}, {}
+        for column in STRING_COLUMNS:
+            arrays[f"{column}_bytes"], arrays[f"{column}_offsets"] = _encode_strings(df[column])
+        for column in LIST_COLUMNS:
+            vocabularies[column], arrays[f"{column}_codes"], arrays[f"{column}_offsets"] = _encode_lists(df[column])
+        for column in NUMERIC_COLUMNS:
+            arrays[column] = _numeric(df[column], column)
+        arrays["indexed"] = _indexed(df)
+
+        for name, array in arrays.items():
+            atomic_write(cls._array_path(catalog_dir, name), lambda path, array=array: np.save(path, array))
+        write_json(os.path.join(str(catalog_dir), "vocabularies.json"), vocabularies)
+        write_json(manifest_path, {
+            "version": CATALOG_VERSION,
+            "source_sha256": fingerprint,
+            "n_rows": len(df),
+            "arrays": sorted(arrays),
+        })
+        return cls.open(catalog_dir)
+
+    @staticmethod
+    def version(catalog_dir=CATALOG_DIR):
+        """Меняется при каждой пересборке (манифест пишется последним) — ключ кэша каталога в процессе"""
+        return file_version(os.path.join(str(catalog_dir), "manifest.json"))
+
+    @classmethod
+    def open(cls, catalog_dir=CATALOG_DIR, fingerprint=None):
+        """Каталог с диска или None, если он не собран, устарел или собран по другому CSV"""
+        manifest = read_json(os.path.join(str(catalog_dir), "manifest.json"))
+        vocabularies = read_json(os.path.join(str(catalog_dir), "vocabularies.json"))
+        if manifest is None or vocabularies is None or manifest.get("version") != CATALOG_VERSION:
+            return None
+        if fingerprint is not None and manifest.get("source_sha256") != fingerprint:
+            return None
+        try:
+            arrays = {
+                name: np.load(cls._array_path(catalog_dir, name), mmap_mode="r") for name in manifest["arrays"]
+            }
+        except (OSError, ValueError):
+            return None
+        return cls(catalog_dir, manifest, arrays, vocabularies)
+
+    @classmethod
+    def load_or_build(cls, csv_path=CSV_FILE, catalog_dir=CATALOG_DIR):
+        """Открывает каталог, а если CSV изменился — пересобирает его"""
+        fingerprint = file_sha256(csv_path)
+        catalog = cls.open(catalog_dir, fingerprint)
+        if catalog is None:
+            with open(csv_path, "rb") as f:
+                df = pd.read_csv(io.BytesIO(f.read()))
+            catalog = cls.build(df, fingerprint, catalog_dir)
+        return catalog
+
+    def _rows(self, rows):
+        return np.arange(self.n_rows) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    def indexed_rows(self, rows=None):
+        """Строки из rows, у которых есть точка в Qdrant; None — если ограничивать нечего"""
+        if rows is None and self.all_indexed:
+            return None
+        rows = self._rows(rows)
+        return rows[self.arrays["indexed"][rows]]
+
+    def texts(self, column, rows=None):
+        """Значения строкового столбца для строк rows (по умолчанию — для всех)"""
+        data, offsets = self.arrays[f"{column}_bytes"], self.arrays[f"{column}_offsets"]
+        return [bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in self._rows(rows)]
+
+    def values(self, column, row):
+        """Декодированный список значений (жанры, режиссёры, актёры) одной строки"""
+        codes, offsets = self.arrays[f"{column}_codes"], self.arrays[f"{column}_offsets"]
+        vocabulary = self.vocabularies[column]
+        return [vocabulary[code] for code in codes[offsets[row]:offsets[row + 1]]]
+
+    def joined(self, column, rows=None):
+        return [", ".join(self.values(column, row)) for row in self._rows(rows)]
+
+    def numbers(self, column, rows=None):
+        array = self.arrays[column]
+        return np.asarray(array if rows is None else array[self._rows(rows)])
+
+    def bounds(self, column):
+        """Наименьшее и наибольшее значение года или рейтинга среди фильмов в Qdrant — границы слайдеров"""
+        values = self.numbers(column, self.indexed_rows()).astype(np.float64)
+        if not len(values) or np.isnan(values).all():
+            return (0, 0) if column == "year" else (0.0, 10.0)
+        low, high = np.nanmin(values), np.nanmax(values)
+        return (int(low), int(high)) if column == "year" else (float(low), float(high))
+
+    def frame(self, rows=None):
+        """DataFrame с теми же столбцами, что в CSV, только для нужных строк; индекс — номера строк каталога"""
+        rows = self._rows(rows)
+        data = {}
+        for column in COLUMNS:
+            if column in STRING_COLUMNS:
+                data[column] = self.texts(column, rows)
+            elif column in LIST_COLUMNS:
+                data[column] = self.joined(column, rows)
+            else:
+                data[column] = self.numbers(column, rows)
+        return pd.DataFrame(data, index=rows)
+
+    def metadata(self, row):
+        """Метаданные строки в том же виде, что payload точек Qdrant (ingest.row_metadata)"""
+        return {
+            'movie_title': self.texts('movie_title', [row])[0],
+            'year': int(self.arrays['year'][row]),
+            'director': self.values('director', row),
+            'actors': self.values('actors', row),
+            'genre': [genre.lower() for genre in self.values('genre', row)],
+            'rating': float(self.arrays['rating'][row]),
+            'page_url': self.texts('page_url', [row])[0],
+            'image_url': self.texts('image_url', [row])[0],
+        }
+
+    def _matching_rows(self, column, selected, lower=False):
+        vocabulary = self.vocabularies[column]
+        if lower:
+            selected = {value.lower() for value in selected}
+            codes = [code for code, value in enumerate(vocabulary) if value.lower() in selected]
+        else:
+            selected = set(selected)
+            codes = [code for code, value in enumerate(vocabulary) if value in selected]
+        offsets = self.arrays[f"{column}_offsets"]
+        row_of_code = np.repeat(np.arange(self.n_rows), np.diff(offsets))
+        return row_of_code[np.isin(self.arrays[f"{column}_codes"], codes)]
+
+    def filter_rows(self, genres=(), directors=(), actors=(), years=None, ratings=None):
+        """Строки, проходящие фильтр страниц, или None, если фильтр ничего не ограничивает.
+
+        Семантика та же, что у Filter страниц и FilterIndex.resolve: жанры, режиссёры и актёры —
+        через «или», диапазоны года и рейтинга обязательны.
+        """
+        mask = None
+        if genres or directors or actors:
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[self._matching_rows('genre', genres, lower=True)] = True
+            mask[self._matching_rows('director', directors)] = True
+            mask[self._matching_rows('actors', actors)] = True
+        for column, bounds in (('year', years), ('rating', ratings)):
+            if bounds is None:
+                continue
+            values = self.arrays[column]
+            in_range = (values >= bounds[0]) & (values <= bounds[1])
+            mask = in_range if mask is None else mask & in_range
+        return None if mask is None else np.flatnonzero(mask)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка колоночного каталога из films_data.csv")
+    parser.add_argument("--csv", default=str(CSV_FILE))
+    parser.add_argument("--out", default=str(CATALOG_DIR))
+    args = parser.parse_args()
+
+    catalog = Catalog.load_or_build(args.csv, args.out)
+    print(f"✅ Каталог: {len(catalog)} фильмов в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
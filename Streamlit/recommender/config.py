@@ -0,0 +1,23 @@
+from pathlib import Path
+
+# Папка Streamlit — здесь лежат страницы, данные и кэши
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CSV_FILE = BASE_DIR / "films_data.csv"
+TFIDF_CACHE_DIR = BASE_DIR / "tfidf_cache"
+NEIGHBORS_DIR = BASE_DIR / "neighbors_cache"
+FILTER_INDEX_DIR = BASE_DIR / "filter_index"
+CATALOG_DIR = BASE_DIR / "catalog"
+AUTOCOMPLETE_DIR = BASE_DIR / "autocomplete"
+# Списки фильтров на случай, если индекса подсказок нет: страницы работают без CSV
+FILTER_VALUES_FILE = BASE_DIR / "dict_filtr.json"
+# Рабочие кэши, которые наполняются во время работы приложения
+RUNTIME_CACHE_DIR = BASE_DIR / "cache"
+QUERY_CACHE_PATH = RUNTIME_CACHE_DIR / "query_embeddings.sqlite"
+COMMENTARY_CACHE_PATH = RUNTIME_CACHE_DIR / "commentaries.sqlite"
+POSTER_CACHE_DIR = RUNTIME_CACHE_DIR / "posters"
+ONNX_MODEL_DIR = BASE_DIR / "models" / "mpnet-onnx"
+QDRANT_PATH = BASE_DIR.parent / "db" / "qdrant_db"
+INGEST_CHECKPOINT = BASE_DIR.parent / "db" / "ingest_checkpoint.json"
+SYNC_MANIFEST = BASE_DIR.parent / "db" / "sync_manifest.json"
+COLLECTION_NAME = "demo_collection"
@@ -0,0 +1,185 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import QUERY_CACHE_PATH
+from .text import normalize_query
+from .tracing import span, traced
+
+MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+BACKENDS = ("hf", "onnx")
+QUERY_CACHE_SIZE = 4096
+# Сколько векторов держать на диске между перезапусками
+QUERY_CACHE_DISK_SIZE = 100_000
+# Увеличивать, если меняется то, что подаётся в модель: старые векторы на диске перестанут находиться
+QUERY_CACHE_VERSION = 2
+
+
+def make_embeddings(device="cpu", batch_size=32):
+    """Модель эмбеддингов, которой построена коллекция demo_collection"""
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=MODEL_NAME,
+        model_kwargs={"device": device},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": batch_size}
+    )
+
+
+def make_query_model(backend=None, threads=None):
+    """Модель для кодирования запросов и её имя для ключей кэша.
+
+    Бэкенд и число потоков берутся из EMBEDDINGS_BACKEND (hf | onnx) и EMBEDDINGS_THREADS.
+    """
+    backend = backend or os.environ.get("EMBEDDINGS_BACKEND", "hf")
+    threads = threads or int(os.environ.get("EMBEDDINGS_THREADS", "0")) or None
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд эмбеддингов: {backend}. Доступны: {', '.join(BACKENDS)}")
+
+    if backend == "onnx":
+        from .onnx_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings(threads=threads), f"{MODEL_NAME}:onnx-int8"
+
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    return make_embeddings(device="cpu"), MODEL_NAME
+
+
+class CachedEmbeddings(Embeddings):
+    """LRU-кэш векторов запросов перед моделью, при желании с копией на диске (SQLite).
+
+    Перезапуски страницы из-за фильтров и популярные повторные запросы не доходят до трансформера.
+    Документы не кэшируются — они кодируются только при загрузке коллекции.
+    """
+
+    def __init__(self, base, max_size=QUERY_CACHE_SIZE, persist_path=None,
+                 disk_size=QUERY_CACHE_DISK_SIZE, model_name=MODEL_NAME):
+        self.base = base
+        self.max_size = max_size
+        self.disk_size = disk_size
+        self.model_name = model_name
+        self._disk_key = f"{model_name}:v{QUERY_CACHE_VERSION}"
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = self._open_db(persist_path) if persist_path else None
+
+    @staticmethod
+    def _open_db(path):
+        os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+        db = sqlite3.connect(str(path), check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "model TEXT, query TEXT, vector BLOB, PRIMARY KEY (model, query))"
+        )
+        db.commit()
+        return db
+
+    def _remember(self, key, vector):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def _read_disk(self, key):
+        row = self._db.execute(
+            "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?", (self._disk_key, key)
+        ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def _write_disk(self, key, vector):
+        self._db.execute(
+            "INSERT OR REPLACE INTO query_embeddings (model, query, vector) VALUES (?, ?, ?)",
+            (self._disk_key, key, vector.tobytes()),
+        )
+        # Самые старые записи вытесняются, чтобы файл не рос бесконечно
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE rowid IN ("
+            "SELECT rowid FROM query_embeddings ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+            (self.disk_size,),
+        )
+        self._db.commit()
+
+    def _lookup(self, key):
+        """Вектор из памяти или с диска; вызывается под self._lock"""
+        vector = self._cache.get(key)
+        if vector is None and self._db is not None:
+            vector = self._read_disk(key)
+            if vector is not None:
+                self._remember(key, vector)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return vector
+
+    def _store(self, key, vector):
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                self._write_disk(key, vector)
+
+    @traced("embed_query")
+    def embed_query(self, text):
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._lookup(key)
+            if vector is not None:
+                return vector.tolist()
+            self.misses += 1
+
+        # Ключ кэша нормализован, а модель получает запрос как есть: токенизатор различает регистр
+        with span("embed_model"):
+            vector = np.asarray(self.base.embed_query(text), dtype=np.float32)
+        self._store(key, vector)
+        return vector.tolist()
+
+    @traced("embed_queries")
+    def embed_queries(self, texts):
+        """Векторы нескольких запросов: найденные в кэше берутся оттуда, остальные кодируются одним батчем"""
+        keys = [normalize_query(text) for text in texts]
+        # Первый исходный текст для каждого ключа — его и кодирует модель
+        originals = {}
+        for key, text in zip(keys, texts):
+            originals.setdefault(key, text)
+        vectors = {}
+        with self._lock:
+            for key in originals:
+                vector = self._lookup(key)
+                if vector is not None:
+                    vectors[key] = vector
+            missing = [key for key in originals if key not in vectors]
+            self.misses += len(missing)
+
+        if missing:
+            # Для обеих моделей запрос кодируется так же, как документ
+            with span("embed_model"):
+                encoded = np.asarray(self.base.embed_documents([originals[key] for key in missing]), dtype=np.float32)
+            for key, vector in zip(missing, encoded):
+                self._store(key, vector)
+                vectors[key] = vector
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_query_embeddings():
+    """Одна модель с кэшем запросов на весь процесс — общая для всех страниц и сессий"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            model, model_name = make_query_model()
+            _shared = CachedEmbeddings(model, persist_path=QUERY_CACHE_PATH, model_name=model_name)
+        return _shared
@@ -0,0 +1,42 @@
+"""Общие функции для проверки качества поиска: набор запросов и recall@k."""
+
+# Запросы в духе примеров из ноутбуков — короткие описания того, что хочет посмотреть пользователь
+EVAL_QUERIES = [
+    "Ужастик с интересным и необычным сюжетом",
+    "Фильм про путешествия фэнтези кольца",
+    "фэнтези про магию и путешествия",
+    "военная драма",
+    "космическая фантастика про роботов",
+    "романтическая комедия в большом городе",
+    "детектив с неожиданной развязкой",
+    "мультфильм для всей семьи",
+    "биография известного музыканта",
+    "криминальный триллер про ограбление банка",
+    "документальный фильм о природе",
+    "история первой любви в школе",
+    "супергерои спасают мир",
+    "психологический триллер о потере памяти",
+    "вестерн про охотника за головами",
+    "комедия о неудачливых грабителях",
+]
+
+
+def recall_at_k(expected, found, k):
+    """Доля эталонных top-k результатов, попавших в найденные top-k"""
+    expected = list(expected)[:k]
+    if not expected:
+        return 1.0
+    return len(set(expected) & set(list(found)[:k])) / len(expected)
+
+
+def top_ids(client, collection_name, vector, k, query_filter=None, search_params=None):
+    """ID top-k точек коллекции для готового вектора запроса"""
+    response = client.query_points(
+        collection_name=collection_name,
+        query=vector,
+        limit=k,
+        query_filter=query_filter,
+        search_params=search_params,
+        with_payload=False,
+    )
+    return [point.id for point in response.points]
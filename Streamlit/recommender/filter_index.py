@@ -0,0 +1,271 @@
+"""Предвычисленный индекс фильтров для встроенного Qdrant.
+
+Во встроенном режиме Qdrant проверяет фильтр для каждой точки по очереди, поэтому узкий фильтр
+(один режиссёр) стоит не меньше поиска без фильтра. Здесь фильтры страниц заранее разложены по структурам
+в духе roaring bitmap: жанры и годы — упакованные битовые маски, режиссёры и актёры — отсортированные
+списки строк, рейтинг — порядок сортировки для бинарного поиска. Комбинация фильтров сначала сводится
+к набору кандидатов, и векторы сравниваются только с ними.
+
+Индекс собирается при загрузке коллекции (recommender.ingest / recommender.sync).
+"""
+import os
+
+import numpy as np
+
+from .config import FILTER_INDEX_DIR
+from .ingest import point_id, prepare_rows, row_metadata
+from .qdrant_store import dense_vector
+from .ranking import top_k
+from .storage import atomic_write, file_version, read_json, write_json
+from .tracing import traced
+
+# Дальше кандидатов выгоднее отдать фильтр самому Qdrant
+MAX_CANDIDATES = 1024
+
+
+def _bits(rows, n):
+    mask = np.zeros(n, dtype=bool)
+    mask[rows] = True
+    return np.packbits(mask)
+
+
+def _postings(values_per_row):
+    """Список значений и CSR-списки строк для каждого значения"""
+    rows_by_value = {}
+    for row, values in enumerate(values_per_row):
+        for value in set(values):
+            rows_by_value.setdefault(value, []).append(row)
+    values = sorted(rows_by_value)
+    lengths = [len(rows_by_value[value]) for value in values]
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    rows = np.fromiter((row for value in values for row in rows_by_value[value]), dtype=np.int32, count=int(offsets[-1]))
+    return values, offsets, rows
+
+
+class FilterIndex:
+    def __init__(self, point_ids, genres, directors, actors, arrays):
+        self.point_ids = np.asarray(point_ids)
+        self.n = len(point_ids)
+        self.genres = {value: i for i, value in enumerate(genres)}
+        self.directors = {value: i for i, value in enumerate(directors)}
+        self.actors = {value: i for i, value in enumerate(actors)}
+        self.arrays = arrays
+        self.year_min = int(arrays["year_min"])
+        self._verified = {}
+
+    @classmethod
+    def build(cls, df):
+        """Индекс по тем же строкам и метаданным, что загружаются в Qdrant"""
+        films = prepare_rows(df).drop_duplicates('page_url', keep='last')
+        metadata = [row_metadata(row) for _, row in films.iterrows()]
+        n = len(metadata)
+
+        year = np.array([md['year'] for md in metadata], dtype=np.int16)
+        rating = np.array([md['rating'] for md in metadata], dtype=np.float64)
+        year_min = int(year.min()) if n else 0
+        year_max = int(year.max()) if n else -1
+
+        genres, genre_offsets, genre_rows = _postings(md['genre'] for md in metadata)
+        directors, director_offsets, director_rows = _postings(md['director'] for md in metadata)
+        actors, actor_offsets, actor_rows = _postings(md['actors'] for md in metadata)
+
+        n_bytes = (n + 7) // 8
+        genre_bits = np.zeros((len(genres), n_bytes), dtype=np.uint8)
+        for i in range(len(genres)):
+            genre_bits[i] = _bits(genre_rows[genre_offsets[i]:genre_offsets[i + 1]], n)
+        year_bits = np.zeros((max(year_max - year_min + 1, 0), n_bytes), dtype=np.uint8)
+        for i in range(len(year_bits)):
+            year_bits[i] = _bits(np.flatnonzero(year == year_min + i), n)
+
+        rating_order = np.argsort(rating, kind="stable").astype(np.int32)
+        arrays = {
+            "year": year,
+            "rating": rating,
+            "rating_order": rating_order,
+            "rating_sorted": rating[rating_order],
+            "year_min": np.array(year_min),
+            "genre_bits": genre_bits,
+            "year_bits": year_bits,
+            "director_offsets": director_offsets,
+            "director_rows": director_rows,
+            "actor_offsets": actor_offsets,
+            "actor_rows": actor_rows,
+        }
+        point_ids = [point_id(md['page_url']) for md in metadata]
+        return cls(point_ids, genres, directors, actors, arrays)
+
+    def save(self, index_dir=FILTER_INDEX_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        atomic_write(os.path.join(index_dir, "arrays.npz"), lambda path: np.savez_compressed(path, **self.arrays))
+        write_json(os.path.join(index_dir, "values.json"), {
+            "point_ids": self.point_ids.tolist(),
+            "genres": list(self.genres),
+            "directors": list(self.directors),
+            "actors": list(self.actors),
+        })
+
+    @staticmethod
+    def version(index_dir=FILTER_INDEX_DIR):
+        """Меняется при каждой пересборке (values.json пишется последним) — ключ кэша индекса в процессе"""
+        return file_version(os.path.join(index_dir, "values.json"))
+
+    @classmethod
+    def load(cls, index_dir=FILTER_INDEX_DIR):
+        """Индекс с диска или None, если он ещё не собран"""
+        values = read_json(os.path.join(index_dir, "values.json"))
+        arrays_path = os.path.join(index_dir, "arrays.npz")
+        if values is None or not os.path.exists(arrays_path):
+            return None
+        with np.load(arrays_path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(values["point_ids"], values["genres"], values["directors"], values["actors"], arrays)
+
+    def matches_collection(self, client, collection_name, sample_size=16):
+        """Индекс собран по этой коллекции: число точек то же и id из индекса в ней есть.
+
+        Коллекция из ноутбука (uuid4) или не синхронизированная с индексом дала бы пустую выдачу
+        на узких фильтрах. Проверка делается один раз на коллекцию.
+        """
+        if collection_name not in self._verified:
+            count = client.count(collection_name=collection_name, exact=True).count
+            sample = self.point_ids[np.unique(np.linspace(0, self.n - 1, min(self.n, sample_size)).astype(int))]
+            found = client.retrieve(collection_name=collection_name, ids=sample.tolist(),
+                                    with_payload=False, with_vectors=False) if len(sample) else []
+            self._verified[collection_name] = count == self.n and len(found) == len(sample)
+        return self._verified[collection_name]
+
+    def _posting_rows(self, lookup, offsets, rows, values):
+        ids = [lookup[value] for value in values if value in lookup]
+        if not ids:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([rows[offsets[i]:offsets[i + 1]] for i in ids])
+
+    def resolve(self, genres=(), directors=(), actors=(), years=None, ratings=None):
+        """Строки, проходящие фильтр страниц, или None, если фильтр ничего не ограничивает.
+
+        Как и в Filter страниц: жанры, режиссёры и актёры объединяются через «или» (should),
+        диапазоны года и рейтинга обязательны (must).
+        """
+        arrays = self.arrays
+        candidates = None
+
+        if genres or directors or actors:
+            parts = [
+                self._posting_rows(self.directors, arrays["director_offsets"], arrays["director_rows"], directors),
+                self._posting_rows(self.actors, arrays["actor_offsets"], arrays["actor_rows"], actors),
+            ]
+            genre_ids = [self.genres[genre] for genre in genres if genre in self.genres]
+            if genre_ids:
+                bits = np.bitwise_or.reduce(arrays["genre_bits"][genre_ids], axis=0)
+                parts.append(np.flatnonzero(np.unpackbits(bits, count=self.n)))
+            candidates = np.unique(np.concatenate(parts)).astype(np.int32)
+
+        year_limited = years is not None and (
+            years[0] > self.year_min or years[1] < self.year_min + len(arrays["year_bits"]) - 1
+        )
+        rating_limited = ratings is not None and self.n and (
+            ratings[0] > arrays["rating"].min() or ratings[1] < arrays["rating"].max()
+        )
+
+        if candidates is not None:
+            # Для кандидатов из should диапазоны проверяются прямо по их столбцам
+            keep = np.ones(len(candidates), dtype=bool)
+            if year_limited:
+                year = arrays["year"][candidates]
+                keep &= (year >= years[0]) & (year <= years[1])
+            if rating_limited:
+                rating = arrays["rating"][candidates]
+                keep &= (rating >= ratings[0]) & (rating <= ratings[1])
+            return candidates[keep]
+
+        if not year_limited and not rating_limited:
+            return None
+
+        bits = np.full((self.n + 7) // 8, 0xFF, dtype=np.uint8)
+        if year_limited:
+            first = max(years[0] - self.year_min, 0)
+            last = max(years[1] - self.year_min + 1, first)
+            year_bits = arrays["year_bits"][first:last]
+            bits &= np.bitwise_or.reduce(year_bits, axis=0) if len(year_bits) else 0
+        if rating_limited:
+            order, sorted_rating = arrays["rating_order"], arrays["rating_sorted"]
+            lo = np.searchsorted(sorted_rating, ratings[0], side="left")
+            hi = np.searchsorted(sorted_rating, ratings[1], side="right")
+            bits &= _bits(order[lo:hi], self.n)
+        return np.flatnonzero(np.unpackbits(bits, count=self.n)).astype(np.int32)
+
+
+def _search_by_vector(vector_store, vector, k, query_filter=None, search_params=None):
+    """Поиск Qdrant по готовому вектору запроса: пары (документ, сходство)"""
+    from langchain_core.documents import Document
+
+    response = vector_store.client.query_points(
+        collection_name=vector_store.collection_name,
+        query=list(vector),
+        query_filter=query_filter,
+        search_params=search_params,
+        limit=k,
+        with_payload=True,
+    )
+    return [
+        (Document(page_content=point.payload.get("page_content", ""), metadata=point.payload.get("metadata", {})),
+         point.score)
+        for point in response.points
+    ]
+
+
+@traced("vector_search")
+def filtered_similarity_search(vector_store, query, k, query_filter=None, candidates=None,
+                               filter_index=None, search_params=None, with_scores=False, query_vector=None):
+    """Поиск по кандидатам из индекса фильтров, если их мало; иначе — обычный поиск Qdrant с фильтром.
+
+    С with_scores=True возвращает пары (документ, косинусное сходство), как similarity_search_with_score.
+    query_vector — уже посчитанный вектор запроса (например, из батча HTTP-сервиса); тогда модель не вызывается.
+    Если индекс не совпадает с коллекцией, поиск идёт обычным фильтром Qdrant.
+    """
+    def payload_filter_search():
+        if query_vector is not None:
+            hits = _search_by_vector(vector_store, query_vector, k, query_filter, search_params)
+            return hits if with_scores else [document for document, _ in hits]
+        search = vector_store.similarity_search_with_score if with_scores else vector_store.similarity_search
+        return search(query, k=k, filter=query_filter, search_params=search_params)
+
+    if (filter_index is None or candidates is None or len(candidates) > MAX_CANDIDATES
+            or not filter_index.matches_collection(vector_store.client, vector_store.collection_name)):
+        return payload_filter_search()
+    if len(candidates) == 0:
+        return []
+
+    from langchain_core.documents import Document
+
+    if query_vector is None:
+        query_vector = vector_store.embeddings.embed_query(query)
+    vector = np.asarray(query_vector, dtype=np.float32)
+    points = vector_store.client.retrieve(
+        collection_name=vector_store.collection_name,
+        ids=filter_index.point_ids[candidates].tolist(),
+        with_payload=True,
+        with_vectors=True,
+    )
+    if not points:
+        # Кандидатов в коллекции нет — индекс разошёлся с ней после сборки
+        return payload_filter_search()
+
+    vectors = np.asarray([dense_vector(point) for point in points], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    scores = vectors @ vector
+    best = top_k(scores, k, -np.inf)
+    documents = [
+        Document(page_content=points[i].payload.get("page_content", ""), metadata=points[i].payload.get("metadata", {}))
+        for i in best
+    ]
+    if with_scores:
+        return [(document, float(scores[i])) for document, i in zip(documents, best)]
+    return documents
+
+
+def build_and_save(df, index_dir=FILTER_INDEX_DIR):
+    index = FilterIndex.build(df)
+    index.save(index_dir)
+    return index
@@ -0,0 +1,256 @@
+"""Гибридный поиск: TF-IDF (точные названия и имена) + векторы Qdrant (пересказ сюжета) со слиянием рангов.
+
+Два режима:
+- два движка параллельно — MovieSearchEngine и плотный поиск Qdrant, результаты сливаются здесь;
+- один проход в Qdrant — если в demo_collection лежат разреженные TF-IDF векторы того же словаря,
+  Qdrant сам делает оба prefetch и слияние (RRF или DBSF) одним запросом.
+
+Разреженные векторы требуют коллекции, созданной с QDRANT_SPARSE=1 (или ingest --recreate --sparse), и загрузки:
+    python -m recommender.hybrid sparse
+"""
+import argparse
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .config import COLLECTION_NAME, CSV_FILE, QDRANT_PATH, SYNC_MANIFEST, TFIDF_CACHE_DIR
+from .ingest import point_id
+from .qdrant_store import SPARSE_VECTOR_NAME, has_sparse_vectors
+from .tracing import in_current_trace, traced
+
+FUSIONS = ("rrf", "weighted")
+RRF_K = 60
+# Сколько кандидатов берёт каждый движок до слияния
+FETCH_K = 30
+
+
+def reciprocal_rank_fusion(rankings, weights=None, k=RRF_K):
+    """Сумма weight / (k + ранг) по всем спискам; rankings — списки ключей по убыванию релевантности"""
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, key in enumerate(ranking, 1):
+            fused[key] = fused.get(key, 0.0) + weight / (k + rank)
+    return fused
+
+
+def weighted_score_fusion(scored, weights=None):
+    """Взвешенная сумма сходств, приведённых min-max к [0, 1] внутри каждого списка; scored — списки (ключ, сходство)"""
+    weights = weights or [1.0] * len(scored)
+    fused = {}
+    for pairs, weight in zip(scored, weights):
+        if not pairs:
+            continue
+        scores = np.array([score for _, score in pairs], dtype=np.float64)
+        spread = scores.max() - scores.min()
+        normalized = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+        for (key, _), score in zip(pairs, normalized):
+            fused[key] = fused.get(key, 0.0) + weight * float(score)
+    return fused
+
+
+def sparse_vector(engine, text):
+    """TF-IDF запроса как SparseVector Qdrant, L2-нормированный, как и строки матрицы"""
+    from qdrant_client.models import SparseVector
+
+    vector = engine.vectorizer.transform([text.lower()]).tocsr()
+    norm = np.sqrt(vector.multiply(vector).sum())
+    values = vector.data / norm if norm > 0 else vector.data
+    return SparseVector(indices=vector.indices.tolist(), values=values.astype(float).tolist())
+
+
+def vectorizer_sha256(vectorizer):
+    """Отпечаток словаря и idf: пока он прежний, TF-IDF векторы неизменённых фильмов не меняются"""
+    vocabulary = vectorizer.vocabulary_
+    digest = hashlib.sha256("\n".join(sorted(vocabulary, key=vocabulary.get)).encode("utf-8"))
+    digest.update(np.asarray(vectorizer.idf_, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def sparse_vectors_fresh(engine, manifest_path=SYNC_MANIFEST):
+    """Разреженные векторы в Qdrant посчитаны тем же словарём, что у движка"""
+    from .sync import SyncManifest
+
+    state = SyncManifest(manifest_path).data.get("sparse") or {}
+    return state.get("source_sha256") == engine.fingerprint
+
+
+class HybridSearcher:
+    def __init__(self, engine, vector_store, fusion="rrf", weights=(1.0, 1.0), fetch_k=FETCH_K,
+                 search_params=None, single_pass=False):
+        if fusion not in FUSIONS:
+            raise ValueError(f"Неизвестный способ слияния: {fusion}. Доступны: {', '.join(FUSIONS)}")
+        self.engine = engine
+        self.vector_store = vector_store
+        self.fusion = fusion
+        self.weights = list(weights)
+        self.fetch_k = fetch_k
+        self.search_params = search_params
+        self.single_pass = single_pass
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hybrid")
+
+    def _document(self, row):
+        from langchain_core.documents import Document
+
+        catalog = self.engine.catalog
+        return Document(page_content=catalog.texts("description", [row])[0], metadata=catalog.metadata(row))
+
+    @traced("hybrid_search")
+    def search(self, query, k=10, dense_search=None, rows=None, query_filter=None, query_vector=None):
+        """k документов после слияния TF-IDF и плотного поиска.
+
+        dense_search(query, fetch_k) должен вернуть пары (документ, сходство) с уже применённым фильтром страницы
+        (например, filter_index.filtered_similarity_search с with_scores=True); rows — строки каталога,
+        прошедшие тот же фильтр (Catalog.filter_rows), или None. В режиме одного прохода используется query_filter
+        и, если передан, готовый query_vector.
+        """
+        if self.single_pass:
+            return self._search_single_pass(query, k, query_filter, query_vector)
+
+        if dense_search is None:
+            def dense_search(text, fetch_k):
+                return self.vector_store.similarity_search_with_score(
+                    text, k=fetch_k, filter=query_filter, search_params=self.search_params
+                )
+
+        # Строки, которые ingest отбросил, в Qdrant не попали — TF-IDF не должен их возвращать
+        rows = self.engine.catalog.indexed_rows(rows)
+        sparse_future = self._pool.submit(in_current_trace(self.engine.search_rows), query, self.fetch_k, 0.0, rows)
+        dense_hits = dense_search(query, self.fetch_k)
+        sparse_rows, sparse_scores = sparse_future.result()
+
+        page_urls = self.engine.catalog.texts("page_url", sparse_rows)
+        sparse_hits = list(zip(page_urls, sparse_scores.tolist()))
+        dense_pairs = [(doc.metadata.get("page_url", ""), score) for doc, score in dense_hits]
+
+        if self.fusion == "rrf":
+            fused = reciprocal_rank_fusion([[url for url, _ in dense_pairs], page_urls], self.weights)
+        else:
+            fused = weighted_score_fusion([dense_pairs, sparse_hits], self.weights)
+
+        documents = {doc.metadata.get("page_url", ""): doc for doc, _ in dense_hits}
+        row_by_url = dict(zip(page_urls, sparse_rows.tolist()))
+        best = sorted(fused, key=fused.get, reverse=True)[:k]
+        return [documents[url] if url in documents else self._document(row_by_url[url]) for url in best]
+
+    def _search_single_pass(self, query, k, query_filter, query_vector=None):
+        from langchain_core.documents import Document
+        from qdrant_client.models import Fusion, FusionQuery, Prefetch
+
+        client = self.vector_store.client
+        dense = query_vector if query_vector is not None else self.vector_store.embeddings.embed_query(query)
+        fusion = Fusion.RRF if self.fusion == "rrf" else Fusion.DBSF
+        response = client.query_points(
+            collection_name=self.vector_store.collection_name,
+            prefetch=[
+                Prefetch(query=dense, limit=self.fetch_k, params=self.search_params),
+                Prefetch(query=sparse_vector(self.engine, query), using=SPARSE_VECTOR_NAME, limit=self.fetch_k),
+            ],
+            query=FusionQuery(fusion=fusion),
+            query_filter=query_filter,
+            limit=k,
+            with_payload=True,
+        )
+        return [
+            Document(page_content=point.payload.get("page_content", ""), metadata=point.payload.get("metadata", {}))
+            for point in response.points
+        ]
+
+
+def make_hybrid_searcher(engine, vector_store, search_params=None, fusion=None,
+                         manifest_path=SYNC_MANIFEST):
+    """Гибридный поиск в один проход Qdrant, если разреженные векторы загружены и свежие, иначе — двумя движками.
+
+    Способ слияния берётся из HYBRID_FUSION (rrf | weighted).
+    """
+    fusion = fusion or os.environ.get("HYBRID_FUSION", "rrf")
+    single_pass = (
+        has_sparse_vectors(vector_store.client, vector_store.collection_name)
+        and sparse_vectors_fresh(engine, manifest_path)
+    )
+    return HybridSearcher(engine, vector_store, fusion=fusion, search_params=search_params, single_pass=single_pass)
+
+
+def upload_sparse_vectors(client, engine, collection_name=COLLECTION_NAME, manifest_path=SYNC_MANIFEST,
+                          batch_size=256, log=print, page_urls=None):
+    """Кладёт TF-IDF строки каталога разреженными векторами в точки коллекции (по page_url).
+
+    page_urls ограничивает загрузку этими фильмами — так sync обновляет только изменённые точки,
+    если словарь TF-IDF не менялся; иначе векторы всех фильмов устарели и грузятся заново.
+    """
+    from qdrant_client.models import PointVectors, SparseVector
+
+    from .sync import SyncManifest
+
+    if not has_sparse_vectors(client, collection_name):
+        raise ValueError(
+            f"В коллекции {collection_name} нет разреженного вектора {SPARSE_VECTOR_NAME}. "
+            "Пересоздайте её: python -m recommender.ingest --recreate --sparse"
+        )
+
+    # Только строки, которые ingest загружает в Qdrant: без пропусков, при повторе page_url — последняя
+    catalog = engine.catalog
+    indexed = catalog.indexed_rows()
+    indexed = np.arange(len(catalog)) if indexed is None else indexed
+    rows = [(int(row), point_id(url)) for row, url in zip(indexed, catalog.texts("page_url", indexed))]
+    if page_urls is not None:
+        wanted = {point_id(url) for url in page_urls}
+        rows = [(row, pid) for row, pid in rows if pid in wanted]
+
+    existing = set()
+    if page_urls is None:
+        offset = None
+        while True:
+            points, offset = client.scroll(collection_name=collection_name, limit=1024, offset=offset,
+                                           with_payload=False, with_vectors=False)
+            existing.update(str(point.id) for point in points)
+            if offset is None:
+                break
+    else:
+        for start in range(0, len(rows), batch_size):
+            ids = [pid for _, pid in rows[start:start + batch_size]]
+            points = client.retrieve(collection_name=collection_name, ids=ids, with_payload=False, with_vectors=False)
+            existing.update(str(point.id) for point in points)
+
+    matrix = engine.tfidf_matrix
+    rows = [(row, pid) for row, pid in rows if pid in existing]
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        client.update_vectors(collection_name=collection_name, points=[
+            PointVectors(id=pid, vector={SPARSE_VECTOR_NAME: SparseVector(
+                indices=matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]].tolist(),
+                values=matrix.data[matrix.indptr[row]:matrix.indptr[row + 1]].astype(float).tolist(),
+            )})
+            for row, pid in batch
+        ])
+    SyncManifest(manifest_path).save(sparse={
+        "source_sha256": engine.fingerprint,
+        "vectorizer_sha256": vectorizer_sha256(engine.vectorizer),
+        "points": len(rows),
+    })
+    log(f"✅ Разреженные векторы: {len(rows)} точек")
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Гибридный поиск TF-IDF + Qdrant")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sparse_parser = subparsers.add_parser("sparse", help="загрузить TF-IDF векторы в коллекцию")
+    sparse_parser.add_argument("--csv", default=str(CSV_FILE))
+    sparse_parser.add_argument("--tfidf-cache", default=str(TFIDF_CACHE_DIR))
+    sparse_parser.add_argument("--qdrant-path", default=str(QDRANT_PATH))
+    sparse_parser.add_argument("--collection", default=COLLECTION_NAME)
+    sparse_parser.add_argument("--manifest", default=str(SYNC_MANIFEST))
+    args = parser.parse_args()
+
+    from .qdrant_store import make_client
+    from .tfidf import MovieSearchEngine
+
+    engine = MovieSearchEngine.load_or_build(args.csv, args.tfidf_cache)
+    upload_sparse_vectors(make_client(args.qdrant_path), engine, args.collection, args.manifest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Пакетная и возобновляемая загрузка films_data.csv в Qdrant.
+
+Заменяет цикл из sentence-transformers.ipynb, где каждый фильм кодировался и загружался отдельно:
+CSV читается чанками, описания кодируются большими батчами, точки загружаются пачками.
+ID точки детерминированно выводится из page_url, поэтому повторная загрузка перезаписывает, а не дублирует.
+
+Запуск:  python -m recommender.ingest --device cpu --batch-size 128
+"""
+import argparse
+import os
+import uuid
+
+import pandas as pd
+
+from .config import COLLECTION_NAME, CSV_FILE, INGEST_CHECKPOINT, QDRANT_PATH, SYNC_MANIFEST
+from .qdrant_store import (StorageProfile, add_profile_arguments, has_sparse_vectors, make_client, profile_from_args,
+                           qdrant_target)
+from .storage import file_sha256, read_json, write_json
+
+
+def point_id(page_url):
+    """Стабильный UUID точки Qdrant для фильма"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, page_url))
+
+
+def _split(value, lower=False):
+    items = [item.strip() for item in str(value).split(',') if item.strip()]
+    return [item.lower() for item in items] if lower else items
+
+
+def prepare_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Та же очистка, что и в ноутбуке: без пропусков, рейтинг числом"""
+    df = df.dropna().copy()
+    df['rating'] = pd.to_numeric(df['rating'], errors='coerce').fillna(0.0)
+    return df
+
+
+def row_metadata(row):
+    return {
+        'movie_title': row['movie_title'],
+        'year': int(row['year']),
+        'director': _split(row['director']),
+        'actors': _split(row['actors']),
+        'genre': _split(row['genre'], lower=True),
+        'rating': float(row['rating']),
+        'page_url': row['page_url'],
+        'image_url': row['image_url'],
+    }
+
+
+def build_points(df, vectors):
+    from qdrant_client.models import PointStruct
+
+    return [
+        PointStruct(
+            id=point_id(row['page_url']),
+            vector=list(map(float, vector)),
+            payload={"page_content": row['description'], "metadata": row_metadata(row)},
+        )
+        for (_, row), vector in zip(df.iterrows(), vectors)
+    ]
+
+
+def ensure_collection(client, collection_name, vector_size, profile=None):
+    if not client.collection_exists(collection_name):
+        profile = profile or StorageProfile.from_env()
+        profile.create_collection(client, collection_name, vector_size)
+
+
+def check_point_ids(client, collection_name, sample_size=16):
+    """Отказывается работать с коллекцией, где id точек не выведены из page_url.
+
+    Коллекция из ноутбука хранит фильмы под случайными uuid4: загрузка поверх неё добавила бы
+    второй экземпляр каждого фильма, и поиск возвращал бы дубли.
+    """
+    if not client.collection_exists(collection_name):
+        return
+    points, _ = client.scroll(collection_name=collection_name, limit=sample_size,
+                              with_payload=True, with_vectors=False)
+    for point in points:
+        page_url = ((point.payload or {}).get("metadata") or {}).get("page_url")
+        if page_url and str(point.id) != point_id(page_url):
+            raise ValueError(
+                f"В коллекции {collection_name} точки лежат под старыми id (не из page_url). "
+                "Пересоздайте её: python -m recommender.ingest --recreate"
+            )
+
+
+def count_points(client, collection_name):
+    """Точек в коллекции (0, если её нет); повторы page_url в CSV перезаписывают одну точку и не считаются"""
+    if not client.collection_exists(collection_name):
+        return 0
+    return client.count(collection_name=collection_name, exact=True).count
+
+
+class Checkpoint:
+    """Сколько строк CSV уже загружено; привязан к отпечатку CSV, коллекции и базе Qdrant (URL или папке)"""
+
+    def __init__(self, path, csv_sha256, collection_name=None, target=None):
+        self.path = str(path)
+        self.key = {"csv_sha256": csv_sha256, "collection": collection_name, "target": target}
+        state = read_json(self.path) or {}
+        # Чекпоинт другой коллекции или базы ничего не говорит о той, в которую грузим сейчас
+        matches = all(state.get(name) == value for name, value in self.key.items())
+        self.rows_done = state.get("rows_done", 0) if matches else 0
+        self.points = state.get("points", 0) if self.rows_done else 0
+
+    def save(self, rows_done, points):
+        self.rows_done, self.points = rows_done, points
+        write_json(self.path, {**self.key, "rows_done": rows_done, "points": points})
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.rows_done, self.points = 0, 0
+
+
+def ingest(client, embeddings, csv_path=CSV_FILE, collection_name=COLLECTION_NAME,
+           checkpoint_path=INGEST_CHECKPOINT, chunk_size=2048, upsert_batch_size=256, profile=None, log=print,
+           target=None):
+    """Загружает CSV в коллекцию, пропуская строки, уже отмеченные в чекпоинте"""
+    checkpoint = Checkpoint(checkpoint_path, file_sha256(csv_path), collection_name, target)
+    if checkpoint.rows_done and count_points(client, collection_name) < checkpoint.points:
+        # Коллекцию удалили или пересоздали после сбоя — отмеченных строк в ней уже нет
+        log("⚠️ В коллекции меньше точек, чем в чекпоинте: загружаем CSV заново")
+        checkpoint.clear()
+    if checkpoint.rows_done:
+        log(f"↩️ Продолжаем со строки {checkpoint.rows_done} ({checkpoint.points} точек уже в Qdrant)")
+
+    check_point_ids(client, collection_name)
+
+    rows_seen, points_total = 0, checkpoint.points
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        rows_seen += len(chunk)
+        if rows_seen <= checkpoint.rows_done:
+            continue
+
+        films = prepare_rows(chunk)
+        if not films.empty:
+            vectors = embeddings.embed_documents(films['description'].tolist())
+            ensure_collection(client, collection_name, len(vectors[0]), profile)
+            points = build_points(films, vectors)
+            for start in range(0, len(points), upsert_batch_size):
+                client.upsert(collection_name=collection_name, points=points[start:start + upsert_batch_size], wait=True)
+            points_total = count_points(client, collection_name)
+
+        checkpoint.save(rows_seen, points_total)
+        log(f"✅ Строк обработано: {rows_seen}, точек загружено: {points_total}")
+    return points_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка фильмов в Qdrant")
+    parser.add_argument("--csv", default=str(CSV_FILE))
+    parser.add_argument("--qdrant-path", default=str(QDRANT_PATH))
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--checkpoint", default=str(INGEST_CHECKPOINT))
+    parser.add_argument("--manifest", default=str(SYNC_MANIFEST), help="манифест для recommender.sync")
+    parser.add_argument("--chunk-size", type=int, default=2048, help="строк CSV за один проход")
+    parser.add_argument("--batch-size", type=int, default=128, help="размер батча кодирования")
+    parser.add_argument("--upsert-batch-size", type=int, default=256)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--recreate", action="store_true", help="удалить коллекцию и начать заново")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    from .autocomplete import AutocompleteIndex
+    from .embeddings import make_embeddings
+    from .filter_index import build_and_save
+    from .sync import SyncManifest, qdrant_state
+
+    client = make_client(args.qdrant_path)
+    if args.recreate:
+        if client.collection_exists(args.collection):
+            client.delete_collection(args.collection)
+        Checkpoint(args.checkpoint, None).clear()
+
+    embeddings = make_embeddings(device=args.device, batch_size=args.batch_size)
+    total = ingest(client, embeddings, args.csv, args.collection, args.checkpoint,
+                   args.chunk_size, args.upsert_batch_size, profile_from_args(args),
+                   target=qdrant_target(args.qdrant_path))
+    print(f"✅ {total} документов в коллекции {args.collection}")
+
+    # Полная загрузка — точка отсчёта для последующих инкрементальных синхронизаций
+    df = pd.read_csv(args.csv)
+    SyncManifest(args.manifest).save(qdrant=qdrant_state(df)[1])
+    build_and_save(df)
+    print("✅ Индекс фильтров собран")
+    AutocompleteIndex.load_or_build(args.csv)
+    print("✅ Индекс подсказок собран")
+
+    if has_sparse_vectors(client, args.collection):
+        from .hybrid import upload_sparse_vectors
+        from .tfidf import MovieSearchEngine
+
+        upload_sparse_vectors(client, MovieSearchEngine.load_or_build(args.csv), args.collection, args.manifest)
+
+
+if __name__ == "__main__":
+    main()
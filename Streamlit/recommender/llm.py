@@ -0,0 +1,299 @@
+"""LLM-комментарии к фильмам: промпт, цепочка и параллельная потоковая генерация.
+
+Два режима: отдельный запрос к LLM на каждый фильм (stream_commentaries) и один запрос на всю выдачу
+(stream_batched_commentaries) — компактный контекст без ссылок, ответ разбирается обратно по фильмам.
+
+Для работы без сети и ключа Groq задайте MOVIE_LLM_MOCK=1 — вместо ChatGroq подставится
+модель-заглушка, которая отдаёт заготовленные ответы по кусочкам с задержкой.
+"""
+import json
+import os
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+from .tracing import TRACER, in_current_trace, span
+
+GROQ_MODEL = "deepseek-r1-distill-llama-70b"
+MAX_WORKERS = 5
+# Увеличивать при изменении FILM_MESSAGES — иначе из кэша придут ответы на старый промпт
+FILM_PROMPT_VERSION = "film-v1"
+BATCH_PROMPT_VERSION = "batch-v1"
+# Бюджет контекста пакетного режима и ответа на один фильм, в токенах
+CONTEXT_TOKEN_BUDGET = 1500
+ANSWER_TOKENS_PER_FILM = 300
+# deepseek-r1 сначала рассуждает в <think> и тратит на это тот же max_tokens — запас сверх ответов
+REASONING_TOKEN_BUDGET = 2000
+# Грубая оценка для кириллицы без токенизатора модели
+CHARS_PER_TOKEN = 3
+
+# Промпты — сообщения для ChatPromptTemplate; langchain_core импортируется только при сборке цепочки
+FILM_MESSAGES = [
+    ("system", """Ты — Кристофер Тарантино 🎬: страстный кинокритик. Ты получаешь описание фильма и запрос пользователя, и сразу пишешь короткий, но живой и яркий комментарий.
+
+🎯 Твой анализ должен:
+- Избегай вводных размышлений ("хм...", "может быть...")
+- Включать краткий разбор сюжета
+- Учитывать актёрский состав, жанр, режиссёра и год
+- Делать забавные и умные параллели с другими фильмами, сериалами, книгами
+- Подмечать необычности или клише
+- Вставлять киношные мемы или шутки
+- В конце — сказать, стоит ли смотреть, и кому фильм может понравиться
+- Отвечать на русском, необычно но связно, живо, с эмодзи и кинолюбовью
+
+Важно: отвечай не как бот, а как человек разбирающийся в кино и с хорошим юмором! 🎥🍿"""),
+
+    ("human", "🎥 Запрос пользователя: {question}\n\n📽️ Фильм: {metadata}\n"),
+]
+
+BATCH_MESSAGES = [
+    ("system", """Ты — Кристофер Тарантино 🎬: страстный кинокритик. Ты получаешь список фильмов и запрос пользователя и пишешь к КАЖДОМУ фильму короткий, но живой и яркий комментарий.
+
+🎯 Каждый комментарий должен:
+- Обходиться без вводных размышлений ("хм...", "может быть...")
+- Включать краткий разбор сюжета и то, как фильм отвечает на запрос
+- Учитывать актёрский состав, жанр, режиссёра и год
+- Делать забавные и умные параллели с другими фильмами, сериалами, книгами
+- В конце — сказать, стоит ли смотреть, и кому фильм может понравиться
+- Быть на русском, живо, с эмодзи и кинолюбовью, 3–5 предложений
+
+📋 Формат ответа строго такой, по разделу на каждый фильм в порядке списка, без текста до и после:
+### Фильм 1
+комментарий
+### Фильм 2
+комментарий"""),
+
+    ("human", "🎥 Запрос пользователя: {question}\n\n📽️ Фильмы:\n{context}\n"),
+]
+
+MOCK_RESPONSES = [
+    "🎬 Классика жанра: сюжет держит до титров, актёры не подводят. Смотреть — да, особенно под попкорн 🍿",
+    "🎥 Режиссёр явно пересмотрел Тарантино, и это комплимент. Пара клише есть, но кому это мешало? 😎",
+    "🍿 Неспешная история, которая раскрывается ближе к финалу. Для вечера, когда хочется подумать 🤔",
+]
+
+
+# Ответ заглушки в пакетном режиме: разделы с запасом на любое число фильмов выдачи
+MOCK_BATCH_RESPONSES = [
+    "\n".join(f"### Фильм {i + 1}\n{MOCK_RESPONSES[i % len(MOCK_RESPONSES)]}" for i in range(10))
+]
+
+
+def is_mock_enabled():
+    return os.environ.get("MOVIE_LLM_MOCK", "0") == "1"
+
+
+def make_mock_llm(responses=MOCK_RESPONSES, delay=0.02):
+    """Заглушка чат-модели для офлайн-проверок: стримит ответы посимвольно с задержкой"""
+    from langchain_core.language_models import FakeListChatModel
+
+    return FakeListChatModel(responses=list(responses), sleep=delay)
+
+
+def llm_model_name():
+    return "mock" if is_mock_enabled() else GROQ_MODEL
+
+
+def film_id(metadata):
+    return metadata.get("page_url") or metadata.get("movie_title", "")
+
+
+def make_llm(api_key, temperature=1.3, max_tokens=1000, mock_responses=MOCK_RESPONSES):
+    if is_mock_enabled():
+        return make_mock_llm(mock_responses)
+
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        api_key=api_key,
+        model=GROQ_MODEL,
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
+
+
+def make_film_chain(llm):
+    """Цепочка «запрос + метаданные фильма → комментарий»"""
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ({
+                "question": itemgetter("question"),
+                "metadata": lambda inputs: json.dumps(inputs["metadata"], ensure_ascii=False, indent=2)
+            }
+            | ChatPromptTemplate.from_messages(FILM_MESSAGES)
+            | llm
+            | StrOutputParser())
+
+
+def make_batch_chain(llm):
+    """Цепочка «запрос + компактный контекст всех фильмов → разделы с комментариями»"""
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_messages(BATCH_MESSAGES) | llm | StrOutputParser()
+
+
+def batch_max_tokens(n_films):
+    """max_tokens пакетного запроса: рассуждения модели плюс ответ на каждый фильм"""
+    return REASONING_TOKEN_BUDGET + ANSWER_TOKENS_PER_FILM * max(n_films, 1)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _clip(text, max_chars):
+    text = " ".join(str(text).split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max(max_chars - 1, 0)].rsplit(" ", 1)[0] + "…"
+
+
+def format_compact_context(films, token_budget=CONTEXT_TOKEN_BUDGET, max_actors=4):
+    """Контекст для пакетного промпта: по строке метаданных и обрезанному описанию на фильм.
+
+    films — пары (metadata, описание). Ссылки на страницу и постер не передаются: модели они не нужны.
+    Бюджет делится поровну между фильмами; описание получает то, что осталось после метаданных.
+    """
+    if not films:
+        return ""
+    chars_per_film = token_budget * CHARS_PER_TOKEN // len(films)
+    blocks = []
+    for i, (metadata, description) in enumerate(films, 1):
+        header = " | ".join(part for part in (
+            f"### Фильм {i}: {metadata.get('movie_title', '')} ({metadata.get('year', '-')})",
+            ", ".join(metadata.get('genre', [])),
+            "реж. " + ", ".join(metadata.get('director', [])),
+            "в ролях: " + ", ".join(metadata.get('actors', [])[:max_actors]),
+            f"IMDb {metadata.get('rating', '-')}",
+        ) if part)
+        room = chars_per_film - len(header) - 1
+        blocks.append(header + ("\n" + _clip(description, room) if room > 40 and description else ""))
+    return "\n".join(blocks)
+
+
+_SECTION_RE = re.compile(r"^\s*#{1,4}\s*Фильм\s+(\d+)\b[^\n]*$", re.MULTILINE)
+# Рассуждения модели; незакрытый блок (ответ ещё идёт) отрезается до конца текста
+_THINK_RE = re.compile(r"<think>.*?(?:</think>|\Z)", re.DOTALL)
+
+
+def parse_sections(text, n_films):
+    """Разбивает ответ пакетного режима на комментарии по фильмам; недостающие — пустые строки.
+
+    Рассуждения модели в <think> и текст до первого раздела отбрасываются,
+    разделы с номерами вне 1..n_films игнорируются.
+    """
+    text = _THINK_RE.sub("", text)
+    sections = [""] * n_films
+    matches = list(_SECTION_RE.finditer(text))
+    for match, following in zip(matches, matches[1:] + [None]):
+        number = int(match.group(1))
+        if 1 <= number <= n_films:
+            end = following.start() if following else len(text)
+            sections[number - 1] = text[match.end():end].strip()
+    return sections
+
+
+def stream_batched_commentaries(chain, question, films, cache=None, query_vector=None,
+                                token_budget=CONTEXT_TOKEN_BUDGET):
+    """Комментарии ко всем фильмам одним запросом к LLM, в том же формате событий, что stream_commentaries.
+
+    films — пары (metadata, описание). Фильмы, для которых комментарий есть в кэше, в запрос не попадают.
+    Ответ разбирается по разделам по мере прихода целых строк, поэтому комментарии всё равно печатаются потоково.
+    """
+    model = llm_model_name()
+    pending = []
+    for index, (metadata, _) in enumerate(films):
+        cached = None
+        if cache is not None:
+            cached = cache.get(BATCH_PROMPT_VERSION, model, question, film_id(metadata), query_vector)
+        if cached is None:
+            pending.append(index)
+        else:
+            yield index, cached, None
+            yield index, None, None
+    if not pending:
+        return
+
+    context = format_compact_context([films[index] for index in pending], token_budget)
+    emitted = [0] * len(pending)
+    buffer = ""
+    # Генератор читает страница между кусками, поэтому время замеряется вручную, а не span-ом
+    start = time.perf_counter()
+    try:
+        for chunk in chain.stream({"question": question, "context": context}):
+            if not buffer:
+                TRACER.record("llm_first_token", time.perf_counter() - start)
+            buffer += chunk
+            # Разбираем только законченные строки, чтобы не показать половину заголовка раздела
+            complete = buffer[:buffer.rfind("\n") + 1]
+            for position, section in enumerate(parse_sections(complete, len(pending))):
+                if len(section) > emitted[position]:
+                    yield pending[position], section[emitted[position]:], None
+                    emitted[position] = len(section)
+    except Exception as e:
+        for index in pending:
+            yield index, None, e
+        return
+    TRACER.record("llm_batch", time.perf_counter() - start)
+
+    for position, section in enumerate(parse_sections(buffer, len(pending))):
+        index = pending[position]
+        if not section:
+            yield index, None, ValueError("модель не вернула раздел для этого фильма")
+            continue
+        if len(section) > emitted[position]:
+            yield index, section[emitted[position]:], None
+        if cache is not None:
+            cache.put(BATCH_PROMPT_VERSION, model, question, film_id(films[index][0]), section, query_vector)
+        yield index, None, None
+
+
+def stream_commentaries(chain, question, metadatas, max_workers=MAX_WORKERS, cache=None, query_vector=None):
+    """Генерирует комментарии ко всем фильмам параллельно и отдаёт куски по мере готовности.
+
+    Возвращает генератор событий (номер фильма, кусок текста, ошибка); после последнего куска
+    фильма приходит событие с куском None. Streamlit-элементы обновляет только вызывающий поток.
+    Если передан cache (CommentaryCache), готовые ответы отдаются сразу одним куском, а новые сохраняются.
+    """
+    events = queue.Queue()
+    model = llm_model_name()
+
+    def worker(index, metadata):
+        try:
+            cached = None
+            if cache is not None:
+                cached = cache.get(FILM_PROMPT_VERSION, model, question, film_id(metadata), query_vector)
+            if cached is not None:
+                events.put((index, cached, None))
+            else:
+                parts = []
+                with span("llm_film"):
+                    start = time.perf_counter()
+                    for chunk in chain.stream({"question": question, "metadata": metadata}):
+                        if not parts:
+                            TRACER.record("llm_first_token", time.perf_counter() - start)
+                        parts.append(chunk)
+                        events.put((index, chunk, None))
+                if cache is not None:
+                    cache.put(FILM_PROMPT_VERSION, model, question, film_id(metadata), "".join(parts), query_vector)
+        except Exception as e:
+            events.put((index, None, e))
+            return
+        events.put((index, None, None))
+
+    pending = len(metadatas)
+    if not pending:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, pending))) as pool:
+        for index, metadata in enumerate(metadatas):
+            pool.submit(in_current_trace(worker), index, metadata)
+        while pending:
+            index, chunk, error = events.get()
+            if chunk is None:
+                pending -= 1
+            yield index, chunk, error
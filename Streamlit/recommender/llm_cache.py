@@ -0,0 +1,101 @@
+"""Кэш LLM-комментариев: один и тот же фильм по тому же (или почти тому же) запросу не генерируется заново.
+
+Хранится в SQLite рядом с кэшем эмбеддингов запросов (config.COMMENTARY_CACHE_PATH).
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .text import normalize_query
+
+TTL_SECONDS = 7 * 24 * 3600
+MAX_ENTRIES = 20_000
+# Насколько близким должен быть другой запрос, чтобы переиспользовать его комментарий
+SIMILARITY_THRESHOLD = 0.95
+
+
+class CommentaryCache:
+    """Кэш ответов LLM на диске (SQLite) с TTL и вытеснением давно не использованных записей.
+
+    Ключ — (версия промпта, модель, нормализованный запрос, id фильма). Если точного совпадения нет,
+    но передан вектор запроса, подходит запись того же фильма с почти таким же запросом.
+    """
+
+    def __init__(self, path, ttl_seconds=TTL_SECONDS, max_entries=MAX_ENTRIES,
+                 similarity_threshold=SIMILARITY_THRESHOLD):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS commentaries ("
+            "prompt_version TEXT, model TEXT, query TEXT, film_id TEXT, query_vector BLOB, "
+            "response TEXT, created REAL, accessed REAL, "
+            "PRIMARY KEY (prompt_version, model, query, film_id))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS commentaries_film ON commentaries (prompt_version, model, film_id)"
+        )
+        self._db.commit()
+
+    def get(self, prompt_version, model, query, film_id, query_vector=None):
+        query = normalize_query(query)
+        fresh_after = time.time() - self.ttl_seconds
+        with self._lock:
+            row = self._db.execute(
+                "SELECT query, response FROM commentaries "
+                "WHERE prompt_version = ? AND model = ? AND query = ? AND film_id = ? AND created > ?",
+                (prompt_version, model, query, film_id, fresh_after),
+            ).fetchone()
+
+            if row is None and query_vector is not None:
+                row = self._nearest(prompt_version, model, film_id, query_vector, fresh_after)
+            if row is None:
+                return None
+
+            self._db.execute(
+                "UPDATE commentaries SET accessed = ? "
+                "WHERE prompt_version = ? AND model = ? AND query = ? AND film_id = ?",
+                (time.time(), prompt_version, model, row[0], film_id),
+            )
+            self._db.commit()
+            return row[1]
+
+    def _nearest(self, prompt_version, model, film_id, query_vector, fresh_after):
+        rows = self._db.execute(
+            "SELECT query, response, query_vector FROM commentaries "
+            "WHERE prompt_version = ? AND model = ? AND film_id = ? AND created > ? AND query_vector IS NOT NULL",
+            (prompt_version, model, film_id, fresh_after),
+        ).fetchall()
+        if not rows:
+            return None
+        vectors = np.stack([np.frombuffer(vector, dtype=np.float32) for _, _, vector in rows])
+        scores = vectors @ np.asarray(query_vector, dtype=np.float32)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return rows[best][0], rows[best][1]
+
+    def put(self, prompt_version, model, query, film_id, response, query_vector=None):
+        now = time.time()
+        vector = None if query_vector is None else np.asarray(query_vector, dtype=np.float32).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO commentaries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (prompt_version, model, normalize_query(query), film_id, vector, response, now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM commentaries WHERE created <= ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM commentaries WHERE rowid IN ("
+            "SELECT rowid FROM commentaries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
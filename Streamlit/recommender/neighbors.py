@@ -0,0 +1,189 @@
+"""Офлайн-индекс «похожие фильмы»: top-N соседей каждого фильма по TF-IDF и по векторам Qdrant.
+
+Сборка:  python -m recommender.neighbors --sources tfidf dense --n-neighbors 20
+"""
+import argparse
+import os
+
+import numpy as np
+
+from .config import COLLECTION_NAME, CSV_FILE, NEIGHBORS_DIR, QDRANT_PATH, TFIDF_CACHE_DIR
+from .qdrant_store import dense_vector
+from .ranking import top_k
+from .storage import atomic_write, file_version, read_json, write_json
+
+SOURCES = ("tfidf", "dense")
+NO_NEIGHBOR = -1
+
+
+def _empty_index(n_rows, n_neighbors):
+    ids = np.full((n_rows, n_neighbors), NO_NEIGHBOR, dtype=np.int32)
+    scores = np.zeros((n_rows, n_neighbors), dtype=np.float16)
+    return ids, scores
+
+
+def _fill_row(ids, scores, row, neighbors, neighbor_scores):
+    keep = neighbors != row
+    neighbors, neighbor_scores = neighbors[keep], neighbor_scores[keep]
+    n = min(ids.shape[1], neighbors.size)
+    ids[row, :n] = neighbors[:n]
+    scores[row, :n] = neighbor_scores[:n]
+
+
+def build_tfidf_neighbors(engine, n_neighbors=20, chunk_size=1024):
+    """Соседи по косинусу TF-IDF: каждая строка матрицы прогоняется как запрос"""
+    scorer = engine.scorer
+    ids, scores = _empty_index(scorer.n_docs, n_neighbors)
+    hits = scorer.search_many(scorer.matrix, n_neighbors + 1, 0.0, chunk_size)
+    for row, (neighbors, neighbor_scores) in enumerate(hits):
+        _fill_row(ids, scores, row, neighbors, neighbor_scores)
+    return ids, scores
+
+
+def load_collection_vectors(client, collection_name=COLLECTION_NAME, batch_size=1024):
+    """Все векторы коллекции и page_url их фильмов"""
+    urls, vectors = [], []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for point in points:
+            urls.append(point.payload.get("metadata", {}).get("page_url", ""))
+            vectors.append(dense_vector(point))
+        if offset is None:
+            break
+    return urls, np.asarray(vectors, dtype=np.float32)
+
+
+def build_dense_neighbors(page_urls, client, n_neighbors=20, chunk_size=1024, collection_name=COLLECTION_NAME):
+    """Соседи по векторам из Qdrant, пересчитанные в номера строк каталога (page_urls — по строкам)"""
+    urls, vectors = load_collection_vectors(client, collection_name)
+    ids, scores = _empty_index(len(page_urls), n_neighbors)
+    if not urls:
+        return ids, scores
+
+    row_by_url = {url: row for row, url in enumerate(page_urls)}
+    catalog_rows = np.array([row_by_url.get(url, NO_NEIGHBOR) for url in urls], dtype=np.int32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    for start in range(0, len(vectors), chunk_size):
+        chunk_scores = vectors[start:start + chunk_size] @ vectors.T
+        for offset, point_scores in enumerate(chunk_scores):
+            point = start + offset
+            row = catalog_rows[point]
+            if row == NO_NEIGHBOR:
+                continue
+            point_scores[point] = -np.inf
+            best = top_k(point_scores, n_neighbors + 1, -np.inf)
+            best = best[catalog_rows[best] != NO_NEIGHBOR]
+            _fill_row(ids, scores, row, catalog_rows[best], point_scores[best])
+    return ids, scores
+
+
+class NeighborIndex:
+    """Массивы соседей на диске: int32 номера строк и float16 сходства, открываются через mmap"""
+
+    def __init__(self, index_dir=NEIGHBORS_DIR):
+        self.index_dir = str(index_dir)
+        self.manifest_path = os.path.join(self.index_dir, "manifest.json")
+        self._arrays = {}
+        self._manifest_cache = None
+
+    @staticmethod
+    def version(index_dir=NEIGHBORS_DIR):
+        """Меняется при каждой пересборке любого источника — ключ кэша в процессе"""
+        return file_version(os.path.join(str(index_dir), "manifest.json"))
+
+    def _paths(self, source):
+        return (
+            os.path.join(self.index_dir, f"{source}_ids.npy"),
+            os.path.join(self.index_dir, f"{source}_scores.npy"),
+        )
+
+    def save(self, source, ids, scores, fingerprint):
+        os.makedirs(self.index_dir, exist_ok=True)
+        ids_path, scores_path = self._paths(source)
+        atomic_write(ids_path, lambda path: np.save(path, ids.astype(np.int32)))
+        atomic_write(scores_path, lambda path: np.save(path, scores.astype(np.float16)))
+
+        manifest = read_json(self.manifest_path) or {}
+        manifest[source] = {
+            "source_sha256": fingerprint,
+            "n_rows": int(ids.shape[0]),
+            "n_neighbors": int(ids.shape[1]),
+        }
+        write_json(self.manifest_path, manifest)
+        self._arrays.pop(source, None)
+
+    def _manifest(self):
+        """(версия файла, содержимое) манифеста; как у FilterIndex, файл читается заново, только когда изменился"""
+        version = file_version(self.manifest_path)
+        if self._manifest_cache is None or self._manifest_cache[0] != version:
+            self._manifest_cache = (version, read_json(self.manifest_path) or {})
+        return self._manifest_cache
+
+    def available(self, fingerprint=None):
+        """Источники, для которых индекс собран (и совпадает с текущим CSV, если задан отпечаток)"""
+        _, manifest = self._manifest()
+        return [
+            source for source in SOURCES
+            if source in manifest
+            and (fingerprint is None or manifest[source]["source_sha256"] == fingerprint)
+            and all(os.path.exists(path) for path in self._paths(source))
+        ]
+
+    def _load(self, source):
+        # Массивы открываются заново, если индекс пересобрали другим процессом (манифест переписан)
+        version, _ = self._manifest()
+        cached = self._arrays.get(source)
+        if cached is None or cached[0] != version:
+            ids_path, scores_path = self._paths(source)
+            cached = (version, np.load(ids_path, mmap_mode="r"), np.load(scores_path, mmap_mode="r"))
+            self._arrays[source] = cached
+        return cached[1:]
+
+    def similar(self, row, k=10, source="tfidf"):
+        """Номера строк похожих фильмов и их сходства — одно чтение строки массива"""
+        ids, scores = self._load(source)
+        neighbors = np.asarray(ids[row, :k])
+        keep = neighbors != NO_NEIGHBOR
+        return neighbors[keep], np.asarray(scores[row, :k], dtype=np.float32)[keep]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка индекса похожих фильмов")
+    parser.add_argument("--sources", nargs="+", choices=SOURCES, default=list(SOURCES))
+    parser.add_argument("--n-neighbors", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--csv", default=str(CSV_FILE))
+    parser.add_argument("--tfidf-cache", default=str(TFIDF_CACHE_DIR))
+    parser.add_argument("--qdrant-path", default=str(QDRANT_PATH))
+    parser.add_argument("--out", default=str(NEIGHBORS_DIR))
+    args = parser.parse_args()
+
+    from .tfidf import MovieSearchEngine
+
+    engine = MovieSearchEngine.load_or_build(args.csv, args.tfidf_cache)
+    index = NeighborIndex(args.out)
+
+    if "tfidf" in args.sources:
+        ids, scores = build_tfidf_neighbors(engine, args.n_neighbors, args.chunk_size)
+        index.save("tfidf", ids, scores, engine.fingerprint)
+        print(f"✅ TF-IDF: соседи для {ids.shape[0]} фильмов")
+
+    if "dense" in args.sources:
+        from .qdrant_store import make_client
+
+        client = make_client(args.qdrant_path)
+        ids, scores = build_dense_neighbors(engine.catalog.texts("page_url"), client, args.n_neighbors, args.chunk_size)
+        index.save("dense", ids, scores, engine.fingerprint)
+        print(f"✅ Qdrant: соседи для {int((ids[:, 0] != NO_NEIGHBOR).sum())} фильмов")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Быстрый CPU-бэкенд эмбеддингов: экспорт mpnet в ONNX с динамическим int8-квантованием.
+
+Зависимости отдельно от основных:       pip install -r requirements-onnx.txt
+Экспорт (нужны torch и transformers):  python -m recommender.onnx_embeddings export
+Проверка против текущей модели:         python -m recommender.onnx_embeddings validate --k 10
+Включение в приложении:                 EMBEDDINGS_BACKEND=onnx EMBEDDINGS_THREADS=4
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import COLLECTION_NAME, ONNX_MODEL_DIR, QDRANT_PATH
+from .evaluation import EVAL_QUERIES, recall_at_k, top_ids
+
+MAX_SEQ_LENGTH = 128
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+
+def export_onnx(model_name, out_dir=ONNX_MODEL_DIR, quantize=True):
+    """Экспортирует трансформер в ONNX и, при желании, квантует веса в int8"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(out_dir)
+
+    sample = tokenizer(["пример запроса"], return_tensors="pt")
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=17,
+        )
+
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = os.path.join(out_dir, INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """Эмбеддинги через ONNX Runtime: mean pooling + L2-нормировка, как у sentence-transformers"""
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized=True, threads=None, batch_size=32):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("Для бэкенда onnx установите onnxruntime: pip install -r requirements-onnx.txt") from e
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"Модель {model_path} не найдена. Экспортируйте её: python -m recommender.onnx_embeddings export"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+
+    def _encode(self, texts):
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np"
+        )
+        mask = encoded["attention_mask"].astype(np.int64)
+        (hidden,) = self.session.run(
+            ["last_hidden_state"],
+            {"input_ids": encoded["input_ids"].astype(np.int64), "attention_mask": mask},
+        )
+        mask = mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        vectors = [self._encode(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(vectors).tolist() if vectors else []
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+def validate(reference, candidate, client, collection_name=COLLECTION_NAME, queries=EVAL_QUERIES, k=10):
+    """recall@k кандидата относительно эталонной модели на живой коллекции и выигрыш по скорости"""
+    recalls, cosines, timings = [], [], {"reference": 0.0, "candidate": 0.0}
+    for query in queries:
+        start = time.perf_counter()
+        expected_vector = reference.embed_query(query)
+        timings["reference"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        vector = candidate.embed_query(query)
+        timings["candidate"] += time.perf_counter() - start
+
+        expected = top_ids(client, collection_name, expected_vector, k)
+        found = top_ids(client, collection_name, vector, k)
+        recalls.append(recall_at_k(expected, found, k))
+        cosines.append(float(np.dot(expected_vector, vector)))
+
+    return {
+        f"recall@{k}": float(np.mean(recalls)),
+        f"min_recall@{k}": float(np.min(recalls)),
+        "mean_cosine": float(np.mean(cosines)),
+        "reference_ms_per_query": 1000 * timings["reference"] / len(queries),
+        "candidate_ms_per_query": 1000 * timings["candidate"] / len(queries),
+        "speedup": timings["reference"] / max(timings["candidate"], 1e-9),
+    }
+
+
+def main():
+    from .embeddings import MODEL_NAME, make_embeddings
+
+    parser = argparse.ArgumentParser(description="ONNX-бэкенд эмбеддингов")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="экспорт и int8-квантование модели")
+    export_parser.add_argument("--model", default=MODEL_NAME)
+    export_parser.add_argument("--out", default=str(ONNX_MODEL_DIR))
+    export_parser.add_argument("--no-quantize", action="store_true")
+
+    validate_parser = subparsers.add_parser("validate", help="recall@k против текущей модели")
+    validate_parser.add_argument("--model-dir", default=str(ONNX_MODEL_DIR))
+    validate_parser.add_argument("--fp32", action="store_true", help="проверить неквантованную модель")
+    validate_parser.add_argument("--threads", type=int, default=None)
+    validate_parser.add_argument("--k", type=int, default=10)
+    validate_parser.add_argument("--min-recall", type=float, default=0.9)
+    validate_parser.add_argument("--qdrant-path", default=str(QDRANT_PATH))
+    validate_parser.add_argument("--collection", default=COLLECTION_NAME)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        path = export_onnx(args.model, args.out, quantize=not args.no_quantize)
+        print(f"✅ Модель сохранена: {path}")
+        return
+
+    from .qdrant_store import make_client
+
+    client = make_client(args.qdrant_path)
+    candidate = OnnxEmbeddings(args.model_dir, quantized=not args.fp32, threads=args.threads)
+    report = validate(make_embeddings(device="cpu"), candidate, client, args.collection, k=args.k)
+    for name, value in report.items():
+        print(f"{name}: {value:.3f}")
+    if report[f"recall@{args.k}"] < args.min_recall:
+        raise SystemExit(f"❌ recall@{args.k} ниже порога {args.min_recall}")
+
+
+if __name__ == "__main__":
+    main()
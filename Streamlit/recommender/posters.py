@@ -0,0 +1,182 @@
+"""Общий кэш постеров: параллельная загрузка, миниатюры 300px и LRU-кэш на диске.
+
+Страница собирает адреса постеров всей выдачи и вызывает fetch_many один раз: постеры качаются
+одновременно через общий пул соединений, а в кэш попадают сжатые миниатюры, а не исходные картинки.
+Недоступные адреса запоминаются, чтобы не ждать таймаут при каждом показе: удалённые (404/410) и битые картинки —
+на NEGATIVE_TTL_SECONDS, сетевые сбои и ошибки сервера — на RETRY_TTL_SECONDS.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from .config import POSTER_CACHE_DIR
+from .tracing import in_current_trace, traced
+
+THUMBNAIL_WIDTH = 300
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+NEGATIVE_TTL_SECONDS = 24 * 3600
+# Таймауты, обрывы соединения и 5xx обычно проходят сами — пробуем снова через минуту
+RETRY_TTL_SECONDS = 60
+# Ответы, после которых постера по этому адресу уже не будет
+DEFINITIVE_STATUSES = (404, 410)
+MAX_WORKERS = 8
+TIMEOUT_SECONDS = 5
+JPEG_QUALITY = 85
+
+
+def is_poster_url(url):
+    return isinstance(url, str) and url.startswith("http")
+
+
+class PosterCache:
+    def __init__(self, cache_dir=POSTER_CACHE_DIR, max_bytes=MAX_CACHE_BYTES, width=THUMBNAIL_WIDTH,
+                 max_workers=MAX_WORKERS, timeout=TIMEOUT_SECONDS, negative_ttl=NEGATIVE_TTL_SECONDS,
+                 retry_ttl=RETRY_TTL_SECONDS):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.width = width
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.retry_ttl = retry_ttl
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="posters")
+
+        self._lock = threading.Lock()
+        self._total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith(".jpg")
+        )
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.jpg"), os.path.join(self.cache_dir, f"{key}.miss")
+
+    def _cached(self, url):
+        """(найдено, путь): путь к миниатюре, None для недавно недоступного адреса"""
+        path, miss_path = self._paths(url)
+        try:
+            os.utime(path)  # время доступа для LRU
+            return True, path
+        except FileNotFoundError:
+            pass
+        try:
+            # В файле промаха записан его срок; пустой файл — от старых версий, срок полный
+            with open(miss_path, "r") as f:
+                ttl = float(f.read() or self.negative_ttl)
+            if time.time() - os.path.getmtime(miss_path) < ttl:
+                return True, None
+        except (FileNotFoundError, ValueError):
+            pass
+        return False, None
+
+    @staticmethod
+    def _remember_miss(miss_path, ttl):
+        with open(miss_path, "w") as f:
+            f.write(str(ttl))
+
+    def _thumbnail(self, content):
+        from PIL import Image
+
+        with Image.open(BytesIO(content)) as img:
+            img = img.convert("RGB")
+            if img.width > self.width:
+                img = img.resize((self.width, round(img.height * self.width / img.width)), Image.LANCZOS)
+            out = BytesIO()
+            img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        return out.getvalue()
+
+    @traced("poster_download")
+    def _download(self, url):
+        import requests
+
+        path, miss_path = self._paths(url)
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            self._remember_miss(miss_path, self.negative_ttl if status in DEFINITIVE_STATUSES else self.retry_ttl)
+            return None
+        except requests.RequestException:
+            self._remember_miss(miss_path, self.retry_ttl)
+            return None
+        try:
+            data = self._thumbnail(response.content)
+        except Exception:
+            # Не картинка или битый файл — повторная загрузка этого не исправит
+            self._remember_miss(miss_path, self.negative_ttl)
+            return None
+
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if os.path.exists(miss_path):
+            os.remove(miss_path)
+        with self._lock:
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _evict(self, keep=None):
+        """Удаляет давно не показанные миниатюры, пока кэш не станет меньше 90% лимита"""
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.cache_dir) if entry.name.endswith(".jpg")
+        )
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._total_bytes <= 0.9 * self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._total_bytes -= size
+
+    def get(self, url):
+        """Путь к миниатюре постера или None, если адрес пустой или недоступен"""
+        return self.fetch_many([url])[url]
+
+    @traced("posters")
+    def fetch_many(self, urls):
+        """Миниатюры всех постеров выдачи: {url: путь или None}; недостающие качаются параллельно"""
+        result, missing = {}, []
+        for url in dict.fromkeys(urls):
+            if not is_poster_url(url):
+                result[url] = None
+                continue
+            found, path = self._cached(url)
+            if found:
+                result[url] = path
+            else:
+                missing.append(url)
+        for url, path in zip(missing, self._pool.map(in_current_trace(self._download), missing)):
+            result[url] = path
+        return result
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_poster_cache():
+    """Один кэш и пул соединений на весь процесс — общий для всех страниц и сессий"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PosterCache()
+        return _shared
@@ -0,0 +1,269 @@
+"""Настройки хранения demo_collection: квантование, HNSW и векторы на диске.
+
+Встроенный режим (QdrantClient(path=...)) всегда ищет полным перебором в памяти и эти настройки
+только сохраняет в метаданных. Работают они на сервере Qdrant: задайте QDRANT_URL (и QDRANT_API_KEY),
+тогда каждый воркер Streamlit не держит у себя все float32 векторы.
+
+Профиль задаётся переменными окружения:
+    QDRANT_QUANTIZATION=none|scalar|binary  QDRANT_ON_DISK=1
+    QDRANT_HNSW_M=16  QDRANT_HNSW_EF_CONSTRUCT=128  QDRANT_HNSW_EF=128  QDRANT_OVERSAMPLING=2.0
+    QDRANT_SPARSE=1 — место под разреженные TF-IDF векторы для гибридного поиска (только при создании коллекции)
+
+Применить к существующей коллекции:  python -m recommender.qdrant_store apply --quantization scalar --on-disk
+Сравнить с точным поиском:           python -m recommender.qdrant_store bench --k 10
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from .config import COLLECTION_NAME, QDRANT_PATH
+from .evaluation import EVAL_QUERIES, recall_at_k, top_ids
+
+QUANTIZATIONS = ("none", "scalar", "binary")
+SPARSE_VECTOR_NAME = "tfidf"
+# Поля, по которым страницы строят Filter
+PAYLOAD_INDEXES = {
+    "metadata.genre": "keyword",
+    "metadata.director": "keyword",
+    "metadata.actors": "keyword",
+    "metadata.year": "integer",
+    "metadata.rating": "float",
+}
+
+
+def make_client(path=QDRANT_PATH):
+    """Клиент сервера Qdrant, если задан QDRANT_URL, иначе встроенная база из папки"""
+    from qdrant_client import QdrantClient
+
+    url = os.environ.get("QDRANT_URL")
+    if url:
+        return QdrantClient(url=url, api_key=os.environ.get("QDRANT_API_KEY"))
+    return QdrantClient(path=str(path))
+
+
+def qdrant_target(path=QDRANT_PATH):
+    """Куда смотрит make_client: адрес сервера или абсолютный путь встроенной базы"""
+    return os.environ.get("QDRANT_URL") or os.path.abspath(path)
+
+
+def dense_vector(point):
+    """Плотный вектор точки: в коллекции с разреженными векторами Qdrant отдаёт словарь по именам"""
+    vector = point.vector
+    return vector[""] if isinstance(vector, dict) else vector
+
+
+def has_sparse_vectors(client, collection_name):
+    sparse = client.get_collection(collection_name).config.params.sparse_vectors or {}
+    return SPARSE_VECTOR_NAME in sparse
+
+
+def page_filter(genres=(), directors=(), actors=(), years=None, ratings=None):
+    """Filter Qdrant из выбранных на странице значений: жанры, режиссёры и актёры — should, диапазоны — must"""
+    from qdrant_client.models import FieldCondition, Filter, Range
+
+    should_conditions = []
+    must_conditions = []
+
+    if genres:
+        should_conditions.append(FieldCondition(key="metadata.genre", match={"any": list(genres)}))
+    if directors:
+        should_conditions.append(FieldCondition(key="metadata.director", match={"any": list(directors)}))
+    if actors:
+        should_conditions.append(FieldCondition(key="metadata.actors", match={"any": list(actors)}))
+
+    if years:
+        must_conditions.append(FieldCondition(key="metadata.year", range=Range(gte=years[0], lte=years[1])))
+    if ratings:
+        must_conditions.append(FieldCondition(key="metadata.rating", range=Range(gte=ratings[0], lte=ratings[1])))
+
+    if not should_conditions and not must_conditions:
+        return None
+    return Filter(
+        should=should_conditions if should_conditions else None,
+        must=must_conditions if must_conditions else None
+    )
+
+
+def create_payload_indexes(client, collection_name):
+    """Индексы полей фильтров: без них сервер проверяет условия точка за точкой"""
+    from qdrant_client.models import PayloadSchemaType
+
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=PayloadSchemaType(schema),
+            wait=True,
+        )
+
+
+class StorageProfile:
+    def __init__(self, quantization="none", on_disk=False, hnsw_m=16, hnsw_ef_construct=128,
+                 hnsw_ef=128, oversampling=2.0, rescore=True, sparse=False):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Неизвестный тип квантования: {quantization}. Доступны: {', '.join(QUANTIZATIONS)}")
+        self.quantization = quantization
+        self.on_disk = on_disk
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.hnsw_ef = hnsw_ef
+        self.oversampling = oversampling
+        self.rescore = rescore
+        self.sparse = sparse
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            quantization=os.environ.get("QDRANT_QUANTIZATION", "none"),
+            on_disk=os.environ.get("QDRANT_ON_DISK", "0") == "1",
+            hnsw_m=int(os.environ.get("QDRANT_HNSW_M", "16")),
+            hnsw_ef_construct=int(os.environ.get("QDRANT_HNSW_EF_CONSTRUCT", "128")),
+            hnsw_ef=int(os.environ.get("QDRANT_HNSW_EF", "128")),
+            oversampling=float(os.environ.get("QDRANT_OVERSAMPLING", "2.0")),
+            sparse=os.environ.get("QDRANT_SPARSE", "0") == "1",
+        )
+
+    def vectors_config(self, size):
+        from qdrant_client.models import Distance, VectorParams
+
+        return VectorParams(size=size, distance=Distance.COSINE, on_disk=self.on_disk)
+
+    def hnsw_config(self):
+        from qdrant_client.models import HnswConfigDiff
+
+        return HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct, on_disk=self.on_disk)
+
+    def quantization_config(self):
+        from qdrant_client.models import (
+            BinaryQuantization, BinaryQuantizationConfig, ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+        )
+
+        # Квантованные векторы остаются в памяти, полные — на диске и используются только для пересчёта
+        if self.quantization == "scalar":
+            return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self):
+        from qdrant_client.models import QuantizationSearchParams, SearchParams
+
+        quantization = None
+        if self.quantization != "none":
+            quantization = QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        return SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def sparse_vectors_config(self):
+        from qdrant_client.models import SparseVectorParams
+
+        # Добавить разреженный вектор к готовой коллекции нельзя, поэтому место под него задаётся при создании
+        return {SPARSE_VECTOR_NAME: SparseVectorParams()} if self.sparse else None
+
+    def create_collection(self, client, collection_name, vector_size):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=self.vectors_config(vector_size),
+            sparse_vectors_config=self.sparse_vectors_config(),
+            hnsw_config=self.hnsw_config(),
+            quantization_config=self.quantization_config(),
+            on_disk_payload=self.on_disk,
+        )
+        create_payload_indexes(client, collection_name)
+
+    def apply(self, client, collection_name):
+        """Перенастраивает существующую коллекцию без перезагрузки точек"""
+        from qdrant_client.models import Disabled, VectorParamsDiff
+
+        client.update_collection(
+            collection_name=collection_name,
+            vectors_config={"": VectorParamsDiff(on_disk=self.on_disk)},
+            hnsw_config=self.hnsw_config(),
+            quantization_config=self.quantization_config() or Disabled.DISABLED,
+        )
+        create_payload_indexes(client, collection_name)
+
+
+def benchmark(client, embeddings, profile, collection_name=COLLECTION_NAME, queries=EVAL_QUERIES, k=10):
+    """recall@k и задержка поиска с параметрами профиля относительно точного перебора"""
+    from qdrant_client.models import SearchParams
+
+    exact_params = SearchParams(exact=True)
+    approx_params = profile.search_params()
+    recalls, exact_ms, approx_ms = [], [], []
+    for query in queries:
+        vector = embeddings.embed_query(query)
+
+        start = time.perf_counter()
+        expected = top_ids(client, collection_name, vector, k, search_params=exact_params)
+        exact_ms.append(1000 * (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        found = top_ids(client, collection_name, vector, k, search_params=approx_params)
+        approx_ms.append(1000 * (time.perf_counter() - start))
+
+        recalls.append(recall_at_k(expected, found, k))
+
+    return {
+        f"recall@{k}": float(np.mean(recalls)),
+        f"min_recall@{k}": float(np.min(recalls)),
+        "exact_p50_ms": float(np.percentile(exact_ms, 50)),
+        "approx_p50_ms": float(np.percentile(approx_ms, 50)),
+        "approx_p95_ms": float(np.percentile(approx_ms, 95)),
+    }
+
+
+def add_profile_arguments(parser):
+    defaults = StorageProfile.from_env()
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=defaults.quantization)
+    parser.add_argument("--on-disk", action="store_true", default=defaults.on_disk)
+    parser.add_argument("--hnsw-m", type=int, default=defaults.hnsw_m)
+    parser.add_argument("--hnsw-ef-construct", type=int, default=defaults.hnsw_ef_construct)
+    parser.add_argument("--hnsw-ef", type=int, default=defaults.hnsw_ef)
+    parser.add_argument("--oversampling", type=float, default=defaults.oversampling)
+    parser.add_argument("--sparse", action="store_true", default=defaults.sparse,
+                        help="создавать коллекцию с разреженными TF-IDF векторами")
+
+
+def profile_from_args(args):
+    return StorageProfile(
+        quantization=args.quantization,
+        on_disk=args.on_disk,
+        hnsw_m=args.hnsw_m,
+        hnsw_ef_construct=args.hnsw_ef_construct,
+        hnsw_ef=args.hnsw_ef,
+        oversampling=args.oversampling,
+        sparse=args.sparse,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Настройки хранения коллекции Qdrant")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("apply", "перенастроить коллекцию"), ("bench", "recall@k против точного поиска")):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument("--qdrant-path", default=str(QDRANT_PATH))
+        subparser.add_argument("--collection", default=COLLECTION_NAME)
+        add_profile_arguments(subparser)
+        if name == "bench":
+            subparser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    client = make_client(args.qdrant_path)
+    profile = profile_from_args(args)
+    if args.command == "apply":
+        profile.apply(client, args.collection)
+        print(f"✅ Коллекция {args.collection} перенастроена")
+        return
+
+    from .embeddings import make_query_model
+
+    embeddings, _ = make_query_model()
+    report = benchmark(client, embeddings, profile, args.collection, k=args.k)
+    for name, value in report.items():
+        print(f"{name}: {value:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""Отбор лучших результатов по оценкам; только numpy, чтобы индексы фильтров и соседей не тянули sklearn."""
+import numpy as np
+
+
+def top_k(scores, k, min_score=0.0):
+    """Позиции k лучших значений выше порога, отсортированные по убыванию"""
+    candidates = np.flatnonzero(scores > min_score)
+    if candidates.size > k:
+        part = np.argpartition(scores[candidates], -k)[-k:]
+        candidates = candidates[part]
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order]
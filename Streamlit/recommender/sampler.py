@@ -0,0 +1,149 @@
+"""Случайная подборка с фильтрами без просмотра всего каталога.
+
+Жанры хранятся списками номеров строк (по списку на жанр) и битовыми масками строк, год и рейтинг —
+столбцами каталога. Выборка k фильмов тянет случайные позиции из списков выбранных жанров
+и проверяет год, рейтинг и «уже показано» прямыми обращениями к массивам — O(k) при обычных фильтрах.
+Только если фильтру отвечает совсем мало фильмов, подходящие строки считаются целиком.
+"""
+import numpy as np
+
+# Сколько попыток тянуть на один нужный фильм, прежде чем считать подходящие строки целиком
+OVERSAMPLE = 4
+
+
+def parse_seed(value):
+    """?seed=N из адреса страницы: неотрицательное целое или None, если параметр не задан или негоден"""
+    try:
+        seed = int(value)
+    except (TypeError, ValueError):
+        return None
+    return seed if seed >= 0 else None
+
+
+def _popcount(words):
+    """Число единичных бит в строках массива uint64 (без np.bitwise_count, которого нет в numpy 1.x)"""
+    bits = np.unpackbits(np.ascontiguousarray(words).view(np.uint8).reshape(len(words), -1), axis=1)
+    return bits.sum(axis=1)
+
+
+class SeenSet:
+    """Показанные строки каталога — бит на фильм, для 50 тысяч фильмов это 6 КБ на сессию"""
+
+    def __init__(self, n_rows):
+        self.n_rows = n_rows
+        self.bits = np.zeros((n_rows + 7) // 8, dtype=np.uint8)
+
+    def contains(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        return (self.bits[rows >> 3] >> (rows & 7).astype(np.uint8) & 1).astype(bool)
+
+    def add(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        np.bitwise_or.at(self.bits, rows >> 3, (1 << (rows & 7)).astype(np.uint8))
+
+    def __len__(self):
+        return int(np.unpackbits(self.bits).sum())
+
+    def clear(self):
+        self.bits[:] = 0
+
+
+class RandomSampler:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.n_rows = len(catalog)
+        self.year = catalog.arrays["year"]
+        self.rating = catalog.arrays["rating"]
+
+        # Жанры без учёта регистра: номер жанра -> отсортированные строки каталога
+        codes, offsets = catalog.arrays["genre_codes"], catalog.arrays["genre_offsets"]
+        names = [genre.lower() for genre in catalog.vocabularies["genre"]]
+        self.genres = sorted(set(names))
+        self.genre_ids = {genre: i for i, genre in enumerate(self.genres)}
+        code_to_genre = np.asarray([self.genre_ids[name] for name in names], dtype=np.int64)
+
+        row_of_code = np.repeat(np.arange(self.n_rows), np.diff(offsets))
+        genre_of_code = code_to_genre[np.asarray(codes)] if len(codes) else np.zeros(0, dtype=np.int64)
+        order = np.lexsort((row_of_code, genre_of_code))
+        pairs = np.unique(np.stack([genre_of_code[order], row_of_code[order]]), axis=1)
+        bounds = np.searchsorted(pairs[0], np.arange(len(self.genres) + 1))
+        self.genre_rows = [pairs[1, bounds[i]:bounds[i + 1]].astype(np.int32) for i in range(len(self.genres))]
+
+        # Маска жанров строки: сколько из выбранных жанров у фильма, за одно обращение
+        self.words = max(1, (len(self.genres) + 63) // 64)
+        self.genre_masks = np.zeros((self.n_rows, self.words), dtype=np.uint64)
+        for genre, rows in enumerate(self.genre_rows):
+            self.genre_masks[rows, genre // 64] |= np.uint64(1 << (genre % 64))
+
+    def genre_counts(self):
+        return {genre: len(rows) for genre, rows in zip(self.genres, self.genre_rows)}
+
+    def bounds(self, column):
+        """Границы слайдера года или рейтинга без NaN (Catalog.bounds)"""
+        return self.catalog.bounds(column)
+
+    def _selection(self, genres):
+        selected = sorted({self.genre_ids[genre.lower()] for genre in genres if genre.lower() in self.genre_ids})
+        mask = np.zeros(self.words, dtype=np.uint64)
+        for genre in selected:
+            mask[genre // 64] |= np.uint64(1 << (genre % 64))
+        return selected, mask
+
+    def _passes(self, rows, years, ratings, seen):
+        keep = np.ones(len(rows), dtype=bool)
+        if years is not None:
+            year = self.year[rows]
+            keep &= (year >= years[0]) & (year <= years[1])
+        if ratings is not None:
+            rating = self.rating[rows]
+            keep &= (rating >= ratings[0]) & (rating <= ratings[1])
+        if seen is not None:
+            keep &= ~seen.contains(rows)
+        return keep
+
+    def sample(self, k, genres=(), years=None, ratings=None, seen=None, rng=None):
+        """До k разных строк каталога, подходящих под фильтр и ещё не показанных (seen — SeenSet).
+
+        Жанры — через «или», год и рейтинг — обязательны, как на страницах поиска. Строк может вернуться меньше k,
+        если подходящие фильмы закончились. Выбранные строки в seen не добавляются — это делает вызывающий.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        if genres:
+            selected, mask = self._selection(genres)
+            lists = [self.genre_rows[genre] for genre in selected]
+            if not lists:
+                return np.zeros(0, dtype=np.int64)
+            sizes = np.cumsum([len(rows) for rows in lists])
+            pool_size = int(sizes[-1])
+        else:
+            lists, mask, pool_size = None, None, self.n_rows
+        if pool_size == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64)
+
+        tries = OVERSAMPLE * k + 16
+        positions = rng.integers(0, pool_size, size=tries)
+        if lists is None:
+            rows = positions
+            accept = np.ones(tries, dtype=bool)
+        else:
+            # Позиция в сцепке списков -> список жанра и место в нём; сами списки не склеиваются
+            which = np.searchsorted(sizes, positions, side="right")
+            local = positions - np.concatenate([[0], sizes[:-1]])[which]
+            rows = np.empty(tries, dtype=np.int64)
+            for i, genre_rows in enumerate(lists):
+                hit = which == i
+                rows[hit] = genre_rows[local[hit]]
+            # Фильм из нескольких выбранных жанров встречается в пуле несколько раз — принимаем его с вероятностью
+            # 1/число совпавших жанров, чтобы все подходящие фильмы выпадали одинаково часто
+            matches = _popcount(self.genre_masks[rows] & mask) if len(lists) > 1 else np.ones(tries)
+            accept = rng.random(tries) * matches < 1
+        rows = rows.astype(np.int64)
+        accept &= self._passes(rows, years, ratings, seen)
+        picked = list(dict.fromkeys(rows[accept].tolist()))[:k]
+        if len(picked) == k:
+            return np.asarray(picked, dtype=np.int64)
+
+        # Фильтру отвечает мало фильмов: честно перебираем только пул выбранных жанров (или весь каталог)
+        pool = np.arange(self.n_rows) if lists is None else np.unique(np.concatenate(lists)).astype(np.int64)
+        eligible = pool[self._passes(pool, years, ratings, seen)]
+        return rng.choice(eligible, size=min(k, len(eligible)), replace=False).astype(np.int64)
@@ -0,0 +1,72 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from .ranking import top_k
+
+
+class SparseTopKScorer:
+    """Косинусный поиск по TF-IDF через инвертированный индекс.
+
+    Оцениваются только документы, у которых есть хотя бы один общий терм с запросом,
+    поэтому время запроса растёт с числом совпавших постингов, а не с размером каталога.
+    """
+
+    def __init__(self, tfidf_matrix):
+        # Косинус равен скалярному произведению только для L2-нормированных строк
+        self.matrix = normalize(sparse.csr_matrix(tfidf_matrix, dtype=np.float32), norm="l2", copy=False)
+        # CSC-представление — это списки постингов: для терма j документы лежат в indices[indptr[j]:indptr[j + 1]]
+        self.postings = self.matrix.tocsc()
+        self.postings.sort_indices()
+
+    @property
+    def n_docs(self):
+        return self.matrix.shape[0]
+
+    def candidate_scores(self, query_vec):
+        """Документы, разделяющие терм с запросом, и их косинусные сходства"""
+        query_vec = normalize(sparse.csr_matrix(query_vec, dtype=np.float32), norm="l2")
+        terms = query_vec.indices
+        if terms.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        indptr = self.postings.indptr
+        starts, ends = indptr[terms], indptr[terms + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Позиции всех нужных постингов одним вектором, без цикла по термам
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        docs = self.postings.indices[offsets]
+        weights = self.postings.data[offsets] * np.repeat(query_vec.data, lengths)
+
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        # bincount считает в float64; сходства отдаются float32, как из search_many
+        scores = np.bincount(inverse, weights=weights, minlength=candidates.size).astype(np.float32)
+        return candidates, scores
+
+    def search(self, query_vec, k=10, min_score=0.0):
+        """Индексы и сходства top-k документов для одного вектора запроса"""
+        candidates, scores = self.candidate_scores(query_vec)
+        best = top_k(scores, k, min_score)
+        return candidates[best], scores[best]
+
+    def search_many(self, query_matrix, k=10, min_score=0.0, chunk_size=1024):
+        """Top-k для пачки запросов: одно разреженное произведение матриц на каждый чанк.
+
+        Размер чанка ограничивает память под промежуточную матрицу сходств.
+        """
+        query_matrix = normalize(sparse.csr_matrix(query_matrix, dtype=np.float32), norm="l2")
+        # Транспонированная CSC-матрица постингов — это уже CSR (термы x документы), без копирования
+        matrix_t = self.postings.T
+        results = []
+        for start in range(0, query_matrix.shape[0], chunk_size):
+            chunk_scores = (query_matrix[start:start + chunk_size] @ matrix_t).tocsr()
+            for row in range(chunk_scores.shape[0]):
+                lo, hi = chunk_scores.indptr[row], chunk_scores.indptr[row + 1]
+                docs, scores = chunk_scores.indices[lo:hi], chunk_scores.data[lo:hi]
+                best = top_k(scores, k, min_score)
+                results.append((docs[best], scores[best]))
+        return results
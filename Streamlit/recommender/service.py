@@ -0,0 +1,438 @@
+"""HTTP API поиска фильмов без Streamlit: те же движки, кэши и фильтры, что у страниц, ответы в JSON.
+
+    GET /search?q=...&k=10&mode=dense|tfidf|hybrid   семантический, TF-IDF или гибридный поиск
+    GET /similar?page_url=...&k=10                    похожие фильмы
+    GET /random?n=10&seed=42                          случайные фильмы
+    GET /browse?sort=rating|year|title&offset=0&limit=20
+    GET /suggest?field=title|actor|director|genre&q=...&limit=10   подсказки для фильтров и названий
+    GET /health                                       готовность компонентов
+    GET /metrics                                      время этапов в формате Prometheus
+
+Фильтры у search, random и browse общие: genres, directors, actors (повтором параметра или через запятую),
+year_min, year_max, rating_min, rating_max — с той же семантикой, что на страницах.
+Запросы к модели эмбеддингов от одновременных клиентов собираются в один батч (QueryBatcher).
+
+Сервису нужен сервер Qdrant (QDRANT_URL): встроенную базу из папки процесс открывает эксклюзивно,
+и вместе с приложением Streamlit её не поделить. Без приложения можно запустить с --embedded.
+
+Запуск:  QDRANT_URL=http://localhost:6333 python -m recommender.service --host 0.0.0.0 --port 8080
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from aiohttp import web
+
+from .autocomplete import FIELDS, SUGGEST_LIMIT, AutocompleteIndex
+from .config import AUTOCOMPLETE_DIR, CATALOG_DIR, COLLECTION_NAME, CSV_FILE, FILTER_INDEX_DIR, NEIGHBORS_DIR
+from .filter_index import FilterIndex
+from .neighbors import NeighborIndex
+from .qdrant_store import StorageProfile, page_filter
+from .startup import STARTUP, warm_up
+from .tracing import TRACER, in_current_trace, span
+
+MODES = ("dense", "tfidf", "hybrid")
+SORTS = ("rating", "year", "title")
+MAX_K = 100
+MAX_BATCH = 32
+# Сколько ждать попутчиков в батч: меньше времени кодирования одного запроса
+MAX_WAIT_SECONDS = 0.005
+# Границы по умолчанию, если задан только один конец диапазона
+YEAR_BOUNDS = (0, 3000)
+RATING_BOUNDS = (0.0, 10.0)
+
+
+class QueryBatcher:
+    """Собирает запросы одновременных клиентов в один вызов модели: до max_batch штук или max_wait секунд"""
+
+    def __init__(self, embeddings, executor, max_batch=MAX_BATCH, max_wait=MAX_WAIT_SECONDS):
+        self.embeddings = embeddings
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.queries = 0
+        self._pending = []
+        self._timer = None
+
+    async def embed(self, text):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.queries += len(batch)
+
+        def deliver(done):
+            # Отменённая задача (остановка сервера) бросила бы CancelledError из exception()
+            error = None if done.cancelled() else done.exception()
+            for position, (_, future) in enumerate(batch):
+                if future.done():
+                    continue  # клиент уже отключился
+                if done.cancelled():
+                    future.cancel()
+                elif error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(done.result()[position])
+
+        texts = [text for text, _ in batch]
+        task = asyncio.get_running_loop().run_in_executor(self.executor, self.embeddings.embed_queries, texts)
+        task.add_done_callback(deliver)
+
+
+class BadRequest(Exception):
+    """Неверные параметры запроса — отвечаем 400; остальные исключения считаются ошибками сервиса"""
+
+
+def _number(name, value, cast):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name}: ожидается число, получено {value!r}") from None
+
+
+def _values(request, name):
+    """Список значений параметра: повтором (?genres=a&genres=b) или через запятую"""
+    return [item.strip() for value in request.query.getall(name, []) for item in value.split(",") if item.strip()]
+
+
+def _bounds(request, name, cast, defaults):
+    low, high = request.query.get(f"{name}_min"), request.query.get(f"{name}_max")
+    if low is None and high is None:
+        return None
+    return (
+        _number(f"{name}_min", low, cast) if low is not None else defaults[0],
+        _number(f"{name}_max", high, cast) if high is not None else defaults[1],
+    )
+
+
+def _int(request, name, default, low=0, high=None):
+    value = _number(name, request.query.get(name, default), int)
+    if value < low or (high is not None and value > high):
+        raise BadRequest(f"{name} должен быть в пределах [{low}, {high if high is not None else '∞'}]")
+    return value
+
+
+def parse_filters(request):
+    """Фильтр страниц из параметров запроса в виде аргументов page_filter / Catalog.filter_rows"""
+    return {
+        "genres": _values(request, "genres"),
+        "directors": _values(request, "directors"),
+        "actors": _values(request, "actors"),
+        "years": _bounds(request, "year", int, YEAR_BOUNDS),
+        "ratings": _bounds(request, "rating", float, RATING_BOUNDS),
+    }
+
+
+def film_json(metadata, description, score=None):
+    film = {key: value for key, value in metadata.items() if not key.startswith("_")}
+    film["description"] = description
+    if score is not None:
+        film["score"] = round(float(score), 6)
+    return film
+
+
+class SearchService:
+    """Движки из startup.STARTUP, общие для всех запросов; блокирующая работа идёт в пуле потоков"""
+
+    def __init__(self, collection_name=COLLECTION_NAME, workers=8, max_batch=MAX_BATCH, max_wait=MAX_WAIT_SECONDS):
+        self.collection_name = collection_name
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service")
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.search_params = StorageProfile.from_env().search_params()
+        self._resources = None
+        self._versions = None
+        self._lock = asyncio.Lock()
+
+    def _load(self):
+        from langchain_qdrant import QdrantVectorStore
+
+        from .hybrid import make_hybrid_searcher
+        from .sampler import RandomSampler
+
+        engine = STARTUP.get("tfidf")
+        embeddings = STARTUP.get("embeddings")
+        vector_store = QdrantVectorStore(
+            client=STARTUP.get("qdrant"), collection_name=self.collection_name, embedding=embeddings
+        )
+        neighbor_index = NeighborIndex(NEIGHBORS_DIR)
+        return {
+            "engine": engine,
+            "vector_store": vector_store,
+            "filter_index": None if os.environ.get("QDRANT_URL") else FilterIndex.load(FILTER_INDEX_DIR),
+            "hybrid": make_hybrid_searcher(engine, vector_store, self.search_params),
+            "neighbors": neighbor_index,
+            "neighbor_sources": neighbor_index.available(engine.fingerprint),
+            "sampler": RandomSampler(engine.catalog),
+            "autocomplete": AutocompleteIndex.load_or_build(CSV_FILE, AUTOCOMPLETE_DIR, CATALOG_DIR),
+            "row_by_url": {url: row for row, url in enumerate(engine.catalog.texts("page_url"))},
+            "batcher": QueryBatcher(embeddings, self.executor, self.max_batch, self.max_wait),
+        }
+
+    async def resources(self):
+        # После sync, ingest или пересборки соседей индексы на диске новые — ресурсы загружаются заново
+        versions = self._artifact_versions()
+        if self._resources is None or versions != self._versions:
+            async with self._lock:
+                if self._resources is None or versions != self._versions:
+                    self._resources = await self.run(self._load)
+                    self._versions = versions
+        return self._resources
+
+    @staticmethod
+    def _artifact_versions():
+        # Версия TF-IDF движка включает каталог: после sync строки, page_url и выборка строятся по новому
+        return (STARTUP.version("tfidf"), FilterIndex.version(FILTER_INDEX_DIR), NeighborIndex.version(NEIGHBORS_DIR),
+                AutocompleteIndex.version(AUTOCOMPLETE_DIR))
+
+    async def run(self, fn, *args):
+        # Этапы внутри пула попадают в трассу запроса, а не начинают свои
+        return await asyncio.get_running_loop().run_in_executor(self.executor, in_current_trace(fn), *args)
+
+    def _catalog_films(self, engine, rows, scores=None):
+        catalog = engine.catalog
+        descriptions = catalog.texts("description", rows)
+        scores = [None] * len(descriptions) if scores is None else scores
+        return [
+            film_json(catalog.metadata(int(row)), description, score)
+            for row, description, score in zip(rows, descriptions, scores)
+        ]
+
+    async def search(self, query, k, mode, filters):
+        from .filter_index import filtered_similarity_search
+
+        resources = await self.resources()
+        engine = resources["engine"]
+        if mode == "tfidf":
+            def tfidf():
+                rows, scores = engine.search_rows(query, k, 0.0, engine.catalog.filter_rows(**filters))
+                return self._catalog_films(engine, rows, scores.tolist())
+            return await self.run(tfidf)
+
+        vector = await resources["batcher"].embed(query)
+        vector_store, filter_index = resources["vector_store"], resources["filter_index"]
+
+        def dense():
+            query_filter = page_filter(**filters)
+            candidates = filter_index.resolve(**filters) if filter_index is not None else None
+
+            def dense_search(text, fetch_k):
+                return filtered_similarity_search(vector_store, text, fetch_k, query_filter, candidates, filter_index,
+                                                  self.search_params, with_scores=True, query_vector=vector)
+
+            if mode == "hybrid":
+                rows = engine.catalog.filter_rows(**filters)
+                documents = resources["hybrid"].search(query, k, dense_search, rows, query_filter, vector)
+                return [film_json(document.metadata, document.page_content) for document in documents]
+            return [film_json(document.metadata, document.page_content, score)
+                    for document, score in dense_search(query, k)]
+
+        return await self.run(dense)
+
+    async def similar(self, page_url, k):
+        resources = await self.resources()
+        row = resources["row_by_url"].get(page_url)
+        if row is None:
+            raise web.HTTPNotFound(text=f"Фильм не найден: {page_url}")
+        engine, sources = resources["engine"], resources["neighbor_sources"]
+
+        def neighbors():
+            if sources:
+                rows, scores = resources["neighbors"].similar(row, k, sources[-1])
+            else:
+                # Индекс соседей не собран: ближайшие по TF-IDF строке самого фильма
+                rows, scores = engine.scorer.search(engine.tfidf_matrix[row], k + 1, 0.0)
+                keep = rows != row
+                rows, scores = rows[keep][:k], scores[keep][:k]
+            return self._catalog_films(engine, rows, np.asarray(scores, dtype=np.float64).tolist())
+
+        return await self.run(neighbors)
+
+    async def random(self, n, filters, seed=None):
+        resources = await self.resources()
+        engine = resources["engine"]
+
+        def sample():
+            rng = np.random.default_rng(seed)
+            if not filters["directors"] and not filters["actors"]:
+                rows = resources["sampler"].sample(n, filters["genres"], filters["years"], filters["ratings"], rng=rng)
+                return self._catalog_films(engine, rows)
+            # Режиссёры и актёры в выборке не индексированы — берём подходящие строки каталога целиком
+            rows = engine.catalog.filter_rows(**filters)
+            return self._catalog_films(engine, rng.choice(rows, size=min(n, len(rows)), replace=False))
+
+        return await self.run(sample)
+
+    async def browse(self, filters, sort, offset, limit):
+        engine = (await self.resources())["engine"]
+
+        def page():
+            catalog = engine.catalog
+            rows = catalog.filter_rows(**filters)
+            rows = np.arange(len(catalog)) if rows is None else rows
+            if sort == "title":
+                titles = catalog.texts("movie_title", rows)
+                order = sorted(range(len(rows)), key=lambda i: titles[i].lower())
+            else:
+                # Сначала новые и высоко оценённые; при равенстве — порядок каталога
+                order = np.argsort(-catalog.numbers(sort, rows), kind="stable")
+            selected = rows[np.asarray(order[offset:offset + limit], dtype=np.int64)]
+            return {"total": int(len(rows)), "films": self._catalog_films(engine, selected)}
+
+        return await self.run(page)
+
+    async def suggest(self, field, text, limit):
+        autocomplete = (await self.resources())["autocomplete"]
+        if autocomplete is None:
+            raise FileNotFoundError("Индекс подсказок не собран: python -m recommender.autocomplete")
+
+        def suggestions():
+            names = autocomplete.suggest(field, text, limit)
+            counts = autocomplete.counts(field, names)
+            return [{"value": name, "films": counts.get(name, 0)} for name in names]
+
+        return await self.run(suggestions)
+
+
+@web.middleware
+async def json_errors(request, handler):
+    """Ошибки в JSON: неверные параметры — 400, недоступный компонент — 503, остальное — 500 с записью в лог"""
+    try:
+        return await handler(request)
+    except web.HTTPException as e:
+        return web.json_response({"error": e.text}, status=e.status)
+    except BadRequest as e:
+        return web.json_response({"error": str(e)}, status=400)
+    except FileNotFoundError as e:
+        return web.json_response({"error": str(e)}, status=503)
+    except Exception:
+        request.app.logger.exception("Ошибка при обработке %s", request.path_qs)
+        return web.json_response({"error": "внутренняя ошибка сервиса"}, status=500)
+
+
+def _json(data):
+    return web.json_response(data, dumps=functools.partial(json.dumps, ensure_ascii=False))
+
+
+# Сервис приложения для обработчиков и хуков: request.app[SERVICE]
+SERVICE = web.AppKey("service", SearchService)
+
+
+def make_app(service=None):
+    service = service or SearchService()
+    routes = web.RouteTableDef()
+
+    @routes.get("/search")
+    async def search(request):
+        query = request.query.get("q", "").strip()
+        if not query:
+            raise BadRequest("Пустой запрос: передайте q")
+        mode = request.query.get("mode", "dense")
+        if mode not in MODES:
+            raise BadRequest(f"Неизвестный режим: {mode}. Доступны: {', '.join(MODES)}")
+        k = _int(request, "k", 10, 1, MAX_K)
+        with span(f"api_search_{mode}"):
+            films = await service.search(query, k, mode, parse_filters(request))
+        return _json({"query": query, "mode": mode, "films": films})
+
+    @routes.get("/similar")
+    async def similar(request):
+        page_url = request.query.get("page_url")
+        if not page_url:
+            raise BadRequest("Передайте page_url фильма")
+        with span("api_similar"):
+            films = await service.similar(page_url, _int(request, "k", 10, 1, MAX_K))
+        return _json({"page_url": page_url, "films": films})
+
+    @routes.get("/random")
+    async def random_films(request):
+        seed = _int(request, "seed", None) if "seed" in request.query else None
+        with span("api_random"):
+            films = await service.random(_int(request, "n", 10, 1, MAX_K), parse_filters(request), seed)
+        return _json({"films": films})
+
+    @routes.get("/browse")
+    async def browse(request):
+        sort = request.query.get("sort", "rating")
+        if sort not in SORTS:
+            raise BadRequest(f"Неизвестная сортировка: {sort}. Доступны: {', '.join(SORTS)}")
+        with span("api_browse"):
+            result = await service.browse(parse_filters(request), sort, _int(request, "offset", 0),
+                                          _int(request, "limit", 20, 1, MAX_K))
+        return _json(result)
+
+    @routes.get("/suggest")
+    async def suggest(request):
+        field = request.query.get("field", "title")
+        if field not in FIELDS:
+            raise BadRequest(f"Неизвестное поле: {field}. Доступны: {', '.join(FIELDS)}")
+        query = request.query.get("q", "")
+        with span("api_suggest"):
+            suggestions = await service.suggest(field, query, _int(request, "limit", SUGGEST_LIMIT, 1, MAX_K))
+        return _json({"field": field, "q": query, "suggestions": suggestions})
+
+    @routes.get("/health")
+    async def health(request):
+        ready = STARTUP.ready()
+        return _json({"ready": ready, "components": STARTUP.status()})
+
+    @routes.get("/metrics")
+    async def metrics(request):
+        return web.Response(text=TRACER.prometheus_text(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application(middlewares=[json_errors])
+    app.add_routes(routes)
+    app[SERVICE] = service
+
+    async def on_startup(app):
+        warm_up()
+
+    async def on_cleanup(app):
+        service.executor.shutdown(wait=False)
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API поиска фильмов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8, help="потоков для поиска и модели")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="запросов в одном батче модели")
+    parser.add_argument("--max-wait-ms", type=float, default=1000 * MAX_WAIT_SECONDS)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--embedded", action="store_true",
+                        help="встроенная база из папки без QDRANT_URL — только когда приложение Streamlit не запущено")
+    args = parser.parse_args()
+
+    # Встроенный Qdrant держит эксклюзивную блокировку папки: вместе с приложением работает только сервер Qdrant
+    if not os.environ.get("QDRANT_URL") and not args.embedded:
+        parser.error("задайте QDRANT_URL: встроенную базу из папки нельзя открыть одновременно с приложением Streamlit "
+                     "(для запуска без приложения добавьте --embedded)")
+
+    service = SearchService(args.collection, args.workers, args.max_batch, args.max_wait_ms / 1000)
+    web.run_app(make_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
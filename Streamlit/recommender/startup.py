@@ -0,0 +1,162 @@
+"""Запуск без холодного старта: тяжёлые компоненты грузятся в фоне, страницы берут готовые.
+
+Первый же запуск любой страницы вызывает warm_up(): фоновый поток по очереди импортирует библиотеки
+и поднимает модель эмбеддингов (с пробным запросом), клиент Qdrant и TF-IDF движок. Страница, которой
+компонент нужен раньше, ждёт его в get(); ещё не начатый компонент грузится прямо в её потоке.
+TF-IDF движок загружается заново, когда sync или ingest обновили CSV, каталог или кэш TF-IDF на диске.
+status() отдаёт состояние и время импорта и инициализации каждого компонента; то же время попадает
+в метрики tracing (startup_<компонент>_import/_init).
+"""
+import importlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .config import CATALOG_DIR, CSV_FILE, QDRANT_PATH, TFIDF_CACHE_DIR
+from .tracing import TRACER, start_exporter_from_env
+
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "error"
+
+
+class Component:
+    def __init__(self, name, modules, init, version=None):
+        self.name = name
+        self.modules = modules
+        self.init = init
+        # version() — версия данных на диске; когда она меняется (sync, ingest), компонент загружается заново
+        self.version = version
+        self.loaded_version = None
+        self.state = PENDING
+        self.value = None
+        self.error = None
+        self.import_seconds = None
+        self.init_seconds = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Загружает компонент один раз и снова — если изменились его данные; параллельные вызовы ждут первый"""
+        with self._lock:
+            if self.state == READY and not self.changed():
+                return self.value
+            # После ошибки пробуем снова: базу или CSV могли положить на место
+            self.state, self.error = LOADING, None
+            try:
+                start = time.perf_counter()
+                for module in self.modules():
+                    importlib.import_module(module)
+                self.import_seconds = time.perf_counter() - start
+
+                start = time.perf_counter()
+                self.value = self.init()
+                self.init_seconds = time.perf_counter() - start
+                self.loaded_version = self.version() if self.version else None
+            except Exception as e:
+                self.state, self.error = FAILED, e
+                raise
+            # Загрузки редки (старт процесса, обновление данных), поэтому пишутся в метрики без выборки
+            TRACER.observe(f"startup_{self.name}_import", self.import_seconds)
+            TRACER.observe(f"startup_{self.name}_init", self.init_seconds)
+            self.state = READY
+            return self.value
+
+    def changed(self):
+        return self.version is not None and self.version() != self.loaded_version
+
+    def status(self):
+        return {
+            "component": self.name,
+            "state": self.state,
+            "import_seconds": self.import_seconds,
+            "init_seconds": self.init_seconds,
+            "error": None if self.error is None else f"{type(self.error).__name__}: {self.error}",
+        }
+
+
+class Startup:
+    def __init__(self):
+        self.components = OrderedDict()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def register(self, name, modules, init, version=None):
+        self.components[name] = Component(name, modules, init, version)
+
+    def get(self, name):
+        return self.components[name].load()
+
+    def version(self, name):
+        """Текущая версия данных компонента на диске (None, если она не отслеживается)"""
+        component = self.components[name]
+        return component.version() if component.version else None
+
+    def warm_up(self, names=None):
+        """Запускает фоновую загрузку один раз на процесс; повторные вызовы ничего не делают"""
+        with self._lock:
+            if self._thread is not None:
+                return self._thread
+            names = list(names or self.components)
+
+            def run():
+                for name in names:
+                    try:
+                        self.get(name)
+                    except Exception:
+                        pass  # ошибка видна в status(), страница получит её в get()
+
+            self._thread = threading.Thread(target=run, name="warm-up", daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def ready(self, name=None):
+        components = [self.components[name]] if name else self.components.values()
+        return all(component.state == READY for component in components)
+
+    def status(self):
+        return [component.status() for component in self.components.values()]
+
+
+def _embedding_modules():
+    if os.environ.get("EMBEDDINGS_BACKEND", "hf") == "onnx":
+        return ["onnxruntime", "transformers"]
+    return ["torch", "sentence_transformers", "langchain_huggingface"]
+
+
+def _init_embeddings():
+    from .embeddings import shared_query_embeddings
+
+    embeddings = shared_query_embeddings()
+    # Пробный запрос мимо кэша: веса в памяти, первый настоящий запрос не платит за инициализацию
+    embeddings.base.embed_query("прогрев модели")
+    return embeddings
+
+
+def _init_qdrant():
+    if not os.environ.get("QDRANT_URL") and not os.path.exists(QDRANT_PATH):
+        raise FileNotFoundError(f"База Qdrant не найдена: {QDRANT_PATH}")
+    from .qdrant_store import make_client
+
+    return make_client(QDRANT_PATH)
+
+
+def _init_tfidf():
+    from .tfidf import MovieSearchEngine
+
+    return MovieSearchEngine.load_or_build(CSV_FILE, TFIDF_CACHE_DIR, CATALOG_DIR)
+
+
+def _tfidf_version():
+    from .tfidf import MovieSearchEngine
+
+    return MovieSearchEngine.version_of(CSV_FILE, TFIDF_CACHE_DIR, CATALOG_DIR)
+
+
+STARTUP = Startup()
+STARTUP.register("embeddings", _embedding_modules, _init_embeddings)
+STARTUP.register("qdrant", lambda: ["qdrant_client", "langchain_qdrant"], _init_qdrant)
+STARTUP.register("tfidf", lambda: ["scipy.sparse", "sklearn.feature_extraction.text"], _init_tfidf, _tfidf_version)
+
+
+def warm_up():
+    start_exporter_from_env()
+    return STARTUP.warm_up()
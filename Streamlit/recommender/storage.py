@@ -0,0 +1,48 @@
+import hashlib
+import json
+import os
+
+
+def atomic_write(path, write):
+    """Пишет файл через временный и подменяет его одной операцией"""
+    path = str(path)
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{ext}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_json(path, data):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    atomic_write(path, write)
+
+
+def read_json(path):
+    """Содержимое JSON-файла или None, если файла нет или он повреждён"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def file_version(path):
+    """Версия файла для ключа кэша в памяти: atomic_write подменяет файл, и она меняется; None — файла нет"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,253 @@
+"""Инкрементальная синхронизация Qdrant и TF-IDF кэша с films_data.csv.
+
+В манифесте хранится хэш содержимого каждого фильма (ключ — page_url). При запуске CSV сравнивается
+с манифестом: новые и изменённые фильмы перекодируются и загружаются, удалённые — удаляются из Qdrant,
+а строки TF-IDF матрицы пересчитываются без переобучения, пока словарь векторизатора их покрывает.
+
+Запуск:  python -m recommender.sync
+Коллекцию, собранную старым ноутбуком со случайными uuid4, нужно один раз пересобрать:
+python -m recommender.ingest --recreate
+"""
+import argparse
+import hashlib
+import io
+
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .config import COLLECTION_NAME, CSV_FILE, QDRANT_PATH, SYNC_MANIFEST, TFIDF_CACHE_DIR
+from .ingest import build_points, check_point_ids, ensure_collection, point_id, prepare_rows
+from .storage import read_json, write_json
+from .tfidf import TfidfArtifact, build_search_texts, fingerprint_bytes
+
+# Доля новых для словаря токенов, после которой TF-IDF переобучается целиком
+MAX_OOV_RATIO = 0.05
+# Если изменилась большая часть каталога, точечное обновление уже не выгодно
+MAX_CHANGED_RATIO = 0.3
+
+
+# Числовые столбцы хэшируются по значению: одна строка без года превращает весь столбец year в float64,
+# и без приведения «2001» стало бы «2001.0» у каждого фильма
+CANONICAL_TYPES = {"year": int, "rating": float}
+
+
+def _canonical(column, values):
+    cast = CANONICAL_TYPES.get(column)
+
+    def text(value):
+        if pd.isna(value):
+            return "nan"
+        if cast is not None:
+            try:
+                return str(cast(float(value)))
+            except (TypeError, ValueError):
+                return str(value)
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    return [text(value) for value in values]
+
+
+def row_hashes(df: pd.DataFrame):
+    """Хэш содержимого каждой строки CSV; не зависит от dtype столбцов и их порядка"""
+    columns = [_canonical(column, df[column].tolist()) for column in sorted(df.columns)]
+    return [hashlib.sha1("\x1f".join(values).encode("utf-8")).hexdigest() for values in zip(*columns)]
+
+
+def row_keys(df: pd.DataFrame, hashes):
+    """Ключ фильма — page_url, а для строк без ссылки — хэш содержимого"""
+    return [
+        url if isinstance(url, str) and url else f"row:{row_hash}"
+        for url, row_hash in zip(df['page_url'], hashes)
+    ]
+
+
+def diff(old, new):
+    """Новые/изменённые и удалённые ключи между двумя словарями ключ → хэш"""
+    changed = [key for key, value in new.items() if old.get(key) != value]
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+class SyncManifest:
+    def __init__(self, path=SYNC_MANIFEST):
+        self.path = str(path)
+        self.data = read_json(self.path) or {}
+
+    @property
+    def qdrant(self):
+        return self.data.get("qdrant")
+
+    @property
+    def tfidf(self):
+        return self.data.get("tfidf")
+
+    def save(self, **sections):
+        self.data.update(sections)
+        write_json(self.path, self.data)
+
+
+def qdrant_state(df: pd.DataFrame):
+    """page_url → хэш для тех строк, которые попадают в Qdrant"""
+    films = prepare_rows(df)
+    hashes = row_hashes(df.loc[films.index])
+    return films, dict(zip(films['page_url'], hashes))
+
+
+def sync_qdrant(df, client, embeddings, manifest, collection_name=COLLECTION_NAME,
+                upsert_batch_size=256, dry_run=False, log=print):
+    films, state = qdrant_state(df)
+    changed, removed = diff(manifest.qdrant or {}, state)
+    log(f"Qdrant: новых или изменённых {len(changed)}, удалённых {len(removed)}")
+    if dry_run:
+        return changed, removed
+
+    check_point_ids(client, collection_name)
+    if changed:
+        delta = films[films['page_url'].isin(set(changed))].drop_duplicates('page_url', keep='last')
+        vectors = embeddings.embed_documents(delta['description'].tolist())
+        ensure_collection(client, collection_name, len(vectors[0]))
+        points = build_points(delta, vectors)
+        for start in range(0, len(points), upsert_batch_size):
+            client.upsert(collection_name=collection_name, points=points[start:start + upsert_batch_size], wait=True)
+
+    if removed:
+        from qdrant_client.models import PointIdsList
+
+        client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=[point_id(url) for url in removed]),
+            wait=True,
+        )
+
+    manifest.save(qdrant=state)
+    return changed, removed
+
+
+def _oov_ratio(vectorizer, texts):
+    analyzer = vectorizer.build_analyzer()
+    vocabulary = vectorizer.vocabulary_
+    total = missing = 0
+    for text in texts:
+        for token in analyzer(text):
+            total += 1
+            missing += token not in vocabulary
+    return missing / total if total else 0.0
+
+
+def sync_tfidf(df, fingerprint, manifest, cache_dir=TFIDF_CACHE_DIR, max_oov_ratio=MAX_OOV_RATIO,
+               dry_run=False, log=print):
+    artifact = TfidfArtifact(cache_dir)
+    hashes = row_hashes(df)
+    keys = row_keys(df, hashes)
+
+    previous = manifest.tfidf
+    artifact_manifest = artifact.read_manifest()
+    can_patch = (
+        previous is not None
+        and artifact_manifest is not None
+        and artifact_manifest.get("source_sha256") == previous.get("source_sha256")
+    )
+
+    # Для каждой строки нового CSV — номер строки в старой матрице или -1, если её надо пересчитать
+    reuse = [-1] * len(df)
+    if can_patch:
+        old_rows = {(key, row_hash): row for row, (key, row_hash) in enumerate(zip(previous["keys"], previous["hashes"]))}
+        reuse = [old_rows.get((key, row_hash), -1) for key, row_hash in zip(keys, hashes)]
+
+    changed_rows = [row for row, old_row in enumerate(reuse) if old_row < 0]
+    log(f"TF-IDF: строк к пересчёту {len(changed_rows)} из {len(df)}")
+    if dry_run:
+        return changed_rows
+
+    changed_texts = build_search_texts(df.iloc[changed_rows]) if changed_rows else []
+    refit = not can_patch or len(changed_rows) > MAX_CHANGED_RATIO * max(len(df), 1)
+    if not refit and changed_rows:
+        vectorizer, old_matrix = artifact.load()
+        oov = _oov_ratio(vectorizer, changed_texts)
+        refit = oov > max_oov_ratio
+        log(f"TF-IDF: доля токенов вне словаря {oov:.1%}")
+
+    if refit:
+        log("TF-IDF: переобучаем векторизатор целиком")
+        texts = build_search_texts(df)
+        vectorizer = TfidfVectorizer(max_features=50000)
+        tfidf_matrix = vectorizer.fit_transform(texts).tocsr()
+    else:
+        if not changed_rows:
+            vectorizer, old_matrix = artifact.load()
+        old_texts = artifact.load_texts()
+        # Старые строки идут первыми, пересчитанные — после них; затем всё переставляется в порядок CSV
+        parts = [old_matrix]
+        if changed_rows:
+            parts.append(vectorizer.transform(changed_texts))
+        stacked = sparse.vstack(parts).tocsr()
+        changed_position = {row: old_matrix.shape[0] + i for i, row in enumerate(changed_rows)}
+        order = [old_row if old_row >= 0 else changed_position[row] for row, old_row in enumerate(reuse)]
+        tfidf_matrix = stacked[order]
+        changed_text = dict(zip(changed_rows, changed_texts))
+        texts = [old_texts[old_row] if old_row >= 0 else changed_text[row] for row, old_row in enumerate(reuse)]
+
+    artifact.save(texts, vectorizer, tfidf_matrix, fingerprint)
+    manifest.save(tfidf={"source_sha256": fingerprint, "keys": keys, "hashes": hashes})
+    return changed_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Инкрементальное обновление индексов по films_data.csv")
+    parser.add_argument("--csv", default=str(CSV_FILE))
+    parser.add_argument("--qdrant-path", default=str(QDRANT_PATH))
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--tfidf-cache", default=str(TFIDF_CACHE_DIR))
+    parser.add_argument("--manifest", default=str(SYNC_MANIFEST))
+    parser.add_argument("--max-oov", type=float, default=MAX_OOV_RATIO)
+    parser.add_argument("--skip-qdrant", action="store_true")
+    parser.add_argument("--skip-tfidf", action="store_true")
+    parser.add_argument("--dry-run", action="store_true", help="только показать размер изменений")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--batch-size", type=int, default=128)
+    args = parser.parse_args()
+
+    with open(args.csv, "rb") as f:
+        raw = f.read()
+    df = pd.read_csv(io.BytesIO(raw))
+    manifest = SyncManifest(args.manifest)
+
+    if not args.dry_run:
+        from .autocomplete import AutocompleteIndex
+        from .catalog import Catalog
+
+        AutocompleteIndex.build(Catalog.build(df, fingerprint_bytes(raw)))
+
+    if not args.skip_tfidf:
+        sync_tfidf(df, fingerprint_bytes(raw), manifest, args.tfidf_cache, args.max_oov, args.dry_run)
+
+    if not args.skip_qdrant:
+        from .qdrant_store import make_client
+        from .embeddings import make_embeddings
+
+        client = make_client(args.qdrant_path)
+        embeddings = None if args.dry_run else make_embeddings(device=args.device, batch_size=args.batch_size)
+        changed, _ = sync_qdrant(df, client, embeddings, manifest, args.collection, dry_run=args.dry_run)
+        if not args.dry_run:
+            from .filter_index import build_and_save
+            from .qdrant_store import has_sparse_vectors
+
+            build_and_save(df)
+            if has_sparse_vectors(client, args.collection):
+                from .hybrid import upload_sparse_vectors, vectorizer_sha256
+                from .tfidf import MovieSearchEngine
+
+                engine = MovieSearchEngine.load_or_build(args.csv, args.tfidf_cache)
+                # upsert заменяет точку целиком: изменённым фильмам векторы нужны всегда,
+                # а остальным — только если словарь TF-IDF переобучен
+                sparse_state = SyncManifest(args.manifest).data.get("sparse") or {}
+                same_vocabulary = sparse_state.get("vectorizer_sha256") == vectorizer_sha256(engine.vectorizer)
+                upload_sparse_vectors(client, engine, args.collection, args.manifest,
+                                      page_urls=changed if same_vocabulary else None)
+
+
+if __name__ == "__main__":
+    main()
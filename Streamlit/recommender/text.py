@@ -0,0 +1,5 @@
+"""Нормализация запросов без зависимостей: общая для кэша эмбеддингов и кэша комментариев."""
+
+
+def normalize_query(text):
+    return " ".join(text.lower().split())
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import re
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .catalog import Catalog
+from .config import CATALOG_DIR, CSV_FILE, TFIDF_CACHE_DIR
+from .ranking import top_k
+from .scoring import SparseTopKScorer
+from .storage import atomic_write, file_version, read_json, write_json
+from .tracing import traced
+
+# Увеличивать при любом изменении подготовки текста или параметров векторизатора
+ARTIFACT_VERSION = 1
+MIN_SIMILARITY = 0.1
+
+
+def fingerprint_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def clean_text(text):
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join([w for w in text.split() if len(w) > 2])
+
+
+def build_search_texts(df: pd.DataFrame):
+    """Склеивает название, жанр, описание, режиссёра и актёров в текст для TF-IDF"""
+    search_text = (
+        df['movie_title'].fillna('').str.lower().apply(clean_text) + " " +
+        df['genre'].fillna('').str.lower() + " " +
+        df['description'].fillna('').str.lower().apply(clean_text) + " " +
+        df['director'].fillna('').str.lower() + " " +
+        df['actors'].fillna('').str.lower()
+    )
+    return search_text.tolist()
+
+
+class TfidfArtifact:
+    """Версионированный кэш на диске: тексты, векторизатор, матрица и отпечаток CSV"""
+
+    def __init__(self, cache_dir=TFIDF_CACHE_DIR):
+        self.cache_dir = str(cache_dir)
+        self.texts_path = os.path.join(self.cache_dir, "texts.joblib")
+        self.vectorizer_path = os.path.join(self.cache_dir, "vectorizer.joblib")
+        self.matrix_path = os.path.join(self.cache_dir, "tfidf_matrix.npz")
+        self.manifest_path = os.path.join(self.cache_dir, "manifest.json")
+
+    def version(self):
+        """Меняется при каждой пересборке кэша (манифест пишется последним)"""
+        return file_version(self.manifest_path)
+
+    def read_manifest(self):
+        return read_json(self.manifest_path)
+
+    def is_fresh(self, fingerprint, n_docs):
+        manifest = self.read_manifest()
+        return (
+            manifest is not None
+            and manifest.get("version") == ARTIFACT_VERSION
+            and manifest.get("source_sha256") == fingerprint
+            and manifest.get("n_docs") == n_docs
+            and os.path.exists(self.vectorizer_path)
+            and os.path.exists(self.matrix_path)
+        )
+
+    def load(self):
+        vectorizer = joblib.load(self.vectorizer_path)
+        tfidf_matrix = sparse.load_npz(self.matrix_path).tocsr()
+        return vectorizer, tfidf_matrix
+
+    def load_texts(self):
+        return joblib.load(self.texts_path)
+
+    def save(self, texts, vectorizer, tfidf_matrix, fingerprint):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Манифест пишется последним: недописанный кэш не будет считаться свежим
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+        atomic_write(self.texts_path, lambda path: joblib.dump(texts, path))
+        atomic_write(self.vectorizer_path, lambda path: joblib.dump(vectorizer, path))
+        atomic_write(self.matrix_path, lambda path: sparse.save_npz(path, tfidf_matrix))
+
+        manifest = {
+            "version": ARTIFACT_VERSION,
+            "source_sha256": fingerprint,
+            "n_docs": int(tfidf_matrix.shape[0]),
+            "n_features": int(tfidf_matrix.shape[1]),
+        }
+        write_json(self.manifest_path, manifest)
+
+
+class MovieSearchEngine:
+    def __init__(self, catalog: Catalog, vectorizer, tfidf_matrix, fingerprint=None):
+        self.catalog = catalog
+        self.fingerprint = fingerprint or catalog.fingerprint
+        self.vectorizer = vectorizer
+        self.scorer = SparseTopKScorer(tfidf_matrix)
+        self.tfidf_matrix = self.scorer.matrix
+        self.version = None
+
+    @staticmethod
+    def version_of(csv_path=CSV_FILE, cache_dir=TFIDF_CACHE_DIR, catalog_dir=CATALOG_DIR):
+        """Версия CSV, каталога и кэша TF-IDF на диске: меняется после sync, ingest или замены CSV"""
+        return file_version(csv_path), Catalog.version(catalog_dir), TfidfArtifact(cache_dir).version()
+
+    @classmethod
+    def load_or_build(cls, csv_path=CSV_FILE, cache_dir=TFIDF_CACHE_DIR, catalog_dir=CATALOG_DIR):
+        """Поднимает движок из кэша, а если CSV изменился — пересобирает кэш"""
+        catalog = Catalog.load_or_build(csv_path, catalog_dir)
+
+        artifact = TfidfArtifact(cache_dir)
+        if artifact.is_fresh(catalog.fingerprint, len(catalog)):
+            vectorizer, tfidf_matrix = artifact.load()
+        else:
+            texts = build_search_texts(catalog.frame())
+            vectorizer = TfidfVectorizer(max_features=50000)
+            tfidf_matrix = vectorizer.fit_transform(texts).tocsr()
+            artifact.save(texts, vectorizer, tfidf_matrix, catalog.fingerprint)
+        engine = cls(catalog, vectorizer, tfidf_matrix)
+        # Версия после возможной пересборки: по ней страницы и сервис узнают, что движок пора загрузить заново
+        engine.version = cls.version_of(csv_path, cache_dir, catalog_dir)
+        return engine
+
+    @traced("tfidf_search")
+    def search(self, query: str, top_n=10, min_similarity=MIN_SIMILARITY):
+        query_vec = self.vectorizer.transform([query.lower()])
+        top_indices, scores = self.scorer.search(query_vec, top_n, min_similarity)
+        return self._results(top_indices, scores)
+
+    @traced("tfidf_search")
+    def search_rows(self, query: str, top_n=10, min_similarity=MIN_SIMILARITY, rows=None):
+        """Номера строк каталога и сходства; rows ограничивает поиск строками, прошедшими фильтр"""
+        query_vec = self.vectorizer.transform([query.lower()])
+        if rows is None:
+            return self.scorer.search(query_vec, top_n, min_similarity)
+        docs, scores = self.scorer.candidate_scores(query_vec)
+        keep = np.isin(docs, rows)
+        docs, scores = docs[keep], scores[keep]
+        best = top_k(scores, top_n, min_similarity)
+        return docs[best], scores[best]
+
+    def search_many(self, queries, top_n=10, min_similarity=MIN_SIMILARITY, chunk_size=1024):
+        """Пакетный поиск для офлайн-задач: один transform на все запросы"""
+        query_matrix = self.vectorizer.transform([query.lower() for query in queries])
+        hits = self.scorer.search_many(query_matrix, top_n, min_similarity, chunk_size)
+        return [self._results(top_indices, scores) for top_indices, scores in hits]
+
+    def _results(self, top_indices, scores):
+        results = self.catalog.frame(top_indices)
+        results['similarity'] = scores
+        return results
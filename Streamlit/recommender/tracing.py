@@ -0,0 +1,251 @@
+"""Лёгкая трассировка горячих путей: этапы запроса, гистограммы задержек и выгрузка в формате Prometheus.
+
+    with TRACER.span("vector_search"):   # этап; вложенные этапы складываются в дерево запроса
+        ...
+    @traced("tfidf_search")               # то же для целой функции
+
+Трассируется доля запросов TRACE_SAMPLE_RATE (по умолчанию 0.1): решение принимается на корневом этапе
+и наследуется вложенными, поэтому невыбранный запрос стоит одной проверки contextvar на этап.
+Гистограммы копятся по выбранным трассам; время загрузки компонентов при старте пишется всегда.
+
+TRACE_METRICS_FILE — файл, куда раз в TRACE_FLUSH_SECONDS (по умолчанию 15) пишется текст Prometheus
+для textfile-коллектора node_exporter; {pid} в пути заменяется номером процесса.
+MOVIE_DEBUG=1 (или ?debug=1 в адресе страницы) трассирует каждый запрос и показывает отладочную панель.
+"""
+import bisect
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from .storage import atomic_write
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_SAMPLE_RATE = 0.1
+FLUSH_SECONDS = 15
+
+# Текущая трасса и глубина этапа; False — запрос не выбран для трассировки
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def debug_enabled(query_params=None):
+    if os.environ.get("MOVIE_DEBUG", "0") == "1":
+        return True
+    return query_params is not None and query_params.get("debug") == "1"
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам — линейно внутри корзины, как histogram_quantile в Prometheus"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.origin = time.perf_counter()
+        # (этап, глубина, начало от старта трассы, длительность, ошибка)
+        self.spans = []
+
+    def rows(self):
+        """Этапы по времени начала, с отступом по вложенности — для таблицы на странице"""
+        return [
+            {"stage": " " * depth + name, "start_ms": 1000 * start, "ms": 1000 * seconds, "error": error}
+            for name, depth, start, seconds, error in sorted(self.spans, key=lambda span: (span[2], span[1]))
+        ]
+
+
+class Tracer:
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, buckets=BUCKETS):
+        self.sample_rate = sample_rate
+        self.buckets = buckets
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", str(DEFAULT_SAMPLE_RATE))))
+
+    def observe(self, name, seconds, error=False):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            histogram.errors += error
+
+    @contextmanager
+    def span(self, name, force=False):
+        """Этап запроса; отдаёт трассу или None, если запрос не выбран.
+
+        force=True трассирует корневой этап без выборки (отладочная панель).
+        """
+        current = _current.get()
+        if current is False:
+            yield None
+            return
+        if current is None:
+            if not force and random.random() >= self.sample_rate:
+                token = _current.set(False)
+                try:
+                    yield None
+                finally:
+                    _current.reset(token)
+                return
+            trace, depth = Trace(name), 0
+        else:
+            trace, depth = current[0], current[1] + 1
+
+        token = _current.set((trace, depth))
+        start = time.perf_counter()
+        error = False
+        try:
+            yield trace
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            _current.reset(token)
+            trace.spans.append((name, depth, start - trace.origin, seconds, error))
+            self.observe(name, seconds, error)
+
+    def record(self, name, seconds):
+        """Этап, замеренный вручную (например, чтение генератора), в текущей трассе"""
+        current = _current.get()
+        if current is False or (current is None and random.random() >= self.sample_rate):
+            return
+        if current is not None:
+            trace, depth = current
+            trace.spans.append((name, depth + 1, time.perf_counter() - seconds - trace.origin, seconds, False))
+        self.observe(name, seconds)
+
+    def traced(self, name):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Сводка по этапам для отладочной панели: число вызовов, ошибки, среднее и квантили в мс"""
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            rows = []
+            for name, histogram in histograms:
+                rows.append({
+                    "stage": name,
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "mean_ms": 1000 * histogram.sum / histogram.count,
+                    "p50_ms": 1000 * histogram.quantile(0.5),
+                    "p95_ms": 1000 * histogram.quantile(0.95),
+                    "p99_ms": 1000 * histogram.quantile(0.99),
+                })
+        return rows
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP movie_stage_seconds Время этапов обработки запроса (по выбранным трассам)",
+            "# TYPE movie_stage_seconds histogram",
+        ]
+        errors = []
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'movie_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'movie_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'movie_stage_seconds_sum{{stage="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'movie_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+                errors.append(f'movie_stage_errors_total{{stage="{name}"}} {histogram.errors}')
+        lines += ["# HELP movie_stage_errors_total Этапы, завершившиеся исключением",
+                  "# TYPE movie_stage_errors_total counter", *errors,
+                  "# HELP movie_trace_sample_rate Доля трассируемых запросов",
+                  "# TYPE movie_trace_sample_rate gauge",
+                  f"movie_trace_sample_rate {self.sample_rate}"]
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path):
+        text = self.prometheus_text()
+
+        def write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+
+        atomic_write(str(path).replace("{pid}", str(os.getpid())), write)
+
+    def start_exporter(self, path, interval=FLUSH_SECONDS):
+        """Фоновая запись метрик в файл раз в interval секунд; повторные вызовы ничего не делают"""
+        with self._lock:
+            if self._exporter is not None:
+                return self._exporter
+
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.write_metrics(path)
+                    except OSError:
+                        pass  # нет места или прав — метрики подождут до следующего раза
+
+            self._exporter = threading.Thread(target=run, name="metrics-export", daemon=True)
+            self._exporter.start()
+            return self._exporter
+
+
+TRACER = Tracer.from_env()
+
+
+def span(name, force=False):
+    return TRACER.span(name, force)
+
+
+def traced(name):
+    return TRACER.traced(name)
+
+
+def in_current_trace(fn):
+    """Обёртка для пула потоков: задачи продолжают трассу вызывающего потока, а не начинают свои"""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def start_exporter_from_env():
+    path = os.environ.get("TRACE_METRICS_FILE")
+    if path:
+        TRACER.start_exporter(path, float(os.environ.get("TRACE_FLUSH_SECONDS", str(FLUSH_SECONDS))))
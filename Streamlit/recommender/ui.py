@@ -0,0 +1,193 @@
+"""Общие части страниц Streamlit: прогрев, кэши ресурсов процесса, фильтры, карточка фильма, отладочная панель.
+
+Модуль импортирует streamlit, поэтому используется только страницами; сервис и офлайн-команды его не трогают.
+"""
+import os
+
+import streamlit as st
+
+from .autocomplete import SUGGEST_LIMIT, AutocompleteIndex
+from .config import COLLECTION_NAME, CSV_FILE, FILTER_INDEX_DIR, FILTER_VALUES_FILE, NEIGHBORS_DIR, QDRANT_PATH
+from .filter_index import FilterIndex
+from .posters import is_poster_url, shared_poster_cache
+from .startup import STARTUP, warm_up
+from .storage import read_json
+from .tracing import TRACER
+
+
+def start_page(font_size=26):
+    """Начало каждой страницы: фоновая загрузка компонентов и общий стиль"""
+    # Модель, клиент Qdrant и TF-IDF грузятся в фоне с первого запуска любой страницы
+    warm_up()
+    st.set_page_config(layout="wide")
+    st.markdown(
+        f"""
+        <style>
+        /* Увеличиваем базовый размер шрифта для всего приложения */
+        html, body, .block-container {{
+            font-size: {font_size}px !important;
+        }}
+        </style>
+        """,
+        unsafe_allow_html=True
+    )
+
+
+# Постеры всей выдачи качаются параллельно и хранятся миниатюрами в кэше на диске
+@st.cache_resource
+def get_poster_cache():
+    return shared_poster_cache()
+
+
+# Подсказки для фильтров и названий: вместо десятков тысяч имён в каждом списке — десяток подходящих под ввод.
+# version — ключ кэша: после sync или ingest индекс открывается заново без перезапуска приложения
+@st.cache_resource(show_spinner="Загружаем подсказки...", max_entries=1)
+def _autocomplete(version):
+    return AutocompleteIndex.load_or_build(CSV_FILE)
+
+
+def get_autocomplete():
+    """Индекс подсказок или None, если нет ни CSV, ни индекса, собранного при ingest"""
+    return _autocomplete(AutocompleteIndex.version())
+
+
+@st.cache_data
+def load_filter_values():
+    """Полные списки для фильтров из dict_filtr.json — запасной вариант без индекса подсказок"""
+    return read_json(FILTER_VALUES_FILE) or {}
+
+
+def suggest_multiselect(label, field, autocomplete):
+    """Мультиселект с поиском по вводу: Streamlit не вызывает код на каждую букву, варианты обновляются по Enter"""
+    key = f"selected_{field}"
+    text = st.text_input(f"Поиск: {label.lower()}", key=f"suggest_{field}",
+                         placeholder="Начните вводить имя и нажмите Enter")
+    # Уже выбранные значения остаются в списке, даже если не подходят под новый ввод
+    selected = st.session_state.get(key, [])
+    options = list(dict.fromkeys(selected + autocomplete.suggest(field, text, SUGGEST_LIMIT)))
+    counts = autocomplete.counts(field, options)
+    return st.multiselect(label, options, key=key, format_func=lambda name: f"{name} ({counts.get(name, 0)})")
+
+
+def filter_widgets(autocomplete):
+    """Фильтры страниц поиска: жанры, режиссёры, актёры, годы и рейтинг"""
+    if autocomplete is None:
+        # Обычные мультиселекты со всеми значениями, как до индекса подсказок
+        values = load_filter_values()
+        genres = st.multiselect("Жанры", values.get("genres", []))
+        directors = st.multiselect("Режиссеры", values.get("directors", []))
+        actors = st.multiselect("Актеры", values.get("actors", []))
+        year_min, year_max = min(values.get("years") or [1900]), max(values.get("years") or [2025])
+        rating_min = float(min(values.get("ratings") or [0.0]))
+    else:
+        genres = st.multiselect("Жанры", sorted(autocomplete.top("genre", None)))
+        directors = suggest_multiselect("Режиссеры", "director", autocomplete)
+        actors = suggest_multiselect("Актеры", "actor", autocomplete)
+        year_min, year_max = autocomplete.ranges["year"]
+        rating_min = autocomplete.ranges["rating"][0]
+    years = st.slider("Выберите диапазон годов", min_value=year_min, max_value=year_max, value=(year_min, year_max))
+    ratings = st.slider("Выберите диапазон рейтинга", min_value=rating_min, max_value=10.0, value=(rating_min, 10.0))
+    return genres, directors, actors, years, ratings
+
+
+# Во встроенном Qdrant фильтры заранее сводятся к кандидатам; серверу Qdrant хватает payload-индексов
+@st.cache_resource(max_entries=1)
+def _filter_index(version):
+    if os.environ.get("QDRANT_URL"):
+        return None
+    return FilterIndex.load(FILTER_INDEX_DIR)
+
+
+def get_filter_index():
+    return _filter_index(FilterIndex.version(FILTER_INDEX_DIR))
+
+
+# Клиент Qdrant и модель общие для всего процесса и к этому моменту обычно уже прогреты в фоне;
+# тяжёлые импорты LangChain и qdrant_client происходят только при первом поиске
+@st.cache_resource(show_spinner="Загружаем модель и базу фильмов...")
+def get_vector_store():
+    from langchain_qdrant import QdrantVectorStore
+
+    if not os.environ.get("QDRANT_URL") and not os.path.exists(QDRANT_PATH):
+        from qdrant_client import QdrantClient
+
+        st.error(f"Файл `{QDRANT_PATH}` не найден. Загрузите его или проверьте путь.")
+        client = QdrantClient()
+    else:
+        client = STARTUP.get("qdrant")
+    return QdrantVectorStore(
+        client=client,
+        collection_name=COLLECTION_NAME,
+        embedding=STARTUP.get("embeddings")
+    )
+
+
+def get_search_engine():
+    """TF-IDF движок, общий для всех сессий процесса; STARTUP загружает его заново после sync или ingest"""
+    with st.spinner("Загружаем поисковый индекс..."):
+        return STARTUP.get("tfidf")
+
+
+# Гибридный режим: TF-IDF находит точные названия и имена, векторы — пересказ сюжета
+@st.cache_resource(show_spinner="Загружаем поисковый индекс...", max_entries=1)
+def _hybrid_searcher(_engine, version):
+    from .hybrid import make_hybrid_searcher
+    from .qdrant_store import StorageProfile
+
+    return make_hybrid_searcher(_engine, get_vector_store(), StorageProfile.from_env().search_params())
+
+
+def get_hybrid_searcher():
+    engine = get_search_engine()
+    return _hybrid_searcher(engine, engine.version)
+
+
+# Индекс похожих фильмов собирается офлайн: python -m recommender.neighbors
+@st.cache_resource
+def get_neighbor_index():
+    from .neighbors import NeighborIndex
+
+    return NeighborIndex(NEIGHBORS_DIR)
+
+
+def _joined(value):
+    """Списки из payload Qdrant и строки из каталога показываются одинаково"""
+    return ", ".join(value) if isinstance(value, (list, tuple)) else value
+
+
+def film_card(film, posters, description=None):
+    """Название со ссылкой, постер и сведения о фильме; film — метаданные из Qdrant или строка каталога"""
+    st.markdown(
+        f"<h3 style='text-decoration: underline; color: white; margin-bottom: 0.5em;'>"
+        f"<a href='{film.get('page_url', '')}' style='text-decoration: underline; color: #d4a5a5; font-size: 35px;'>"
+        f"{film.get('movie_title', '')}</a></h3>",
+        unsafe_allow_html=True)
+
+    cols = st.columns([2, 7])
+    with cols[0]:
+        image_url = film.get('image_url', '🎞️ Нет постера')
+        if is_poster_url(image_url):
+            poster = posters[image_url]
+            if poster:
+                st.image(poster, width=300)
+            else:
+                st.write('❌ Не удалось загрузить изображение')
+
+    with cols[1]:
+        for label, key in (("Год", "year"), ("Жанр", "genre"), ("Режиссер", "director"), ("Актеры", "actors"),
+                           ("Рейтинг IMDb", "rating")):
+            st.markdown(f"<p style='font-size:24px; color:#a6d0e4; line-height:1.0; margin:0.2'>"
+                        f"<b>{label}:</b> {_joined(film.get(key, '-'))}</p>", unsafe_allow_html=True)
+        if description is not None:
+            st.markdown(f"<div style='max-height: 200px; overflow-y: auto; font-size:22px; color:#ffecda; "
+                        f"line-height:1.2; margin:0.2'>{description}</div>", unsafe_allow_html=True)
+
+
+def debug_panel(debug, *traces):
+    """Отладочная панель (MOVIE_DEBUG=1 или ?debug=1): этапы этого запроса и сводка по процессу"""
+    traces = [trace for trace in traces if trace is not None]
+    if not debug or not traces:
+        return
+    with st.expander("🐞 Этапы запроса"):
+        st.dataframe([row for trace in traces for row in trace.rows()], use_container_width=True)
+        st.dataframe(TRACER.stats(), use_container_width=True)
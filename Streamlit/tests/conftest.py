@@ -0,0 +1,130 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from recommender.autocomplete import AutocompleteIndex
+from recommender.catalog import Catalog
+from recommender.config import COLLECTION_NAME
+from recommender.embeddings import CachedEmbeddings
+from recommender.filter_index import build_and_save
+from recommender.startup import Startup
+from recommender.storage import file_sha256
+from recommender.sync import SyncManifest, sync_qdrant, sync_tfidf
+from recommender.tfidf import MovieSearchEngine
+
+GENRES = ["Драма", "Комедия", "Триллер", "Фантастика", "Мелодрама", "Ужасы"]
+DIRECTORS = [f"Режиссёр {i}" for i in range(12)]
+ACTORS = [f"Актёр {i}" for i in range(30)]
+
+
+def make_films(n=300, seed=0):
+    """Небольшой каталог в формате films_data.csv: без пропусков и повторов page_url"""
+    rng = np.random.default_rng(seed)
+
+    def pick(pool, low, high):
+        return ", ".join(rng.choice(pool, size=rng.integers(low, high + 1), replace=False))
+
+    return pd.DataFrame({
+        "page_url": [f"https://example.com/film/{i}" for i in range(n)],
+        "image_url": [f"https://example.com/poster/{i}.jpg" for i in range(n)],
+        "movie_title": [f"Фильм {i}" for i in range(n)],
+        "year": rng.integers(1950, 2025, size=n),
+        "description": [f"Описание фильма {i}" for i in range(n)],
+        "director": [pick(DIRECTORS, 1, 2) for _ in range(n)],
+        "actors": [pick(ACTORS, 1, 4) for _ in range(n)],
+        "genre": [pick(GENRES, 1, 3) for _ in range(n)],
+        "rating": rng.integers(10, 100, size=n) / 10,
+    })
+
+
+@pytest.fixture
+def films():
+    return make_films()
+
+
+@pytest.fixture
+def catalog(films, tmp_path):
+    return Catalog.build(films, "test", tmp_path / "catalog")
+
+
+class HashEmbeddings(Embeddings):
+    """Векторы по хэшу текста вместо модели: одинаковый текст — одинаковый вектор"""
+
+    dim = 16
+
+    def _vector(self, text):
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).normal(size=self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+class Workspace:
+    """Данные приложения во временной папке: CSV, каталог, TF-IDF, индексы и встроенный Qdrant в памяти"""
+
+    def __init__(self, root):
+        from qdrant_client import QdrantClient
+
+        self.csv = root / "films_data.csv"
+        self.catalog_dir = root / "catalog"
+        self.tfidf_dir = root / "tfidf_cache"
+        self.autocomplete_dir = root / "autocomplete"
+        self.filter_index_dir = root / "filter_index"
+        self.neighbors_dir = root / "neighbors_cache"
+        self.manifest = root / "sync_manifest.json"
+        self.client = QdrantClient(":memory:")
+        self.embeddings = CachedEmbeddings(HashEmbeddings())
+
+    def sync(self, df):
+        """Те же шаги, что у python -m recommender.sync"""
+        df.to_csv(self.csv, index=False)
+        df = pd.read_csv(self.csv)
+        fingerprint = file_sha256(self.csv)
+        manifest = SyncManifest(self.manifest)
+        AutocompleteIndex.build(Catalog.build(df, fingerprint, self.catalog_dir), self.autocomplete_dir)
+        sync_tfidf(df, fingerprint, manifest, self.tfidf_dir, log=lambda message: None)
+        sync_qdrant(df, self.client, self.embeddings, manifest, COLLECTION_NAME, log=lambda message: None)
+        build_and_save(df, self.filter_index_dir)
+
+    def startup(self):
+        """Компоненты как в startup.STARTUP, но над данными этой папки"""
+        startup = Startup()
+        startup.register("embeddings", lambda: [], lambda: self.embeddings)
+        startup.register("qdrant", lambda: [], lambda: self.client)
+        startup.register(
+            "tfidf", lambda: [],
+            lambda: MovieSearchEngine.load_or_build(self.csv, self.tfidf_dir, self.catalog_dir),
+            lambda: MovieSearchEngine.version_of(self.csv, self.tfidf_dir, self.catalog_dir),
+        )
+        return startup
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    workspace = Workspace(tmp_path)
+    workspace.sync(make_films())
+    return workspace
+
+
+@pytest.fixture
+def service_env(workspace, monkeypatch):
+    """Модуль service, настроенный на workspace"""
+    from recommender import service
+
+    monkeypatch.setattr(service, "STARTUP", workspace.startup())
+    monkeypatch.setattr(service, "CSV_FILE", workspace.csv)
+    monkeypatch.setattr(service, "AUTOCOMPLETE_DIR", workspace.autocomplete_dir)
+    monkeypatch.setattr(service, "CATALOG_DIR", workspace.catalog_dir)
+    monkeypatch.setattr(service, "FILTER_INDEX_DIR", workspace.filter_index_dir)
+    monkeypatch.setattr(service, "NEIGHBORS_DIR", workspace.neighbors_dir)
+    monkeypatch.setattr(service, "warm_up", lambda: None)
+    monkeypatch.delenv("QDRANT_URL", raising=False)
+    return service
@@ -0,0 +1,69 @@
+import pytest
+
+from recommender.autocomplete import AutocompleteIndex, normalize
+from recommender.catalog import Catalog
+
+from conftest import make_films
+
+ACTORS = ["Том Хэнкс", "Том Харди", "Томас Манн", "Эмма Томпсон", "Хэнк Азария", "Ёлка Ёлкина"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    films = make_films(n=12)
+    # Число фильмов у актёров: Том Хэнкс 5, Том Харди 3, остальные по одному
+    films["actors"] = ACTORS[:1] * 5 + ACTORS[1:2] * 3 + ACTORS[2:]
+    films["genre"] = ["Драма, Комедия"] * 4 + ["драма"] * 8
+    catalog = Catalog.build(films, "test", tmp_path / "catalog")
+    return AutocompleteIndex.build(catalog, tmp_path / "autocomplete")
+
+
+def test_normalize():
+    assert normalize("  Ёлка   ЁЛКИНА ") == "елка елкина"
+
+
+def test_prefix_then_word_prefix(index):
+    # Сначала имена с префиксом по числу фильмов, затем имена со словом на этот префикс
+    assert index.suggest("actor", "том") == ["Том Хэнкс", "Том Харди", "Томас Манн", "Эмма Томпсон"]
+    assert index.suggest("actor", "хэнк") == ["Хэнк Азария", "Том Хэнкс"]
+    assert index.suggest("actor", "том", limit=2) == ["Том Хэнкс", "Том Харди"]
+    assert index.suggest("actor", "елка") == ["Ёлка Ёлкина"]
+
+
+def test_trigram_typo(index):
+    assert index.suggest("actor", "Том Хенкс")[0] == "Том Хэнкс"
+    assert index.suggest("actor", "Хэнкс Том")[0] == "Том Хэнкс"
+    assert index.suggest("actor", "абвгд") == []
+
+
+def test_empty_text_and_counts(index):
+    assert index.suggest("actor", "", limit=2) == ["Том Хэнкс", "Том Харди"]
+    assert index.top("actor", limit=None)[:2] == ["Том Хэнкс", "Том Харди"]
+    # Жанры в нижнем регистре, как в payload Qdrant; разный регистр в CSV складывается
+    assert index.counts("genre", ["драма", "комедия", "ужасы"]) == {"драма": 12, "комедия": 4}
+
+
+def test_open_checks_fingerprint(index, tmp_path):
+    assert AutocompleteIndex.open(tmp_path / "autocomplete", "test") is not None
+    assert AutocompleteIndex.open(tmp_path / "autocomplete", "другой каталог") is None
+    assert AutocompleteIndex.open(tmp_path / "missing") is None
+
+
+def test_load_or_build_without_csv(index, tmp_path):
+    # Страницы без films_data.csv открывают индекс, собранный при ingest или sync, как есть
+    shipped = AutocompleteIndex.load_or_build(tmp_path / "missing.csv", tmp_path / "autocomplete")
+    assert shipped.suggest("actor", "том", limit=1) == ["Том Хэнкс"]
+    assert AutocompleteIndex.load_or_build(tmp_path / "missing.csv", tmp_path / "missing") is None
+
+
+def test_load_or_build_rebuilds_for_new_csv(tmp_path):
+    csv_path = tmp_path / "films_data.csv"
+    make_films(n=20).to_csv(csv_path, index=False)
+    first = AutocompleteIndex.load_or_build(csv_path, tmp_path / "autocomplete", tmp_path / "catalog")
+
+    films = make_films(n=20)
+    films.loc[0, "actors"] = "Новый Актёр"
+    films.to_csv(csv_path, index=False)
+    second = AutocompleteIndex.load_or_build(csv_path, tmp_path / "autocomplete", tmp_path / "catalog")
+    assert first.suggest("actor", "новый") == []
+    assert second.suggest("actor", "новый") == ["Новый Актёр"]
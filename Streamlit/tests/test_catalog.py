@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from recommender.catalog import Catalog
+from recommender.ingest import prepare_rows, row_metadata
+
+
+def test_round_trip(films, catalog):
+    assert len(catalog) == len(films)
+    frame = catalog.frame()
+    pd.testing.assert_frame_equal(frame.reset_index(drop=True), films, check_dtype=False)
+
+    rows = [5, 0, 42]
+    assert catalog.texts("movie_title", rows) == films["movie_title"].iloc[rows].tolist()
+    assert catalog.frame(rows).index.tolist() == rows
+    assert catalog.values("director", 7) == [name.strip() for name in films["director"][7].split(",")]
+
+
+def test_metadata_matches_qdrant_payload(films, catalog):
+    prepared = prepare_rows(films)
+    for row in (0, 1, 99):
+        assert catalog.metadata(row) == row_metadata(prepared.loc[row])
+
+
+def test_open_checks_fingerprint(catalog, tmp_path):
+    assert Catalog.open(tmp_path / "catalog", "test") is not None
+    assert Catalog.open(tmp_path / "catalog", "другой CSV") is None
+    assert Catalog.open(tmp_path / "missing") is None
+
+
+def test_bounds_skip_rows_missing_from_qdrant(films, tmp_path):
+    films.loc[0, ["year", "rating"]] = [1900, 9.9]
+    films.loc[0, "description"] = None  # без описания ingest фильм не загружает
+    films.loc[1, "year"] = None         # пропуск года не должен давать 0 в границах слайдера
+    catalog = Catalog.build(films, "test", tmp_path / "catalog")
+
+    indexed = films.dropna()
+    assert catalog.bounds("year") == (int(indexed["year"].min()), int(indexed["year"].max()))
+    assert catalog.bounds("rating") == (indexed["rating"].min(), indexed["rating"].max())
+    assert not catalog.all_indexed
+    assert catalog.indexed_rows([0, 1, 2]).tolist() == [2]
+
+
+def test_bounds_of_empty_catalog(films, tmp_path):
+    catalog = Catalog.build(films.iloc[:0], "test", tmp_path / "catalog")
+    assert catalog.bounds("year") == (0, 0)
+    assert catalog.bounds("rating") == (0.0, 10.0)
+
+
+def test_duplicate_urls_keep_last_row(films, tmp_path):
+    films = pd.concat([films.iloc[:3], films.iloc[[1]].assign(movie_title="Новая версия")], ignore_index=True)
+    catalog = Catalog.build(films, "test", tmp_path / "catalog")
+    assert catalog.indexed_rows().tolist() == [0, 2, 3]
+    assert np.array_equal(catalog.filter_rows(years=(0, 3000)), np.arange(4))
@@ -0,0 +1,46 @@
+from recommender.embeddings import CachedEmbeddings
+
+
+class FakeEmbeddings:
+    """Вектор — длина текста; запоминает, что дошло до модели"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_cached_embeddings_lru():
+    base = FakeEmbeddings()
+    cache = CachedEmbeddings(base, max_size=2)
+    cache.embed_query("один")
+    cache.embed_query("два")
+    cache.embed_query("ОДИН")  # тот же ключ, «один» становится свежее «два»
+    cache.embed_query("три")   # вытесняет «два»
+    cache.embed_query("один")
+    cache.embed_query("два")
+    assert base.calls == ["один", "два", "три", "два"]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_cached_embeddings_batch_encodes_original_text_once():
+    base = FakeEmbeddings()
+    cache = CachedEmbeddings(base, max_size=10)
+    cache.embed_query("Космос")
+    vectors = cache.embed_queries(["космос", "Драма", " драма ", "Комедия"])
+    assert base.calls == ["Космос", "Драма", "Комедия"]
+    assert vectors[1] == vectors[2]
+
+
+def test_cached_embeddings_disk_copy(tmp_path):
+    path = tmp_path / "queries.sqlite"
+    CachedEmbeddings(FakeEmbeddings(), persist_path=path).embed_query("космос")
+    base = FakeEmbeddings()
+    assert CachedEmbeddings(base, persist_path=path).embed_query("Космос") == [6.0, 1.0]
+    assert base.calls == []
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from recommender.filter_index import FilterIndex
+from recommender.ingest import _split
+
+CASES = [
+    dict(genres=["драма"]),
+    dict(genres=["драма", "ужасы"], years=(1980, 2000)),
+    dict(directors=["Режиссёр 3"]),
+    dict(directors=["Режиссёр 3"], actors=["Актёр 7", "Актёр 11"], ratings=(5.0, 8.0)),
+    dict(genres=["комедия"], actors=["Актёр 0"], years=(1990, 1990)),
+    dict(years=(1960, 1975)),
+    dict(ratings=(7.5, 10.0)),
+    dict(years=(2000, 2030), ratings=(0.0, 4.0)),
+    dict(genres=["нет такого жанра"]),
+    dict(directors=["Нет такого"], years=(1950, 2030)),
+]
+
+
+def brute_force(films, genres=(), directors=(), actors=(), years=None, ratings=None):
+    """Фильтр страниц построчно: жанры, режиссёры и актёры через «или», диапазоны обязательны"""
+    keep = np.ones(len(films), dtype=bool)
+    if genres or directors or actors:
+        keep = np.array([
+            bool(set(_split(row.genre, lower=True)) & set(genres)
+                 or set(_split(row.director)) & set(directors)
+                 or set(_split(row.actors)) & set(actors))
+            for row in films.itertuples()
+        ])
+    if years is not None:
+        keep &= films["year"].between(*years).to_numpy()
+    if ratings is not None:
+        keep &= films["rating"].between(*ratings).to_numpy()
+    return np.flatnonzero(keep)
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_resolve_matches_brute_force(films, case):
+    rows = FilterIndex.build(films).resolve(**case)
+    assert rows is not None
+    assert rows.tolist() == brute_force(films, **case).tolist()
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_resolve_matches_catalog_filter(films, catalog, case):
+    assert FilterIndex.build(films).resolve(**case).tolist() == catalog.filter_rows(**case).tolist()
+
+
+def test_resolve_without_restrictions(films):
+    index = FilterIndex.build(films)
+    assert index.resolve() is None
+    # Диапазоны во весь каталог тоже ничего не ограничивают
+    assert index.resolve(years=(1900, 2100), ratings=(0.0, 10.0)) is None
+
+
+def test_save_and_load(films, tmp_path):
+    index = FilterIndex.build(films)
+    index.save(tmp_path)
+    loaded = FilterIndex.load(tmp_path)
+    assert loaded.point_ids.tolist() == index.point_ids.tolist()
+    case = dict(genres=["триллер"], ratings=(6.0, 9.0))
+    assert loaded.resolve(**case).tolist() == index.resolve(**case).tolist()
+    assert FilterIndex.load(tmp_path / "missing") is None
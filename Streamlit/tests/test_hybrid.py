@@ -0,0 +1,61 @@
+import pytest
+
+from recommender.hybrid import reciprocal_rank_fusion, weighted_score_fusion
+
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["d"] == pytest.approx(1 / 62)
+    assert max(fused, key=fused.get) == "b"
+
+
+def test_rrf_weights():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "a"]], weights=[3.0, 1.0], k=1)
+    assert fused["a"] == pytest.approx(3 / 2 + 1 / 3)
+    assert fused["b"] == pytest.approx(3 / 3 + 1 / 2)
+    assert fused["a"] > fused["b"]
+
+
+def test_weighted_fusion_min_max_normalizes_each_list():
+    # Шкалы сходств разные: косинус плотных векторов и TF-IDF
+    fused = weighted_score_fusion([
+        [("a", 0.9), ("b", 0.8), ("c", 0.7)],
+        [("c", 30.0), ("d", 10.0)],
+    ])
+    assert fused["a"] == pytest.approx(1.0)
+    assert fused["b"] == pytest.approx(0.5)
+    assert fused["c"] == pytest.approx(0.0 + 1.0)
+    assert fused["d"] == pytest.approx(0.0)
+
+
+def test_weighted_fusion_weights_and_edge_cases():
+    fused = weighted_score_fusion([[("a", 0.5)], [], [("b", 2.0), ("a", 2.0)]], weights=[2.0, 1.0, 0.5])
+    # Список из одинаковых сходств даёт всем 1, пустой список пропускается
+    assert fused == {"a": pytest.approx(2.5), "b": pytest.approx(0.5)}
+
+
+@pytest.mark.parametrize("fusion", ["rrf", "weighted"])
+def test_hybrid_searcher_fuses_both_engines(workspace, fusion):
+    from langchain_qdrant import QdrantVectorStore
+
+    from recommender.config import COLLECTION_NAME
+    from recommender.hybrid import HybridSearcher
+    from recommender.tfidf import MovieSearchEngine
+
+    engine = MovieSearchEngine.load_or_build(workspace.csv, workspace.tfidf_dir, workspace.catalog_dir)
+    vector_store = QdrantVectorStore(client=workspace.client, collection_name=COLLECTION_NAME,
+                                     embedding=workspace.embeddings)
+    searcher = HybridSearcher(engine, vector_store, fusion=fusion)
+
+    # Точное описание находят оба движка, поэтому фильм первый при любом способе слияния
+    documents = searcher.search("Описание фильма 120", k=5)
+    urls = [document.metadata["page_url"] for document in documents]
+    assert urls[0] == "https://example.com/film/120"
+    assert len(set(urls)) == 5
+    # Найденное только TF-IDF достраивается из каталога с теми же полями, что payload Qdrant
+    rows = engine.catalog.texts("page_url")
+    for document in documents:
+        metadata = engine.catalog.metadata(rows.index(document.metadata["page_url"]))
+        assert {key: document.metadata[key] for key in metadata} == metadata
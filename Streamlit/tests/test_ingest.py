@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+from qdrant_client import QdrantClient
+
+from conftest import HashEmbeddings, make_films
+from recommender.ingest import Checkpoint, count_points, ingest
+from recommender.storage import file_sha256, read_json
+
+
+class CrashingEmbeddings(HashEmbeddings):
+    """Падает на заданном по счёту батче — как ingest, прерванный посреди CSV"""
+
+    def __init__(self, crash_on=None):
+        self.crash_on = crash_on
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        if len(self.batches) == self.crash_on:
+            raise RuntimeError("сбой посреди загрузки")
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "films_data.csv"
+    make_films(250).to_csv(path, index=False)
+    return path
+
+
+def run(client, embeddings, csv_path, tmp_path, collection="films", target="memory"):
+    return ingest(client, embeddings, csv_path, collection, tmp_path / "checkpoint.json",
+                  chunk_size=100, log=lambda message: None, target=target)
+
+
+def test_resume_skips_loaded_rows(csv_path, tmp_path):
+    client = QdrantClient(":memory:")
+    with pytest.raises(RuntimeError):
+        run(client, CrashingEmbeddings(crash_on=2), csv_path, tmp_path)
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json", file_sha256(csv_path), "films", "memory")
+    assert (checkpoint.rows_done, checkpoint.points) == (100, 100)
+
+    embeddings = CrashingEmbeddings()
+    assert run(client, embeddings, csv_path, tmp_path) == 250
+    assert embeddings.batches == [100, 50]
+    assert count_points(client, "films") == 250
+
+
+def test_checkpoint_of_other_collection_or_target_is_ignored(csv_path, tmp_path):
+    client = QdrantClient(":memory:")
+    run(client, CrashingEmbeddings(), csv_path, tmp_path)
+
+    for collection, target in (("other", "memory"), ("films", "http://qdrant:6333")):
+        embeddings = CrashingEmbeddings()
+        run(client, embeddings, csv_path, tmp_path, collection, target)
+        assert sum(embeddings.batches) == 250
+
+
+def test_restarts_when_collection_lost_points(csv_path, tmp_path):
+    client = QdrantClient(":memory:")
+    with pytest.raises(RuntimeError):
+        run(client, CrashingEmbeddings(crash_on=3), csv_path, tmp_path)
+    client.delete_collection("films")
+
+    embeddings = CrashingEmbeddings()
+    assert run(client, embeddings, csv_path, tmp_path) == 250
+    assert sum(embeddings.batches) == 250
+
+
+def test_points_count_duplicate_urls_once(tmp_path):
+    films = make_films(150)
+    path = tmp_path / "films_data.csv"
+    pd.concat([films, films.iloc[:30]], ignore_index=True).to_csv(path, index=False)
+    client = QdrantClient(":memory:")
+
+    assert run(client, CrashingEmbeddings(), path, tmp_path) == 150
+    assert read_json(tmp_path / "checkpoint.json")["points"] == 150
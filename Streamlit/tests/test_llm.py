@@ -0,0 +1,111 @@
+import threading
+
+from recommender.llm import (
+    MOCK_RESPONSES, make_batch_chain, make_film_chain, make_mock_llm, parse_sections, stream_batched_commentaries,
+    stream_commentaries,
+)
+
+FILMS = [{"movie_title": f"Фильм {i}", "page_url": f"https://example.com/{i}"} for i in range(6)]
+
+
+class CountingChain:
+    """Обёртка над цепочкой: считает, сколько потоков стримят одновременно"""
+
+    def __init__(self, chain, fail_titles=()):
+        self.chain = chain
+        self.fail_titles = set(fail_titles)
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def stream(self, inputs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if inputs["metadata"]["movie_title"] in self.fail_titles:
+                raise RuntimeError("сбой LLM")
+            yield from self.chain.stream(inputs)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def collect(events):
+    chunks, finals = {}, {}
+    for index, chunk, error in events:
+        assert index not in finals, "кусок после завершения фильма"
+        if chunk is None:
+            finals[index] = error
+        else:
+            chunks[index] = chunks.get(index, "") + chunk
+    return chunks, finals
+
+
+def test_stream_commentaries_respects_max_workers():
+    chain = CountingChain(make_film_chain(make_mock_llm(delay=0.002)))
+    chunks, finals = collect(stream_commentaries(chain, "запрос", FILMS, max_workers=2))
+    assert chain.max_active <= 2
+    assert sorted(finals) == list(range(len(FILMS)))
+
+
+def test_stream_commentaries_chunks_then_single_final_event():
+    chunks, finals = collect(stream_commentaries(make_film_chain(make_mock_llm(delay=0)), "запрос", FILMS))
+    assert all(error is None for error in finals.values())
+    assert sorted(chunks) == list(range(len(FILMS)))
+    assert all(text in MOCK_RESPONSES for text in chunks.values())
+
+
+def test_stream_commentaries_reports_errors_per_film():
+    chain = CountingChain(make_film_chain(make_mock_llm(delay=0)), fail_titles={"Фильм 2"})
+    chunks, finals = collect(stream_commentaries(chain, "запрос", FILMS))
+    assert isinstance(finals[2], RuntimeError)
+    assert 2 not in chunks
+    assert all(finals[i] is None for i in range(len(FILMS)) if i != 2)
+
+
+def test_stream_commentaries_empty():
+    assert list(stream_commentaries(make_film_chain(make_mock_llm()), "запрос", [])) == []
+
+
+def test_parse_sections_out_of_order_missing_and_extra():
+    text = "вступление\n### Фильм 3\nтретий\n### Фильм 1: название\nпервый\n### Фильм 7\nлишний\n"
+    assert parse_sections(text, 3) == ["первый", "", "третий"]
+
+
+def test_parse_sections_ignores_reasoning():
+    text = "<think>### Фильм 1\nчерновик</think>\n### Фильм 1\nответ"
+    assert parse_sections(text, 1) == ["ответ"]
+    assert parse_sections("<think>### Фильм 1\nещё думает", 1) == [""]
+
+
+def batch_films(n):
+    return [(FILMS[i], f"описание {i}") for i in range(n)]
+
+
+def test_stream_batched_commentaries_splits_sections():
+    response = "### Фильм 2\nвторой\n### Фильм 1\nпервый\n"
+    chain = make_batch_chain(make_mock_llm([response], delay=0))
+    chunks, finals = collect(stream_batched_commentaries(chain, "запрос", batch_films(2)))
+    assert chunks == {0: "первый", 1: "второй"}
+    assert finals == {0: None, 1: None}
+
+
+def test_stream_batched_commentaries_missing_section_is_error():
+    chain = make_batch_chain(make_mock_llm(["### Фильм 1\nпервый\n"], delay=0))
+    chunks, finals = collect(stream_batched_commentaries(chain, "запрос", batch_films(2)))
+    assert chunks == {0: "первый"}
+    assert finals[0] is None
+    assert isinstance(finals[1], ValueError)
+
+
+def test_stream_batched_commentaries_llm_failure():
+    class Failing:
+        def stream(self, inputs):
+            raise RuntimeError("сеть")
+            yield  # pragma: no cover
+
+    chunks, finals = collect(stream_batched_commentaries(Failing(), "запрос", batch_films(3)))
+    assert chunks == {}
+    assert all(isinstance(error, RuntimeError) for error in finals.values())
+    assert sorted(finals) == [0, 1, 2]
@@ -0,0 +1,51 @@
+import pytest
+
+from recommender import llm_cache
+from recommender.llm_cache import CommentaryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock.time)
+    return clock
+
+
+def test_commentary_cache_ttl(tmp_path, clock):
+    cache = CommentaryCache(tmp_path / "llm.sqlite", ttl_seconds=100)
+    cache.put("v1", "model", "Фильм про космос", "film-1", "ответ")
+    assert cache.get("v1", "model", "  фильм  про КОСМОС", "film-1") == "ответ"
+    assert cache.get("v2", "model", "фильм про космос", "film-1") is None
+    clock.now += 101
+    assert cache.get("v1", "model", "фильм про космос", "film-1") is None
+
+
+def test_commentary_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = CommentaryCache(tmp_path / "llm.sqlite", max_entries=2)
+    cache.put("v1", "model", "запрос", "a", "A")
+    clock.now += 1
+    cache.put("v1", "model", "запрос", "b", "B")
+    clock.now += 1
+    # Обращение к «a» делает её свежее «b», и при переполнении вытесняется «b»
+    assert cache.get("v1", "model", "запрос", "a") == "A"
+    clock.now += 1
+    cache.put("v1", "model", "запрос", "c", "C")
+    assert cache.get("v1", "model", "запрос", "a") == "A"
+    assert cache.get("v1", "model", "запрос", "b") is None
+    assert cache.get("v1", "model", "запрос", "c") == "C"
+
+
+def test_commentary_cache_similar_query(tmp_path, clock):
+    cache = CommentaryCache(tmp_path / "llm.sqlite", similarity_threshold=0.95)
+    cache.put("v1", "model", "грустный фильм", "a", "A", query_vector=[1.0, 0.0])
+    assert cache.get("v1", "model", "печальный фильм", "a", query_vector=[0.99, 0.14]) == "A"
+    assert cache.get("v1", "model", "весёлый фильм", "a", query_vector=[0.0, 1.0]) is None
+    assert cache.get("v1", "model", "печальный фильм", "b", query_vector=[1.0, 0.0]) is None
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from recommender import neighbors
+from recommender.config import COLLECTION_NAME
+from recommender.neighbors import NO_NEIGHBOR, NeighborIndex, build_dense_neighbors, build_tfidf_neighbors
+from recommender.tfidf import MovieSearchEngine
+
+
+@pytest.fixture
+def engine(workspace):
+    return MovieSearchEngine.load_or_build(workspace.csv, workspace.tfidf_dir, workspace.catalog_dir)
+
+
+def check_neighbors(ids, scores, n_rows):
+    assert ids.shape == scores.shape == (n_rows, 5)
+    rows = np.arange(n_rows)[:, None]
+    assert not (ids == rows).any()
+    assert ((ids == NO_NEIGHBOR) | ((ids >= 0) & (ids < n_rows))).all()
+    found = ids != NO_NEIGHBOR
+    assert found[:, 0].all()
+    assert (np.diff(np.where(found, scores, -np.inf).astype(np.float32), axis=1)[found[:, 1:]] <= 0).all()
+
+
+def test_tfidf_neighbors(engine):
+    ids, scores = build_tfidf_neighbors(engine, n_neighbors=5, chunk_size=64)
+    check_neighbors(ids, scores, len(engine.catalog))
+
+
+def test_dense_neighbors_follow_catalog_rows(engine, workspace):
+    urls = engine.catalog.texts("page_url")
+    ids, scores = build_dense_neighbors(urls, workspace.client, n_neighbors=5, chunk_size=64,
+                                        collection_name=COLLECTION_NAME)
+    check_neighbors(ids, scores, len(urls))
+
+    # Порядок строк каталога не обязан совпадать с порядком точек в Qdrant
+    shuffled = list(reversed(urls))
+    reversed_ids, _ = build_dense_neighbors(shuffled, workspace.client, n_neighbors=5,
+                                            collection_name=COLLECTION_NAME)
+    assert [shuffled[row] for row in reversed_ids[0]] == [urls[row] for row in ids[len(urls) - 1]]
+
+
+def test_save_and_similar(tmp_path):
+    ids = np.array([[1, 2], [0, NO_NEIGHBOR], [0, 1]])
+    scores = np.array([[0.9, 0.5], [0.9, 0.0], [0.5, 0.4]])
+    index = NeighborIndex(tmp_path)
+    assert index.available() == []
+    index.save("tfidf", ids, scores, "sha")
+
+    rows, similarities = index.similar(1, k=2)
+    assert rows.tolist() == [0] and similarities.dtype == np.float32
+    assert index.similar(0, k=1)[0].tolist() == [1]
+    assert index.available("sha") == ["tfidf"]
+    assert index.available("other") == []
+
+
+def test_manifest_is_read_once_and_again_after_rebuild(tmp_path, monkeypatch):
+    ids, scores = np.array([[1], [0]]), np.array([[0.9], [0.9]])
+    NeighborIndex(tmp_path).save("tfidf", ids, scores, "sha")
+    index = NeighborIndex(tmp_path)
+
+    reads = []
+    read_json = neighbors.read_json
+    monkeypatch.setattr(neighbors, "read_json", lambda path: reads.append(path) or read_json(path))
+    for row in (0, 1, 0):
+        index.similar(row, k=1)
+    assert len(reads) == 1
+
+    # Пересборка другим процессом: новый манифест и новые массивы
+    NeighborIndex(tmp_path).save("tfidf", np.array([[NO_NEIGHBOR], [NO_NEIGHBOR]]), scores, "sha")
+    assert index.similar(0, k=1)[0].tolist() == []
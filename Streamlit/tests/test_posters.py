@@ -0,0 +1,34 @@
+import os
+import time
+
+from recommender.posters import PosterCache
+
+
+def test_poster_cache_evicts_oldest(tmp_path):
+    cache = PosterCache(tmp_path, max_bytes=1000, max_workers=1)
+    now = time.time()
+    for age, name in enumerate(["new", "mid", "old", "oldest"]):
+        path = tmp_path / f"{name}.jpg"
+        path.write_bytes(b"x" * 400)
+        os.utime(path, (now - age * 60, now - age * 60))
+    cache._evict(keep=str(tmp_path / "oldest.jpg"))
+    # До 90% лимита удаляются самые давно показанные миниатюры, кроме только что скачанной
+    assert sorted(os.listdir(tmp_path)) == ["new.jpg", "oldest.jpg"]
+    assert cache._total_bytes == 800
+
+
+def test_poster_cache_miss_ttl(tmp_path):
+    cache = PosterCache(tmp_path, max_workers=1, negative_ttl=3600, retry_ttl=60)
+    url = "https://example.com/poster.jpg"
+    _, miss_path = cache._paths(url)
+    assert cache._cached(url) == (False, None)
+
+    cache._remember_miss(miss_path, cache.retry_ttl)
+    assert cache._cached(url) == (True, None)
+    old = time.time() - 120
+    os.utime(miss_path, (old, old))
+    # Сетевой сбой повторяется через минуту, а 404 помнится сутки
+    assert cache._cached(url) == (False, None)
+    cache._remember_miss(miss_path, cache.negative_ttl)
+    os.utime(miss_path, (old, old))
+    assert cache._cached(url) == (True, None)
@@ -0,0 +1,54 @@
+import asyncio
+
+import pandas as pd
+
+from conftest import make_films
+
+
+def edit_films(df):
+    """Один фильм удалён, один добавлен — как после обновления films_data.csv"""
+    new = df.iloc[[0]].assign(page_url="https://example.com/film/new", movie_title="Новый фильм",
+                              description="Звездолёт уходит к далёкой планете")
+    return pd.concat([df.iloc[1:], new], ignore_index=True)
+
+
+def test_startup_reloads_engine_after_sync(workspace):
+    startup = workspace.startup()
+    engine = startup.get("tfidf")
+    assert startup.get("tfidf") is engine
+    assert "https://example.com/film/0" in engine.catalog.texts("page_url")
+
+    workspace.sync(edit_films(make_films()))
+
+    reloaded = startup.get("tfidf")
+    assert reloaded is not engine
+    assert reloaded.version == startup.version("tfidf")
+    urls = reloaded.catalog.texts("page_url")
+    assert "https://example.com/film/0" not in urls
+    rows, _ = reloaded.search_rows("звездолёт", 1, 0.0)
+    assert urls[rows[0]] == "https://example.com/film/new"
+
+
+def test_service_serves_new_data_after_sync(workspace, service_env):
+    service = service_env.SearchService()
+    filters = {"genres": [], "directors": [], "actors": [], "years": None, "ratings": None}
+
+    async def scenario():
+        before = await service.resources()
+        workspace.sync(edit_films(make_films()))
+        after = await service.resources()
+        films = await service.search("звездолёт", 1, "tfidf", filters)
+        page = await service.browse(filters, "title", 0, 1000)
+        return before, after, films, page
+
+    try:
+        before, after, films, page = asyncio.run(scenario())
+    finally:
+        service.executor.shutdown()
+
+    assert after is not before
+    assert "https://example.com/film/new" in after["row_by_url"]
+    assert "https://example.com/film/0" not in after["row_by_url"]
+    assert len(after["sampler"].catalog) == len(after["engine"].catalog)
+    assert films[0]["page_url"] == "https://example.com/film/new"
+    assert "https://example.com/film/0" not in {film["page_url"] for film in page["films"]}
@@ -0,0 +1,74 @@
+import numpy as np
+
+from recommender.sampler import RandomSampler, SeenSet, parse_seed
+
+
+def eligible_rows(films, genres=(), years=None, ratings=None):
+    keep = np.ones(len(films), dtype=bool)
+    if genres:
+        selected = {genre.lower() for genre in genres}
+        keep = np.array([bool(selected & {g.strip().lower() for g in value.split(",")}) for value in films["genre"]])
+    if years is not None:
+        keep &= films["year"].between(*years).to_numpy()
+    if ratings is not None:
+        keep &= films["rating"].between(*ratings).to_numpy()
+    return set(np.flatnonzero(keep).tolist())
+
+
+def test_seen_set():
+    seen = SeenSet(20)
+    assert len(seen) == 0
+    seen.add([0, 7, 8, 19, 7])
+    assert len(seen) == 4
+    assert seen.contains([0, 1, 7, 8, 9, 19]).tolist() == [True, False, True, True, False, True]
+    seen.clear()
+    assert len(seen) == 0 and not seen.contains([0, 19]).any()
+
+
+def test_genre_counts(films, catalog):
+    sampler = RandomSampler(catalog)
+    counts = sampler.genre_counts()
+    assert sampler.genres == sorted(counts)
+    for genre, count in counts.items():
+        assert count == len(eligible_rows(films, genres=[genre]))
+
+
+def test_sample_respects_filters(films, catalog):
+    sampler = RandomSampler(catalog)
+    rng = np.random.default_rng(0)
+    for filters in (dict(), dict(genres=["Драма", "ужасы"]), dict(years=(1970, 1990), ratings=(5.0, 10.0)),
+                    dict(genres=["комедия"], years=(2000, 2024))):
+        allowed = eligible_rows(films, **filters)
+        rows = sampler.sample(10, rng=rng, **filters)
+        assert len(rows) == min(10, len(allowed))
+        assert len(set(rows.tolist())) == len(rows)
+        assert set(rows.tolist()) <= allowed
+
+
+def test_sample_until_exhausted_covers_filter(films, catalog):
+    # Показанные фильмы не повторяются, и в итоге выдаются ровно все подходящие
+    sampler = RandomSampler(catalog)
+    rng = np.random.default_rng(1)
+    filters = dict(genres=["Триллер", "Фантастика"], ratings=(4.0, 9.0))
+    seen, shown = SeenSet(len(catalog)), []
+    while True:
+        rows = sampler.sample(8, seen=seen, rng=rng, **filters)
+        if not len(rows):
+            break
+        assert not seen.contains(rows).any()
+        seen.add(rows)
+        shown.extend(rows.tolist())
+    assert len(shown) == len(set(shown))
+    assert set(shown) == eligible_rows(films, **filters)
+
+
+def test_sample_unknown_genre(catalog):
+    assert RandomSampler(catalog).sample(5, genres=["нет такого жанра"]).size == 0
+
+
+def test_parse_seed():
+    assert parse_seed("42") == 42
+    assert parse_seed(None) is None
+    assert parse_seed("abc") is None
+    assert parse_seed("1.5") is None
+    assert parse_seed("-3") is None
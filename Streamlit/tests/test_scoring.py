@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from recommender.ranking import top_k
+from recommender.scoring import SparseTopKScorer
+
+
+def brute_force(matrix, query, k, min_score=0.0):
+    """Косинус запроса со всеми документами плотным произведением"""
+    docs = matrix.toarray()
+    docs /= np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    query = query.toarray().ravel()
+    query /= max(np.linalg.norm(query), 1e-12)
+    scores = docs @ query
+    best = top_k(scores, k, min_score)
+    return best, scores[best]
+
+
+@pytest.fixture
+def matrix():
+    return sparse.random(500, 200, density=0.03, format="csr", random_state=1, dtype=np.float64)
+
+
+@pytest.fixture
+def queries():
+    return sparse.random(40, 200, density=0.05, format="csr", random_state=2, dtype=np.float64)
+
+
+def test_top_k_order_and_threshold():
+    scores = np.array([0.1, 0.0, 0.9, 0.5, 0.9, -1.0, 0.3])
+    assert top_k(scores, 3).tolist() == [2, 4, 3]
+    assert top_k(scores, 10, min_score=0.2).tolist() == [2, 4, 3, 6]
+    assert top_k(np.zeros(5), 3).size == 0
+
+
+@pytest.mark.parametrize("min_score", [0.0, 0.2])
+def test_search_matches_brute_force(matrix, queries, min_score):
+    scorer = SparseTopKScorer(matrix)
+    for row in range(queries.shape[0]):
+        docs, scores = scorer.search(queries[row], k=10, min_score=min_score)
+        expected_docs, expected_scores = brute_force(matrix, queries[row], 10, min_score)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-6)
+        # При равных сходствах порядок может отличаться — сравниваем множества
+        assert set(docs.tolist()) == set(expected_docs.tolist())
+
+
+def test_query_without_known_terms(matrix):
+    scorer = SparseTopKScorer(matrix)
+    docs, scores = scorer.search(sparse.csr_matrix((1, matrix.shape[1])), k=5)
+    assert docs.size == 0 and scores.size == 0
+
+
+def test_search_many_matches_search(matrix, queries):
+    scorer = SparseTopKScorer(matrix)
+    results = scorer.search_many(queries, k=7, chunk_size=16)
+    assert len(results) == queries.shape[0]
+    for row, (docs, scores) in enumerate(results):
+        expected_docs, expected_scores = scorer.search(queries[row], k=7)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-6)
+        assert set(docs.tolist()) == set(expected_docs.tolist())
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from recommender.service import BadRequest, QueryBatcher, _number
+
+
+class FakeEmbeddings:
+    """Вектор запроса — его длина; запоминает размеры батчей"""
+
+    def __init__(self, fail=False, release=None):
+        self.fail = fail
+        self.release = release
+        self.batch_sizes = []
+
+    def embed_queries(self, texts):
+        if self.release is not None:
+            self.release.wait(5)
+        self.batch_sizes.append(len(texts))
+        if self.fail:
+            raise RuntimeError("модель недоступна")
+        return [[float(len(text))] for text in texts]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_batcher_groups_concurrent_queries():
+    embeddings = FakeEmbeddings()
+
+    async def main():
+        with ThreadPoolExecutor(1) as executor:
+            batcher = QueryBatcher(embeddings, executor, max_batch=32, max_wait=0.05)
+            texts = ["x" * i for i in range(40)]
+            vectors = await asyncio.gather(*(batcher.embed(text) for text in texts))
+            return batcher, vectors
+
+    batcher, vectors = run(main())
+    # Каждый клиент получает свой вектор, а модель вызывается двумя батчами: полный и остаток по таймеру
+    assert vectors == [[float(i)] for i in range(40)]
+    assert embeddings.batch_sizes == [32, 8]
+    assert (batcher.batches, batcher.queries) == (2, 40)
+
+
+def test_batcher_flushes_single_query_after_max_wait():
+    embeddings = FakeEmbeddings()
+
+    async def main():
+        with ThreadPoolExecutor(1) as executor:
+            return await QueryBatcher(embeddings, executor, max_batch=32, max_wait=0.01).embed("один")
+
+    assert run(main()) == [4.0]
+    assert embeddings.batch_sizes == [1]
+
+
+def test_batcher_propagates_errors():
+    async def main():
+        with ThreadPoolExecutor(1) as executor:
+            batcher = QueryBatcher(FakeEmbeddings(fail=True), executor, max_batch=2, max_wait=0.01)
+            return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    results = run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_batcher_skips_cancelled_clients():
+    release = threading.Event()
+    embeddings = FakeEmbeddings(release=release)
+
+    async def main():
+        with ThreadPoolExecutor(1) as executor:
+            batcher = QueryBatcher(embeddings, executor, max_batch=2, max_wait=0.01)
+            gone = asyncio.ensure_future(batcher.embed("ушёл"))
+            stayed = asyncio.ensure_future(batcher.embed("остался"))
+            await asyncio.sleep(0)
+            # Клиент отключился, пока батч кодируется: его future отменена, остальные получают результат
+            gone.cancel()
+            release.set()
+            return await stayed, gone.cancelled()
+
+    assert run(main()) == ([7.0], True)
+
+
+def test_number():
+    assert _number("k", "5", int) == 5
+    assert _number("min_score", "0.25", float) == 0.25
+    with pytest.raises(BadRequest, match="k"):
+        _number("k", "пять", int)
+    with pytest.raises(BadRequest):
+        _number("k", None, int)
+
+
+def call_api(service_module, scenario):
+    """Запускает приложение make_app в тестовом сервере aiohttp и выполняет scenario(client)"""
+    async def main():
+        async with TestClient(TestServer(service_module.make_app())) as client:
+            return await scenario(client)
+    return run(main())
+
+
+async def get_json(client, path, **params):
+    response = await client.get(path, params=params)
+    return response.status, await response.json()
+
+
+def test_search_modes_and_filters(service_env):
+    async def scenario(client):
+        return [await get_json(client, "/search", q="Описание фильма 120", k="3", mode=mode)
+                for mode in ("dense", "tfidf", "hybrid")] + [
+            await get_json(client, "/search", q="фильм про любовь", k="10", genres="драма", year_min="1990")]
+
+    *modes, (status, filtered) = call_api(service_env, scenario)
+    for status, body in modes:
+        assert status == 200
+        assert body["films"][0]["page_url"] == "https://example.com/film/120"
+        assert not any(key.startswith("_") for key in body["films"][0])
+    assert status == 200 and filtered["films"]
+    assert all("драма" in film["genre"] and film["year"] >= 1990 for film in filtered["films"])
+
+
+def test_similar_browse_random_suggest(service_env):
+    async def scenario(client):
+        return {
+            "similar": await get_json(client, "/similar", page_url="https://example.com/film/5", k="4"),
+            "missing": await get_json(client, "/similar", page_url="https://example.com/film/nope"),
+            "browse": await get_json(client, "/browse", sort="rating", limit="5", year_max="2000"),
+            "random": [await get_json(client, "/random", n="5", seed="7", genres="комедия") for _ in range(2)],
+            "suggest": await get_json(client, "/suggest", field="director", q="режиссёр 1", limit="3"),
+        }
+
+    result = call_api(service_env, scenario)
+    status, similar = result["similar"]
+    # Индекс соседей не собран — соседи по TF-IDF без самого фильма
+    assert status == 200 and len(similar["films"]) == 4
+    assert "https://example.com/film/5" not in [film["page_url"] for film in similar["films"]]
+    assert result["missing"][0] == 404
+
+    status, browse = result["browse"]
+    ratings = [film["rating"] for film in browse["films"]]
+    assert status == 200 and ratings == sorted(ratings, reverse=True)
+    assert all(film["year"] <= 2000 for film in browse["films"]) and browse["total"] >= len(ratings)
+
+    (status, first), (_, second) = result["random"]
+    assert status == 200 and first == second and len(first["films"]) == 5
+    assert all("комедия" in film["genre"] for film in first["films"])
+
+    status, suggest = result["suggest"]
+    assert status == 200 and suggest["suggestions"]
+    assert all(item["value"].lower().startswith("режиссёр 1") for item in suggest["suggestions"])
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/search", {}),
+    ("/search", {"q": "x", "k": "1000"}),
+    ("/search", {"q": "x", "mode": "bm25"}),
+    ("/search", {"q": "x", "year_min": "abc"}),
+    ("/random", {"seed": "x"}),
+    ("/random", {"seed": "-1"}),
+    ("/browse", {"sort": "popularity"}),
+    ("/suggest", {"field": "plot"}),
+])
+def test_bad_parameters_return_400(service_env, path, params):
+    status, body = call_api(service_env, lambda client: get_json(client, path, **params))
+    assert status == 400 and body["error"]
+
+
+def test_unexpected_error_returns_json_500(service_env, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise ValueError("ошибка в коде")
+
+    monkeypatch.setattr(service_env.SearchService, "browse", broken)
+    status, body = call_api(service_env, lambda client: get_json(client, "/browse"))
+    assert status == 500 and body == {"error": "внутренняя ошибка сервиса"}
+
+
+def test_health_and_metrics(service_env, monkeypatch):
+    monkeypatch.setattr(service_env.TRACER, "sample_rate", 1.0)
+
+    async def scenario(client):
+        before = await get_json(client, "/health")
+        await client.get("/search", params={"q": "космос", "mode": "tfidf"})
+        after = await get_json(client, "/health")
+        metrics = await (await client.get("/metrics")).text()
+        return before, after, metrics
+
+    (_, before), (_, after), metrics = call_api(service_env, scenario)
+    assert not before["ready"]
+    assert {item["component"]: item["state"] for item in after["components"]}["tfidf"] == "ready"
+    assert 'stage="api_search_tfidf"' in metrics
@@ -0,0 +1,77 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from recommender.startup import FAILED, PENDING, READY, Startup
+
+
+def test_component_loads_once():
+    calls = []
+    startup = Startup()
+    startup.register("engine", lambda: ["json"], lambda: calls.append(1) or object())
+
+    assert startup.status()[0]["state"] == PENDING
+    value = startup.get("engine")
+    assert startup.get("engine") is value
+    assert calls == [1]
+    assert startup.ready()
+    status = startup.status()[0]
+    assert status["state"] == READY and status["init_seconds"] is not None
+
+
+def test_failed_component_is_retried():
+    attempts = []
+
+    def init():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise FileNotFoundError("нет базы")
+        return "готово"
+
+    startup = Startup()
+    startup.register("qdrant", lambda: [], init)
+    with pytest.raises(FileNotFoundError):
+        startup.get("qdrant")
+    status = startup.status()[0]
+    assert status["state"] == FAILED and status["error"] == "FileNotFoundError: нет базы"
+    assert not startup.ready()
+
+    assert startup.get("qdrant") == "готово"
+    assert startup.ready("qdrant")
+
+
+def test_component_reloads_when_version_changes():
+    version = {"value": 1}
+    startup = Startup()
+    startup.register("tfidf", lambda: [], lambda: object(), lambda: version["value"])
+
+    first = startup.get("tfidf")
+    assert startup.get("tfidf") is first
+    version["value"] = 2
+    assert startup.version("tfidf") == 2
+    assert startup.get("tfidf") is not first
+
+
+def test_warm_up_runs_once_and_keeps_errors():
+    startup = Startup()
+    startup.register("ok", lambda: [], lambda: 1)
+    startup.register("broken", lambda: [], lambda: 1 / 0)
+
+    thread = startup.warm_up()
+    assert startup.warm_up() is thread
+    thread.join(5)
+    states = {status["component"]: status["state"] for status in startup.status()}
+    assert states == {"ok": READY, "broken": FAILED}
+
+
+@pytest.mark.parametrize("module", ["recommender.filter_index", "recommender.neighbors",
+                                    "recommender.llm_cache", "recommender.llm"])
+def test_light_modules_skip_heavy_imports(module):
+    # Страницы импортируют эти модули сразу; sklearn и langchain грузятся позже, в фоне или при первом запросе
+    code = (f"import sys, {module}; "
+            "print(','.join(name for name in ('sklearn', 'langchain_core') if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).resolve().parents[1])
+    assert result.stdout.strip() == ""
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommender.sync import SyncManifest, diff, qdrant_state, row_hashes, row_keys, sync_tfidf
+from recommender.tfidf import TfidfArtifact, build_search_texts
+
+from conftest import make_films
+
+
+def test_diff():
+    old = {"a": "1", "b": "2", "c": "3"}
+    new = {"a": "1", "b": "20", "d": "4"}
+    changed, removed = diff(old, new)
+    assert changed == ["b", "d"]
+    assert removed == ["c"]
+    assert diff(new, new) == ([], [])
+    assert diff({}, new) == (list(new), [])
+
+
+def test_row_hashes_track_content():
+    films = make_films(n=5)
+    edited = films.copy()
+    edited.loc[2, "rating"] = 1.0
+    before, after = row_hashes(films), row_hashes(edited)
+    assert [b == a for b, a in zip(before, after)] == [True, True, False, True, True]
+    # Порядок столбцов в CSV на хэш не влияет
+    assert row_hashes(films[films.columns[::-1]]) == before
+
+
+def test_row_hashes_ignore_column_dtype(tmp_path):
+    films = make_films(n=50)
+    # Новая строка без года: ingest её отбросит, но столбец year становится float64
+    grown = pd.concat([films, make_films(n=51).iloc[[50]].assign(year=np.nan)], ignore_index=True)
+    assert grown["year"].dtype == np.float64
+    assert row_hashes(grown)[:50] == row_hashes(films)
+    assert diff(qdrant_state(films)[1], qdrant_state(grown)[1]) == ([], [])
+
+    # Тот же фильм, прочитанный из CSV, где год записан как «2001.0», — тоже без изменений
+    path = tmp_path / "films.csv"
+    grown.to_csv(path, index=False)
+    assert row_hashes(pd.read_csv(path))[:50] == row_hashes(films)
+
+
+def test_row_keys_fall_back_to_hash():
+    films = make_films(n=3)
+    films.loc[1, "page_url"] = np.nan
+    hashes = row_hashes(films)
+    assert row_keys(films, hashes) == [films.loc[0, "page_url"], f"row:{hashes[1]}", films.loc[2, "page_url"]]
+
+
+def test_qdrant_state_diff_after_edit():
+    films = make_films(n=10)
+    _, old = qdrant_state(films)
+    edited = films.drop(index=3).copy()
+    edited.loc[5, "description"] = "Новое описание"
+    edited.loc[10] = make_films(n=11).loc[10]
+    _, new = qdrant_state(edited)
+    changed, removed = diff(old, new)
+    assert changed == [films.loc[5, "page_url"], "https://example.com/film/10"]
+    assert removed == [films.loc[3, "page_url"]]
+
+
+def test_manifest_round_trip(tmp_path):
+    path = tmp_path / "manifest.json"
+    manifest = SyncManifest(path)
+    assert manifest.qdrant is None and manifest.tfidf is None
+    manifest.save(qdrant={"a": "1"})
+    manifest.save(tfidf={"rows": 1})
+    loaded = SyncManifest(path)
+    assert loaded.qdrant == {"a": "1"}
+    assert loaded.tfidf == {"rows": 1}
+
+
+@pytest.fixture
+def tfidf_sync(tmp_path):
+    manifest = SyncManifest(tmp_path / "manifest.json")
+    cache_dir = tmp_path / "tfidf"
+
+    def run(df, **kwargs):
+        log = []
+        changed = sync_tfidf(df, f"csv-{len(df)}-{row_hashes(df)[-1]}", manifest, cache_dir, log=log.append, **kwargs)
+        return changed, any("переобучаем" in line for line in log)
+
+    return run, TfidfArtifact(cache_dir)
+
+
+def test_sync_tfidf_patches_changed_rows(tfidf_sync):
+    run, artifact = tfidf_sync
+    films = make_films(n=60)
+    changed, refit = run(films)
+    assert refit and changed == list(range(60))
+    vectorizer, matrix = artifact.load()
+
+    edited = films.drop(index=[3, 4]).reset_index(drop=True)
+    edited.loc[10, "description"] = films.loc[20, "description"]
+    changed, refit = run(edited)
+    assert not refit and changed == [10]
+
+    patched_vectorizer, patched = artifact.load()
+    assert patched_vectorizer.vocabulary_ == vectorizer.vocabulary_
+    # Строки совпадают с пересчётом тем же векторизатором, порядок — как в новом CSV
+    expected = vectorizer.transform(build_search_texts(edited))
+    assert patched.shape == expected.shape
+    assert abs(patched - expected).max() < 1e-9
+    assert artifact.load_texts() == build_search_texts(edited)
+
+
+def test_sync_tfidf_refits_on_new_vocabulary(tfidf_sync):
+    run, artifact = tfidf_sync
+    films = make_films(n=60)
+    run(films)
+
+    edited = films.copy()
+    edited.loc[0, "description"] = "Совершенно незнакомые слова трансмутация хроноскаф"
+    changed, refit = run(edited, max_oov_ratio=0.05)
+    assert changed == [0] and refit
+    assert "хроноскаф" in artifact.load()[0].vocabulary_
+
+
+def test_sync_tfidf_refits_when_most_rows_changed(tfidf_sync):
+    run, _ = tfidf_sync
+    films = make_films(n=60)
+    run(films)
+    edited = films.copy()
+    edited["rating"] = edited["rating"] + 0.1
+    changed, refit = run(edited)
+    assert len(changed) == 60 and refit
+    assert run(edited) == ([], False)
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from recommender import tfidf
+from recommender.tfidf import MovieSearchEngine, TfidfArtifact
+
+
+@pytest.fixture
+def csv_path(films, tmp_path):
+    path = tmp_path / "films_data.csv"
+    films.to_csv(path, index=False)
+    return path
+
+
+def load(csv_path, tmp_path):
+    return MovieSearchEngine.load_or_build(csv_path, tmp_path / "tfidf_cache", tmp_path / "catalog")
+
+
+def test_artifact_freshness(csv_path, tmp_path):
+    engine = load(csv_path, tmp_path)
+    artifact = TfidfArtifact(tmp_path / "tfidf_cache")
+    n_docs = len(engine.catalog)
+
+    assert artifact.is_fresh(engine.fingerprint, n_docs)
+    assert not artifact.is_fresh("другой CSV", n_docs)
+    assert not artifact.is_fresh(engine.fingerprint, n_docs + 1)
+
+    manifest = artifact.read_manifest()
+    tfidf.write_json(artifact.manifest_path, {**manifest, "version": manifest["version"] + 1})
+    assert not artifact.is_fresh(engine.fingerprint, n_docs)
+
+
+def test_cache_without_manifest_is_rebuilt(csv_path, tmp_path):
+    # Как кэш, закоммиченный без manifest.json: векторизатор и матрица есть, но им нельзя доверять
+    engine = load(csv_path, tmp_path)
+    artifact = TfidfArtifact(tmp_path / "tfidf_cache")
+    os.remove(artifact.manifest_path)
+    assert not artifact.is_fresh(engine.fingerprint, len(engine.catalog))
+
+    rebuilt = load(csv_path, tmp_path)
+    assert artifact.is_fresh(rebuilt.fingerprint, len(rebuilt.catalog))
+    assert rebuilt.version == MovieSearchEngine.version_of(csv_path, tmp_path / "tfidf_cache", tmp_path / "catalog")
+
+
+def test_fresh_cache_is_not_refit(csv_path, tmp_path, monkeypatch):
+    load(csv_path, tmp_path)
+
+    def refit(*args, **kwargs):
+        raise AssertionError("свежий кэш не должен пересобираться")
+
+    monkeypatch.setattr(tfidf, "TfidfVectorizer", refit)
+    engine = load(csv_path, tmp_path)
+    rows, _ = engine.search_rows("Описание фильма 120", 1)
+    assert engine.catalog.texts("movie_title", rows) == ["Фильм 120"]
+
+
+def test_search_many_matches_search(csv_path, tmp_path):
+    engine = load(csv_path, tmp_path)
+    queries = ["Описание фильма 120", "фильм 42", "несуществующее слово"]
+    batched = engine.search_many(queries, top_n=5, min_similarity=0.0, chunk_size=2)
+    for query, result in zip(queries, batched):
+        assert result.equals(engine.search(query, top_n=5, min_similarity=0.0))
@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from recommender import tracing
+from recommender.tracing import Histogram, Tracer, debug_enabled, in_current_trace
+
+
+def test_unsampled_request_records_nothing():
+    tracer = Tracer(sample_rate=0.0)
+    with tracer.span("search") as trace:
+        with tracer.span("vector_search") as inner:
+            tracer.record("llm_stream", 0.5)
+    assert trace is None and inner is None
+    assert tracer.histograms == {}
+
+
+def test_sampled_request_builds_tree():
+    tracer = Tracer(sample_rate=1.0)
+    with tracer.span("search") as trace:
+        with tracer.span("vector_search"):
+            pass
+        tracer.record("llm_stream", 0.5)
+    # Вложенные этапы — с отступом; замеренный вручную этап начался за 0.5 с до record
+    assert [row["stage"] for row in trace.rows()] == ["\u2003llm_stream", "search", "\u2003vector_search"]
+    assert {name: histogram.count for name, histogram in tracer.histograms.items()} == {
+        "search": 1, "vector_search": 1, "llm_stream": 1}
+
+
+def test_sampling_decided_once_per_request(monkeypatch):
+    draws = iter([0.05, 0.5, 0.05])
+    monkeypatch.setattr(tracing.random, "random", lambda: next(draws))
+    tracer = Tracer(sample_rate=0.1)
+    for _ in range(3):
+        with tracer.span("search"):
+            # Вложенные этапы не бросают жребий заново
+            with tracer.span("tfidf_search"):
+                pass
+    assert tracer.histograms["search"].count == 2
+    assert tracer.histograms["tfidf_search"].count == 2
+
+
+def test_force_traces_without_sampling():
+    tracer = Tracer(sample_rate=0.0)
+    with tracer.span("search", force=True) as trace:
+        with tracer.span("vector_search"):
+            pass
+    assert [row["stage"] for row in trace.rows()] == ["search", "\u2003vector_search"]
+
+
+def test_errors_are_counted():
+    tracer = Tracer(sample_rate=1.0)
+    with pytest.raises(ValueError):
+        with tracer.span("search"):
+            raise ValueError("сбой")
+    assert tracer.histograms["search"].errors == 1
+    assert 'movie_stage_errors_total{stage="search"} 1' in tracer.prometheus_text()
+
+
+def test_pool_tasks_continue_caller_trace():
+    tracer = Tracer(sample_rate=1.0)
+
+    def work():
+        with tracer.span("tfidf_search"):
+            pass
+
+    with ThreadPoolExecutor(max_workers=1) as pool, tracer.span("search") as trace:
+        pool.submit(in_current_trace(work)).result()
+    assert [row["stage"] for row in trace.rows()] == ["search", "\u2003tfidf_search"]
+
+
+def test_histogram_quantile_and_prometheus_text():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    assert histogram.quantile(0.5) is None
+    for seconds in (0.05, 0.05, 0.5, 0.5):
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == pytest.approx(0.1)
+    assert histogram.quantile(1.0) == pytest.approx(1.0)
+
+    tracer = Tracer(sample_rate=1.0, buckets=(0.1, 1.0))
+    tracer.observe("search", 0.05)
+    text = tracer.prometheus_text()
+    assert 'movie_stage_seconds_bucket{stage="search",le="0.1"} 1' in text
+    assert 'movie_stage_seconds_count{stage="search"} 1' in text
+    assert "movie_trace_sample_rate 1.0" in text
+
+
+def test_debug_enabled(monkeypatch):
+    monkeypatch.delenv("MOVIE_DEBUG", raising=False)
+    assert not debug_enabled()
+    assert debug_enabled({"debug": "1"})
+    monkeypatch.setenv("MOVIE_DEBUG", "1")
+    assert debug_enabled()
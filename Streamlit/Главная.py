@@ -1,25 +1,36 @@
 import streamlit as st
 import os
 from PIL import Image
+from recommender.startup import STARTUP
+from recommender.tracing import TRACER
+from recommender.ui import start_page
+
+start_page()
 
 BASE_DIR = os.path.dirname(__file__)  # Папка, где лежит Главная.py
 image_path = os.path.join(BASE_DIR, "images", "title_page.png")
 
-st.set_page_config(layout="wide")
-st.markdown(
-    """
-    <style>
-    /* Увеличиваем базовый размер шрифта для всего приложения */
-    html, body, .block-container {
-        font-size: 26px !important;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
-
 col1, col2, col3 = st.columns([1, 2, 1])
 with col2:
     img = Image.open(image_path)
     st.image(img, width=600)
-    st.write("Добро пожаловать! 👋🏻 Выберите интересующую вас страницу в меню слева.")
\ No newline at end of file
+    st.write("Добро пожаловать! 👋🏻 Выберите интересующую вас страницу в меню слева.")
+
+    with st.expander("🩺 Готовность сервиса"):
+        for status in STARTUP.status():
+            timing = ""
+            if status["import_seconds"] is not None:
+                timing = f" — импорт {status['import_seconds']:.2f} с"
+            if status["init_seconds"] is not None:
+                timing += f", загрузка {status['init_seconds']:.2f} с"
+            error = f" ({status['error']})" if status["error"] else ""
+            st.write(f"**{status['component']}**: {status['state']}{timing}{error}")
+
+    # Время этапов по выбранным запросам (TRACE_SAMPLE_RATE) — то же, что отдаётся в TRACE_METRICS_FILE
+    with st.expander("📈 Время этапов"):
+        stats = TRACER.stats()
+        if stats:
+            st.dataframe(stats, use_container_width=True)
+        else:
+            st.write("Пока нет замеров.")
+        st.download_button("Метрики в формате Prometheus", TRACER.prometheus_text(), file_name="metrics.prom")
\ No newline at end of file